@@ -0,0 +1,45 @@
+"""
+Cost of the global EDF schedulability tests on large tasksets.
+
+The tasksets are schedulable, so every test evaluates all of its tasks
+instead of stopping at the first one it can't prove. Run from the repository
+root with:
+
+    python -m benchmarks.feasibility [tasks] [cores]
+"""
+
+import random
+import sys
+import timeit
+
+from shipyard.crane.feasibility import bak_test, bcl_test, gfb_test
+from shipyard.task.model import Task
+
+
+def make_tasks(count: int, cores: int) -> list:
+    """Returns light tasks with implicit deadlines, filling a quarter of the cores."""
+
+    rng = random.Random(0)
+    tasks = []
+    for i in range(count):
+        period = rng.randint(10000, 20000)
+        tasks.append(Task(
+            _id=None, file_id=None, digest=None, name=f'task{i}',
+            runtime=max(1, period * cores // count // 4),
+            deadline=period, period=period))
+    return tasks
+
+
+def main(count: int = 300, cores: int = 8):
+    tasks = make_tasks(count, cores)
+    tests = {'gfb': gfb_test, 'bcl': bcl_test, 'bak': bak_test}
+
+    print(f'{count} tasks on {cores} cores:')
+    for name, test in tests.items():
+        result = test(tasks, cores)
+        runs, total = timeit.Timer(lambda: test(tasks, cores)).autorange()
+        print(f'  {name:<5} {total / runs * 1e3:9.3f} ms  ({result})')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
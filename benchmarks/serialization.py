@@ -0,0 +1,77 @@
+"""
+Per-document cost of serializing node listings.
+
+Compares building a schema on every call, as the controllers used to do,
+with the cached schemas and with dumping the documents as read from the
+database. Run from the repository root with:
+
+    python -m benchmarks.serialization [nodes] [tasks per node]
+"""
+
+import sys
+import timeit
+
+from bson.objectid import ObjectId
+
+from shipyard.node.model import Node
+from shipyard.serialization import dump_trusted, schema
+
+FIELDS = ['_id', 'name', 'ip', 'cpu', 'cpu_arch', 'load',
+          'tasks._id', 'tasks.name']
+
+
+def make_documents(nodes: int, tasks: int) -> list:
+    """Returns node documents as stored in the database."""
+
+    return [{
+        '_id': ObjectId(),
+        'name': f'node{i}',
+        'ip': '10.0.0.1',
+        'cpu': 'Test CPU',
+        'cpu_arch': 'x86_64',
+        'cpu_cores': 4,
+        'load': {
+            'tasks': tasks,
+            'utilization': 0.5,
+            'density': 0.5,
+            'free': 3.5,
+            'cores': {},
+            'devices': {}
+        },
+        'tasks': [{
+            '_id': ObjectId(),
+            'file_id': ObjectId(),
+            'name': f'task{i}-{j}',
+            'runtime': 1000,
+            'deadline': 10000,
+            'period': 10000
+        } for j in range(tasks)]
+    } for i in range(nodes)]
+
+
+def main(nodes: int = 100, tasks: int = 10):
+    documents = make_documents(nodes, tasks)
+    projected = [{**document, 'tasks': [
+        {'_id': task['_id'], 'name': task['name']} for task in document['tasks']
+    ]} for document in documents]
+
+    cases = {
+        'load, new schema': lambda: Node.Schema().load(
+            [dict(d) for d in documents], many=True),
+        'load, cached schema': lambda: schema(Node).load(
+            [dict(d) for d in documents], many=True),
+        'dump, new schema': lambda: Node.Schema(only=FIELDS).dump(
+            projected, many=True),
+        'dump, cached schema': lambda: schema(Node, only=FIELDS).dump(
+            projected, many=True),
+        'dump, trusted': lambda: dump_trusted(projected)
+    }
+
+    print(f'{nodes} nodes with {tasks} tasks each, per document:')
+    for name, case in cases.items():
+        runs, total = timeit.Timer(case).autorange()
+        print(f'  {name:<20} {total / runs / nodes * 1e6:9.1f} us')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
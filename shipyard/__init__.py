@@ -4,12 +4,69 @@ The server's entrypoint.
 
 import hug
 
-from shipyard.input_formats import multipart
+from shipyard import leases
+from shipyard.cache import controllers as cache_controllers
+from shipyard.index import controllers as index_controllers
+from shipyard.index.service import IndexService
+from shipyard.input_formats import form_fields
+from shipyard.job import controllers as job_controllers
+from shipyard.job.service import JobService
 from shipyard.node import controllers as node_controllers
+from shipyard.node.service import NodeService
+from shipyard.rollout import controllers as rollout_controllers
+from shipyard.rollout.service import RolloutService
+from shipyard.task import artifacts
 from shipyard.task import controllers as task_controllers
+from shipyard.upload import controllers as upload_controllers
+from shipyard.upload.service import UploadService
 
 api = hug.API(__name__)
-api.http.set_input_format("multipart/form-data", multipart)
+api.http.set_input_format("multipart/form-data", form_fields)
 
 api.extend(node_controllers, '/nodes')
 api.extend(task_controllers, '/tasks')
+api.extend(rollout_controllers, '/rollouts')
+api.extend(job_controllers, '/jobs')
+api.extend(index_controllers, '/indexes')
+api.extend(cache_controllers, '/cache')
+api.extend(upload_controllers, '/uploads')
+
+
+@hug.startup()
+def create_indexes(api):
+    """Create the database indexes that don't exist yet."""
+
+    IndexService.ensure()
+
+
+@hug.startup()
+def summarize_nodes(api):
+    """Compute the load summary of the nodes stored without one."""
+
+    NodeService.summarize()
+
+
+@hug.startup()
+def hold_leases(api):
+    """
+    Hold the lease of this process and, while it runs, take over the work left
+    unfinished by processes that stopped: release the tasks reserved by their
+    deployments, queue their deployment jobs again and start their rollouts
+    again.
+    """
+
+    leases.hold(NodeService.recover, JobService.resume, RolloutService.resume)
+
+
+@hug.startup()
+def sweep_artifacts(api):
+    """Remove the task files left behind by requests that didn't finish."""
+
+    artifacts.sweep()
+
+
+@hug.startup()
+def expire_uploads(api):
+    """Remove the resumable uploads abandoned for longer than their TTL."""
+
+    UploadService.expire()
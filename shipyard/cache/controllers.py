@@ -0,0 +1,16 @@
+"""
+API controllers for the document cache.
+"""
+
+import hug
+from shipyard.cache.documents import node_cache, task_cache
+
+
+@hug.get('/')
+def get_cache_stats():
+    """
+    Retrieve the number of entries of the node and task caches, along with
+    their hits, misses, evictions, expirations and invalidations.
+    """
+
+    return {'nodes': node_cache.stats(), 'tasks': task_cache.stats()}
@@ -0,0 +1,201 @@
+"""
+In-process cache of the node and task documents.
+
+Documents are cached already deserialized, keyed by their ID and reachable by
+their name, so reading the same node or task again skips both the database
+and the schema. Every write path of the services invalidates the documents it
+changes, which increases their version if they are being read. A document read
+while it was being changed isn't cached, as its version changed meanwhile.
+Versions are only kept while a read of the document is in flight, so they
+don't outlive the reads that need them.
+
+Entries expire after `CACHE_TTL` seconds, which bounds how long changes made
+by other processes can go unnoticed, and the least recently used ones are
+evicted past `CACHE_SIZE` entries.
+"""
+
+import copy
+import dataclasses
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Type
+
+from shipyard.node.model import Node
+from shipyard.serialization import schema
+from shipyard.task.model import Task
+
+CACHE_SIZE = int(os.getenv('CACHE_SIZE', default='1024'))
+CACHE_TTL = float(os.getenv('CACHE_TTL', default='60'))
+
+
+class DocumentCache():
+    """
+    An LRU cache of the documents of a model, with expiration.
+
+    Cached objects are copied when returned, so callers can change them.
+    """
+
+    def __init__(self, model: Type, size: int = CACHE_SIZE,
+                 ttl: float = CACHE_TTL):
+        self.model = model
+        self.size = size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._names: Dict[str, str] = {}
+        self._versions: Dict[str, int] = {}
+        self._readers: Dict[str, int] = {}
+        self._generation = 0
+        self._counters = dict.fromkeys(
+            ('hits', 'misses', 'evictions', 'expirations', 'invalidations'), 0)
+
+    def get(self, key, find: Callable[[], Optional[dict]]):
+        """
+        Returns the object with the given ID, reading its document with `find`
+        if it isn't cached. Returns `None` if there is no such document.
+        """
+
+        key = str(key)
+        with self._lock:
+            value = self._lookup(key)
+            if value is None:
+                version = self._start(key)
+        if value is not None:
+            return _copy(value)
+
+        try:
+            document = find()
+            if document is not None:
+                value = schema(self.model).load(document)
+        finally:
+            with self._lock:
+                if self._finish(key, version) and value is not None:
+                    self._store(key, value)
+        return None if value is None else _copy(value)
+
+    def get_by_name(self, name: str, find: Callable[[], Optional[dict]]):
+        """
+        Returns the object with the given name, reading its document with
+        `find` if it isn't cached. Returns `None` if there is no such document.
+        """
+
+        with self._lock:
+            key = self._names.get(name)
+            if key is None:
+                self._counters['misses'] += 1
+            value = None if key is None else self._lookup(key)
+            generation = self._generation
+        if value is not None:
+            return _copy(value)
+
+        document = find()
+        if document is None:
+            return None
+        value = schema(self.model).load(document)
+
+        with self._lock:
+            # The ID wasn't known, so any change meanwhile may be this one's
+            if self._generation == generation:
+                self._store(str(value._id), value)
+        return _copy(value)
+
+    def invalidate(self, key):
+        """Drops the document with the given ID and increases its version."""
+
+        key = str(key)
+        with self._lock:
+            if key in self._versions:
+                self._versions[key] += 1
+            self._generation += 1
+            self._counters['invalidations'] += 1
+            self._drop(key)
+
+    def clear(self):
+        """Drops every document."""
+
+        with self._lock:
+            for key in self._versions:
+                self._versions[key] += 1
+            self._generation += 1
+            self._entries.clear()
+            self._names.clear()
+
+    def stats(self) -> dict:
+        """Returns the size of the cache and its counters."""
+
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'size': self.size,
+                'ttl': self.ttl,
+                **self._counters
+            }
+
+    def _start(self, key: str) -> int:
+        self._readers[key] = self._readers.get(key, 0) + 1
+        return self._versions.setdefault(key, 0)
+
+    def _finish(self, key: str, version: int) -> bool:
+        # Returns whether the document is unchanged since the read started,
+        # and forgets its version once no other read needs it
+        unchanged = self._versions[key] == version
+        self._readers[key] -= 1
+        if self._readers[key] == 0:
+            del self._readers[key]
+            del self._versions[key]
+        return unchanged
+
+    def _lookup(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            self._counters['misses'] += 1
+            return None
+
+        value, expires = entry
+        if expires <= time.monotonic():
+            self._counters['expirations'] += 1
+            self._counters['misses'] += 1
+            self._drop(key)
+            return None
+
+        self._entries.move_to_end(key)
+        self._counters['hits'] += 1
+        return value
+
+    def _store(self, key: str, value):
+        if self.size <= 0:
+            return
+
+        self._drop(key)
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+        self._names[value.name] = key
+        while len(self._entries) > self.size:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self._counters['evictions'] += 1
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None and self._names.get(entry[0].name) == key:
+            del self._names[entry[0].name]
+
+
+def _copy(value):
+    # Faster than `copy.deepcopy` for the models, whose fields are only
+    # immutable values, lists, dictionaries and other models
+    if isinstance(value, list):
+        return [_copy(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+    if dataclasses.is_dataclass(value):
+        copied = copy.copy(value)
+        for name, item in vars(value).items():
+            setattr(copied, name, _copy(item))
+        return copied
+    return value
+
+
+node_cache = DocumentCache(Node)
+task_cache = DocumentCache(Task)
@@ -2,39 +2,171 @@
 Task deployment logic.
 """
 
+from typing import Callable
+
 import docker
+from shipyard.crane.pool import pool
 from shipyard.node.model import Node, Task
 
+DIGEST_LABEL = 'shipyard.digest'
+CACHE_REPOSITORY = 'shipyard/cache'
+PREVIOUS_SUFFIX = '-previous'
+
 
-def deploy_task(task_file, task: Task, node: Node):
+def deploy_task(task_file, task: Task, node: Node, progress: Callable[[str], None] = None):
     """
     Sends a task to a certain node and makes it run.
 
     The given task file is a `tar.gz` file containing the task's image and all
     the needed source files to build it.
 
-    This function connects to the node's Docker server by SSH, builds the image
-    using the custom context contained in the tar gile and then runs the
-    container.
+    This function borrows a client connected to the node's Docker server from
+    the pool, builds the image using the custom context contained in the tar
+    file and then runs the container.
+
+    If the task has a content hash and the node already has an image built from
+    a file with the same hash, that image is reused and the build is skipped.
+    Built images are labelled with the hash and tagged in a cache repository,
+    so they outlive the removal of the task.
+
+    If the task has been assigned a core, the container is pinned to it. If
+    its runtime has been scaled to the node's speed, the scaled runtime is
+    passed to the container.
+
+    If a `progress` function is given, it's called with the name of every
+    phase of the deployment (`upload`, `build` and `run`) as it begins. The
+    first two are skipped when a cached image is used.
     """
 
-    client = docker.DockerClient(base_url=f'ssh://{node.ssh_user}@{node.ip}')
-    client.images.build(
-        tag=task.name,
-        fileobj=task_file,
-        custom_context=True,
-        encoding='gzip'
-    )
+    progress = progress or (lambda phase: None)
+    with pool.client(node) as client:
+        _build_image(client, task_file, task, progress)
+        progress('run')
+        _run_container(client, task)
+
+
+def swap_task(task: Task, node: Node):
+    """
+    Replaces the running container of a task in a certain node with one of a
+    new version of the task, whose image must have been built already.
+
+    The image is checked before touching the old container, which is stopped
+    and set aside until the new one runs. If the new container can't be run,
+    the old one is started again and the error is raised. Otherwise, the old
+    container is removed, along with its image unless it's tagged, such as
+    the cached ones.
+    """
+
+    with pool.client(node) as client:
+        client.images.get(task.name)
+        try:
+            old = client.containers.get(task.name)
+        except docker.errors.NotFound:
+            old = None
+
+        if old is not None:
+            # A swap interrupted earlier may have left its old container
+            try:
+                client.containers.get(
+                    f'{task.name}{PREVIOUS_SUFFIX}').remove(force=True)
+            except docker.errors.NotFound:
+                pass
+            old.stop()
+            old.rename(f'{task.name}{PREVIOUS_SUFFIX}')
+        try:
+            _run_container(client, task)
+        except Exception:
+            try:
+                client.containers.get(task.name).remove(force=True)
+            except docker.errors.NotFound:
+                pass
+            if old is not None:
+                old.rename(task.name)
+                old.start()
+            raise
+
+        if old is not None:
+            old.remove(force=True)
+            try:
+                client.images.remove(image=old.image.id)
+            except docker.errors.APIError:
+                pass
+
+
+def pin_task(task_name: str, node: Node, core: int):
+    """
+    Moves the running container of a task to the given core of a node.
+
+    This function borrows a client connected to the node's Docker server from
+    the pool and updates the container's CPU set without restarting it.
+    """
+
+    with pool.client(node) as client:
+        client.containers.get(task_name).update(cpuset_cpus=str(core))
+
+
+def build_image(task_file, task: Task, node: Node):
+    """
+    Builds a task's image in a certain node without running it.
+
+    As in `deploy_task`, a cached image built from the same file is reused if
+    the node has one.
+    """
+
+    with pool.client(node) as client:
+        _build_image(client, task_file, task, lambda phase: None)
+
+
+def _run_container(client: docker.DockerClient, task: Task):
     client.containers.run(
         task.name,
         name=task.name,
         detach=True,
         cap_add=['SYS_NICE'] + task.capabilities,
         devices=task.devices,
+        cpuset_cpus=None if task.core is None else str(task.core),
         environment={
-            'TASK_RUNTIME': task.runtime,
+            'TASK_RUNTIME': task.runtime if task.scaled_runtime is None
+            else task.scaled_runtime,
             'TASK_DEADLINE': task.deadline,
             'TASK_PERIOD': task.period
         }
     )
-    client.close()
+
+
+def _build_image(client: docker.DockerClient, task_file, task: Task, progress: Callable[[str], None]):
+    if _tag_cached_image(client, task):
+        return
+
+    progress('upload')
+    output = client.api.build(
+        tag=task.name,
+        fileobj=task_file,
+        custom_context=True,
+        encoding='gzip',
+        labels={} if task.digest is None else {DIGEST_LABEL: task.digest},
+        decode=True
+    )
+
+    progress('build')
+    log = []
+    for chunk in output:
+        log.append(chunk)
+        if 'error' in chunk:
+            raise docker.errors.BuildError(chunk['error'], log)
+
+    if task.digest is not None:
+        client.images.get(task.name).tag(CACHE_REPOSITORY, tag=task.digest)
+
+
+def _tag_cached_image(client: docker.DockerClient, task: Task) -> bool:
+    if task.digest is None:
+        return False
+
+    images = client.images.list(
+        filters={'label': f'{DIGEST_LABEL}={task.digest}'})
+    if not images:
+        return False
+
+    images[0].tag(task.name)
+    return True
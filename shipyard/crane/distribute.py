@@ -0,0 +1,168 @@
+"""
+Image distribution logic.
+"""
+
+import os
+import queue
+import time
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List
+
+from shipyard.crane import fanout
+from shipyard.crane.deploy import CACHE_REPOSITORY, DIGEST_LABEL, build_image
+from shipyard.crane.pool import pool
+from shipyard.node.model import Node
+from shipyard.task.model import Task
+
+CHUNK_SIZE = int(os.getenv('CRANE_DISTRIBUTION_CHUNK_SIZE',
+                           default=str(2 * 1024 * 1024)))
+QUEUE_DEPTH = int(os.getenv('CRANE_DISTRIBUTION_QUEUE_DEPTH', default='8'))
+FANOUT = int(os.getenv('CRANE_DISTRIBUTION_FANOUT', default='16'))
+TIMEOUT = float(os.getenv('CRANE_DISTRIBUTION_TIMEOUT', default='1800'))
+
+_END = object()
+_ABORT = object()
+
+
+def distribute_image(task_file, task: Task, nodes: List[Node], builders: List[Node]) -> List[dict]:
+    """
+    Builds a task's image once per CPU architecture and copies it to the given
+    nodes, so they don't have to build it themselves.
+
+    For every architecture, the image is built on the first of the given
+    builders with that architecture or, if there's none, on the first of the
+    given nodes that has it. The builder's `docker save` output is then read in
+    chunks of `CRANE_DISTRIBUTION_CHUNK_SIZE` bytes and every chunk is fed in
+    parallel to `docker load` on up to `CRANE_DISTRIBUTION_FANOUT` other nodes
+    of the architecture. Each destination buffers at most
+    `CRANE_DISTRIBUTION_QUEUE_DEPTH` chunks, so the image is never held whole
+    in the server's memory. Copies still running `CRANE_DISTRIBUTION_TIMEOUT`
+    seconds after they started are reported as timed out.
+
+    Only tasks with a content hash can be distributed, and nodes without a CPU
+    architecture are left out. Returns a report with the result for each node
+    that took part, where nodes that already had the image count as succeeded.
+    A node whose copy fails simply builds the image itself when the task is
+    deployed.
+    """
+
+    if task.digest is None:
+        return []
+
+    groups = defaultdict(list)
+    for node in nodes:
+        if node.cpu_arch is not None:
+            groups[node.cpu_arch].append(node)
+
+    report = []
+    for arch, targets in groups.items():
+        builder = next((b for b in builders if b.cpu_arch == arch), targets[0])
+        report += _distribute(task_file, task, builder, targets)
+    return report
+
+
+def _distribute(task_file, task: Task, builder: Node, targets: List[Node]) -> List[dict]:
+    report = []
+    missing = []
+    for node, present in _check_images(task, targets):
+        if present or node._id == builder._id:
+            continue
+        missing.append(node)
+
+    try:
+        task_file.seek(0)
+        build_image(task_file, task, builder)
+    except Exception as e:
+        return [
+            {'node': str(node._id), 'status': fanout.FAILED, 'error': str(e)}
+            for node in targets
+        ]
+
+    for i in range(0, len(missing), FANOUT):
+        report += _stream(task, builder, missing[i:i + FANOUT])
+    missing_ids = {node._id for node in missing}
+    report += [
+        {'node': str(node._id), 'status': fanout.SUCCEEDED}
+        for node in targets if node._id not in missing_ids
+    ]
+    return report
+
+
+def _stream(task: Task, builder: Node, nodes: List[Node]) -> List[dict]:
+    # Loading an image takes much longer than other node operations, so the
+    # copies have their own deadline instead of `CRANE_TIMEOUT`
+    deadline = time.monotonic() + TIMEOUT
+    queues = {str(node._id): queue.Queue(QUEUE_DEPTH) for node in nodes}
+    tag = f'{CACHE_REPOSITORY}:{task.digest}'
+
+    loaders = ThreadPoolExecutor(max_workers=len(nodes))
+    futures = {
+        str(node._id): loaders.submit(
+            _load, node, queues[str(node._id)], deadline)
+        for node in nodes
+    }
+    loaders.shutdown(wait=False)
+
+    end = _END
+    try:
+        with pool.client(builder) as client:
+            stream = client.images.get(tag).save(
+                chunk_size=CHUNK_SIZE, named=tag)
+            for chunk in stream:
+                if time.monotonic() > deadline:
+                    raise TimeoutError
+                for key, chunk_queue in queues.items():
+                    _put(chunk_queue, chunk, futures[key], deadline)
+    except Exception:
+        end = _ABORT
+    finally:
+        for key, chunk_queue in queues.items():
+            _put(chunk_queue, end, futures[key], deadline)
+
+    return fanout.collect(futures, key='node',
+                          timeout=max(deadline - time.monotonic(), 0))
+
+
+def _check_images(task: Task, nodes: List[Node]):
+    futures = [
+        (node, fanout.submit(node, _has_image, node, task)) for node in nodes
+    ]
+    for node, future in futures:
+        try:
+            yield node, future.result(timeout=fanout.TIMEOUT)
+        except Exception:
+            yield node, False
+
+
+def _has_image(node: Node, task: Task) -> bool:
+    with pool.client(node) as client:
+        return bool(client.images.list(
+            filters={'label': f'{DIGEST_LABEL}={task.digest}'}))
+
+
+def _load(node: Node, chunk_queue: queue.Queue, deadline: float):
+    def chunks():
+        while True:
+            try:
+                chunk = chunk_queue.get(
+                    timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                raise IOError('The image stream timed out.')
+            if chunk is _END:
+                return
+            if chunk is _ABORT:
+                raise IOError('The image stream was interrupted.')
+            yield chunk
+
+    with pool.client(node) as client:
+        client.images.load(chunks())
+
+
+def _put(chunk_queue: queue.Queue, chunk, future: Future, deadline: float):
+    while not future.done() and time.monotonic() < deadline:
+        try:
+            chunk_queue.put(chunk, timeout=1)
+            return
+        except queue.Full:
+            continue
@@ -0,0 +1,112 @@
+"""
+Concurrent execution of crane operations.
+"""
+
+import os
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List
+
+from shipyard.crane.pool import ClientPool
+from shipyard.node.model import Node
+
+MAX_WORKERS = int(os.getenv('CRANE_MAX_WORKERS', default='16'))
+NODE_CONCURRENCY = int(os.getenv('CRANE_NODE_CONCURRENCY', default='4'))
+TIMEOUT = float(os.getenv('CRANE_TIMEOUT', default='300'))
+
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+TIMED_OUT = 'timed_out'
+SKIPPED = 'skipped'
+
+
+class KeyedExecutor():
+    """
+    A thread pool that limits how many operations sharing the same key run at
+    once.
+
+    Operations over the limit wait in their key's queue without taking up a
+    worker, so a key with many operations doesn't starve the others.
+    """
+
+    def __init__(self, max_workers: int, key_concurrency: int, name: str):
+        self.key_concurrency = key_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._pending = defaultdict(deque)
+        self._running = defaultdict(int)
+
+    def submit(self, key: str, fn: Callable, *args) -> Future:
+        """Schedules an operation under the given key."""
+
+        future = Future()
+        with self._lock:
+            self._pending[key].append((future, fn, args))
+        self._dispatch(key)
+        return future
+
+    def _dispatch(self, key: str):
+        with self._lock:
+            while self._pending[key] and self._running[key] < self.key_concurrency:
+                self._running[key] += 1
+                self._executor.submit(
+                    self._run, key, *self._pending[key].popleft())
+            if not self._pending[key]:
+                del self._pending[key]
+
+    def _run(self, key: str, future: Future, fn: Callable, args: tuple):
+        try:
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args))
+                except BaseException as e:
+                    future.set_exception(e)
+        finally:
+            with self._lock:
+                self._running[key] -= 1
+                if not self._running[key]:
+                    del self._running[key]
+            self._dispatch(key)
+
+
+executor = KeyedExecutor(MAX_WORKERS, NODE_CONCURRENCY, 'crane')
+
+
+def submit(node: Node, fn: Callable, *args) -> Future:
+    """
+    Schedules an operation on a node in the shared executor.
+
+    At most `CRANE_NODE_CONCURRENCY` operations run on the same node at once.
+    """
+
+    return executor.submit(ClientPool.url(node), fn, *args)
+
+
+def collect(futures: Dict[str, Future], key: str, timeout: float = TIMEOUT) -> List[dict]:
+    """
+    Waits for the given operations and reports the result of each one.
+
+    The operations are given as a dictionary of futures, whose keys are
+    reported under the `key` field. Operations that haven't finished after
+    `timeout` seconds are reported as timed out, and those that haven't
+    started yet are cancelled.
+    """
+
+    done, _ = wait(futures.values(), timeout=timeout)
+
+    report = []
+    for name, future in futures.items():
+        if future not in done:
+            future.cancel()
+            report.append({key: name, 'status': TIMED_OUT})
+        elif future.exception() is not None:
+            report.append({
+                key: name,
+                'status': FAILED,
+                'error': str(future.exception())
+            })
+        else:
+            report.append({key: name, 'status': SUCCEEDED})
+    return report
@@ -1,25 +1,313 @@
 """
-Feasibility checking algorithm.
+Feasibility checking algorithms.
+
+A taskset is checked by running a chain of schedulability tests in order. Each
+test either accepts the taskset, rejects it or is inconclusive, in which case
+the next test in the chain is run. Cheap sufficient tests go first so the exact
+analysis is only needed for the tasksets they can't decide.
+
+Tests declare whether they apply to single-core nodes, where tasks are
+scheduled by EDF, or to multi-core nodes, where they are scheduled by global
+EDF. Only the tests that apply to the node are run.
+
+The tests to run are taken from the `CRANE_FEASIBILITY_TESTS` environment
+variable, as a comma-separated list of the names in `TESTS`.
 """
 
-from typing import List
+import math
+import os
+from dataclasses import dataclass
+from fractions import Fraction
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
 
+import numpy as np
 from shipyard.task.model import Task
 
+ACCEPTED = True
+REJECTED = False
+INCONCLUSIVE = None
+
+# Margin used by the tests computed with floating point arithmetic, so rounding
+# errors never turn a rejection into an acceptance.
+EPSILON = 1e-9
+
+
+class SchedulabilityTest(NamedTuple):
+    function: Callable[[List[Task], int], Optional[bool]]
+    uniprocessor: bool
+    multiprocessor: bool
+
+
+TESTS: Dict[str, SchedulabilityTest] = {}
+
+
+@dataclass(frozen=True)
+class Verdict:
+    """
+    Result of a feasibility check, with the name of the test that decided it.
+
+    Evaluates to `True` when the taskset is feasible.
+    """
+
+    feasible: bool
+    test: str
+
+    def __bool__(self) -> bool:
+        return self.feasible
+
+
+def schedulability_test(name: str, uniprocessor: bool = True,
+                        multiprocessor: bool = True):
+    """
+    Registers a schedulability test under the given name, for the kinds of
+    nodes it applies to.
+    """
+
+    def register(test: Callable[[List[Task], int], Optional[bool]]):
+        TESTS[name] = SchedulabilityTest(test, uniprocessor, multiprocessor)
+        return test
+    return register
+
+
+def check_feasibility(tasks: List[Task], cpu_cores: int) -> Verdict:
+    """
+    Checks if the given taskset is feasible on a node with the given number of
+    CPU cores, running the configured chain of schedulability tests.
+
+    Returns a `Verdict` that is truthy if the tasks can be accomplished with
+    the specified time restrictions. If no test is able to decide, the taskset
+    is considered not feasible and the verdict names the last test run.
+    """
+
+    name = 'none'
+    for name in FEASIBILITY_TESTS:
+        test = TESTS[name]
+        if not (test.multiprocessor if cpu_cores > 1 else test.uniprocessor):
+            continue
+
+        result = test.function(tasks, cpu_cores)
+        if result is not INCONCLUSIVE:
+            return Verdict(result, name)
+    return Verdict(False, name)
+
+
+def utilization(tasks: List[Task]) -> Fraction:
+    """Total CPU utilization of a taskset."""
+
+    return sum((Fraction(t.runtime, t.period) for t in tasks), Fraction(0))
+
+
+def density(tasks: List[Task]) -> Fraction:
+    """Total CPU density of a taskset."""
+
+    return sum((Fraction(t.runtime, min(t.deadline, t.period)) for t in tasks),
+               Fraction(0))
+
+
+@schedulability_test('utilization')
+def utilization_test(tasks: List[Task], cpu_cores: int) -> Optional[bool]:
+    """
+    Rejects tasksets that need more processing time than the node has. This is
+    a necessary condition for any scheduler.
+    """
+
+    if utilization(tasks) > cpu_cores:
+        return REJECTED
+    return INCONCLUSIVE
+
+
+@schedulability_test('density', multiprocessor=False)
+def density_test(tasks: List[Task], cpu_cores: int) -> Optional[bool]:
+    """Sufficient EDF test for a single core: accepts if density is at most 1."""
+
+    if density(tasks) <= 1:
+        return ACCEPTED
+    return INCONCLUSIVE
+
+
+@schedulability_test('qpa', multiprocessor=False)
+def qpa_test(tasks: List[Task], cpu_cores: int) -> Optional[bool]:
+    """
+    Exact EDF test for a single core using Quick Processor-demand Analysis
+    (Zhang & Burns, 2009).
+
+    Instead of checking the processor demand at every absolute deadline up to
+    the analysis bound, QPA walks backwards from the bound, jumping directly to
+    the demand at each step, so only a handful of points are usually checked.
+    """
+
+    if not tasks:
+        return ACCEPTED
+
+    total = utilization(tasks)
+    if total > 1:
+        return REJECTED
+
+    bound = _analysis_bound(tasks, total)
+    d_min = min(t.deadline for t in tasks)
+
+    t = _last_deadline_before(tasks, bound + 1)
+    if t is None:
+        return ACCEPTED
+
+    demand = _demand(tasks, t)
+    while demand <= t and demand > d_min:
+        if demand < t:
+            t = demand
+        else:
+            t = _last_deadline_before(tasks, t)
+            if t is None:
+                return ACCEPTED
+        demand = _demand(tasks, t)
+
+    return ACCEPTED if demand <= d_min else REJECTED
+
+
+@schedulability_test('gfb', uniprocessor=False)
+def gfb_test(tasks: List[Task], cpu_cores: int) -> Optional[bool]:
+    """
+    Sufficient global EDF test by Goossens, Funk and Baruah (2003), in its
+    density form for constrained deadlines:
+
+        sum(density) <= m - (m - 1) * max(density)
+
+    The sum is computed with floats, and only recomputed exactly when it's too
+    close to the bound to tell.
+    """
+
+    if not tasks:
+        return ACCEPTED
+
+    c, d, _ = _columns(tasks)
+    densities = c / d
+    total = densities.sum()
+    bound = cpu_cores - (cpu_cores - 1) * densities.max()
+    if abs(total - bound) > EPSILON:
+        return ACCEPTED if total < bound else INCONCLUSIVE
+
+    # Too close to call with floats, so decide it exactly.
+    densities = [Fraction(int(c_i), int(d_i)) for c_i, d_i in zip(c, d)]
+    if sum(densities) <= cpu_cores - (cpu_cores - 1) * max(densities):
+        return ACCEPTED
+    return INCONCLUSIVE
+
+
+@schedulability_test('bak', uniprocessor=False)
+def bak_test(tasks: List[Task], cpu_cores: int) -> Optional[bool]:
+    """
+    Sufficient global EDF test by Baker (2003), in the form given by
+    Bertogna, Cirinei and Lipari (2005). For every task k, with
+    `lambda_k = C_k / D_k`:
+
+        sum(min(1, beta_i)) <= m * (1 - lambda_k) + lambda_k
+
+    where `beta_i` bounds the load of task i in an interval ending at a missed
+    deadline of task k.
+    """
+
+    # beta_i = U_i * (1 + (T_i - D_i) / D_k) + max(0, C_i - lambda_k * T_i) / D_k
+    c, d, t = (column.astype(float) for column in _columns(tasks))
+    u = c / t
+    w = c * (t - d) / t
+
+    for c_k, d_k in zip(c, d):
+        load_k = c_k / d_k
+        bound = cpu_cores * (1 - load_k) + load_k - EPSILON
+        beta = u + (w + np.maximum(0.0, c - load_k * t)) / d_k
+        if np.minimum(1.0, beta).sum() > bound:
+            return INCONCLUSIVE
+    return ACCEPTED
 
-def check_feasibility(tasks: List[Task], cpu_cores: int) -> bool:
+
+@schedulability_test('bcl', uniprocessor=False)
+def bcl_test(tasks: List[Task], cpu_cores: int) -> Optional[bool]:
+    """
+    Sufficient global EDF test by Bertogna, Cirinei and Lipari (2005), in its
+    form for integer time parameters. For every task k, the interference of
+    the other tasks in a window of length `D_k`, each capped to the slack
+    `D_k - C_k + 1`, must fit in the slack of the `m` cores:
+
+        sum(min(I_i, D_k - C_k + 1)) < m * (D_k - C_k + 1)
+
+    The test only uses integer arithmetic, computing the interference on each
+    task k over the whole taskset at once.
     """
-    Checks if the given taskset is feasible. This comprobation is based on the
-    tasks' CPU utilization.
 
-    If the tasks can be accomplished with the specified time restrictions,
-    returns `True`. If not, returns `False`.
+    c, d, t = _columns(tasks)
+    for k, (c_k, d_k) in enumerate(zip(c, d)):
+        slack = d_k - c_k + 1
+        jobs = np.maximum(0, (d_k - d) // t + 1)
+        workload = jobs * c + np.minimum(c, np.maximum(0, d_k - jobs * t))
+        interference = np.minimum(workload, slack)
+        interference[k] = 0
+
+        if interference.sum() >= cpu_cores * slack:
+            return INCONCLUSIVE
+    return ACCEPTED
+
+
+def _analysis_bound(tasks: List[Task], total: Fraction) -> int:
+    """
+    Returns the last instant where a deadline miss could first happen: the
+    minimum of the synchronous busy period and, if utilization is below one,
+    the L* bound.
     """
 
-    utilization = 0.0
+    busy = _busy_period(tasks)
+    if total == 1:
+        return busy
+
+    l_star = sum((Fraction(t.period - t.deadline) * Fraction(t.runtime, t.period)
+                  for t in tasks), Fraction(0)) / (1 - total)
+    l_star = max(max(t.deadline for t in tasks), math.ceil(l_star))
+    return min(busy, l_star)
+
+
+def _columns(tasks: List[Task]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Returns the runtimes, deadlines and periods of the tasks as integer arrays,
+    so the global EDF tests can evaluate a whole row of the taskset at once.
+    Deadlines longer than the period are shortened to it, which the global EDF
+    tests need and can only make them more pessimistic.
+    """
+
+    columns = np.array([(t.runtime, min(t.deadline, t.period), t.period)
+                        for t in tasks], dtype=np.int64).reshape(-1, 3)
+    return columns[:, 0], columns[:, 1], columns[:, 2]
+
+
+def _busy_period(tasks: List[Task]) -> int:
+    length = sum(t.runtime for t in tasks)
+    while True:
+        new_length = sum(-(-length // t.period) * t.runtime for t in tasks)
+        if new_length == length:
+            return length
+        length = new_length
+
+
+def _demand(tasks: List[Task], t: int) -> int:
+    """Processor demand of the jobs with both release and deadline in [0, t]."""
+
+    return sum(((t - task.deadline) // task.period + 1) * task.runtime
+               for task in tasks if t >= task.deadline)
+
+
+def _last_deadline_before(tasks: List[Task], t: int) -> Optional[int]:
+    """Returns the latest absolute deadline strictly before `t`."""
+
+    latest = None
     for task in tasks:
-        utilization += task.runtime / min(task.deadline, task.period)
+        if t > task.deadline:
+            deadline = task.deadline + \
+                (t - task.deadline - 1) // task.period * task.period
+            if latest is None or deadline > latest:
+                latest = deadline
+    return latest
+
 
-    if utilization <= 1 * cpu_cores:
-        return True
-    return False
+FEASIBILITY_TESTS = [
+    name.strip() for name in os.getenv(
+        'CRANE_FEASIBILITY_TESTS',
+        default='utilization,density,qpa,gfb,bcl,bak'
+    ).split(',')
+]
@@ -0,0 +1,104 @@
+"""
+Partitioning of a node's taskset among its CPU cores.
+
+On nodes using partitioned scheduling every task is pinned to a single core,
+and each core schedules its own tasks with EDF. Since the uniprocessor
+feasibility tests are exact, this allows packing nodes tighter than the global
+EDF tests do.
+
+Tasks are assigned to cores in decreasing density order, using the heuristic
+given by the `CRANE_PARTITION_HEURISTIC` environment variable: first-fit,
+best-fit or worst-fit.
+"""
+
+import os
+from typing import Dict, List, Optional
+
+from shipyard.crane.feasibility import Verdict, check_feasibility, density
+from shipyard.crane.speed import scale
+from shipyard.node.model import PARTITIONED, Node
+from shipyard.task.model import Task
+
+FIRST_FIT = 'first-fit'
+BEST_FIT = 'best-fit'
+WORST_FIT = 'worst-fit'
+
+HEURISTIC = os.getenv('CRANE_PARTITION_HEURISTIC', default=FIRST_FIT)
+
+
+def check_placement(tasks: List[Task], node: Node) -> Verdict:
+    """
+    Checks if the given taskset is feasible on a node, following the node's
+    scheduling policy.
+
+    Runtimes are scaled to the node's speed. On partitioned nodes, the core of
+    every task is updated in place when the taskset is feasible. Tasks keep
+    their current core whenever possible.
+    """
+
+    scaled = scale(tasks, node)
+    if node.scheduling != PARTITIONED:
+        return check_feasibility(scaled, node.cpu_cores)
+
+    cores = partition(scaled, node.cpu_cores)
+    if cores is None:
+        return Verdict(False, HEURISTIC)
+
+    for task, core in zip(tasks, cores):
+        task.core = core
+    return Verdict(True, HEURISTIC)
+
+
+def partition(tasks: List[Task], cpu_cores: int,
+              heuristic: str = HEURISTIC) -> Optional[List[int]]:
+    """
+    Assigns every task to a core so that each core's taskset is feasible.
+
+    Tasks that already have a core keep it and only the rest are placed. If
+    they don't fit this way, the whole taskset is partitioned again from
+    scratch, which can move existing tasks to other cores.
+
+    Returns the core of each task, in the same order as the given tasks, or
+    `None` if no feasible partition is found.
+    """
+
+    cores = _place(tasks, cpu_cores, heuristic, keep=True)
+    if cores is None:
+        cores = _place(tasks, cpu_cores, heuristic, keep=False)
+    return cores
+
+
+def _place(tasks: List[Task], cpu_cores: int, heuristic: str,
+           keep: bool) -> Optional[List[int]]:
+    bins: List[List[Task]] = [[] for _ in range(cpu_cores)]
+    cores: Dict[int, int] = {}
+    pending = []
+
+    for i, task in enumerate(tasks):
+        if keep and task.core is not None and 0 <= task.core < cpu_cores:
+            bins[task.core].append(task)
+            cores[i] = task.core
+        else:
+            pending.append(i)
+
+    if keep and not all(check_feasibility(b, 1) for b in bins if b):
+        return None
+
+    pending.sort(key=lambda i: density([tasks[i]]), reverse=True)
+    for i in pending:
+        fits = [core for core in range(cpu_cores)
+                if check_feasibility(bins[core] + [tasks[i]], 1)]
+        if not fits:
+            return None
+
+        if heuristic == BEST_FIT:
+            core = max(fits, key=lambda c: density(bins[c]))
+        elif heuristic == WORST_FIT:
+            core = min(fits, key=lambda c: density(bins[c]))
+        else:
+            core = fits[0]
+
+        bins[core].append(tasks[i])
+        cores[i] = core
+
+    return [cores[i] for i in range(len(tasks))]
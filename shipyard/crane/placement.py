@@ -0,0 +1,224 @@
+"""
+Selection of the node where a task is deployed.
+
+Candidate nodes are those having the devices the task needs and where the new
+taskset passes the feasibility check of the node's scheduling policy. They are
+then ranked using one of the scoring functions in `SCORINGS`, chosen per
+request or with the `CRANE_PLACEMENT_SCORING` environment variable:
+
+- `spread`: most free utilization left after adding the task.
+- `pack`: least free utilization left after adding the task, so nodes are
+  filled before using new ones.
+- `fewest-tasks`: smallest taskset.
+
+Several tasks can also be placed together with `plan_batch`, which packs them
+jointly instead of one at a time, on as few nodes as it can.
+"""
+
+import dataclasses
+import os
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from shipyard.crane.feasibility import Verdict, density, utilization
+from shipyard.crane.partition import check_placement
+from shipyard.crane.speed import scale
+from shipyard.node.model import Node
+from shipyard.task.model import Task
+
+SCORING = os.getenv('CRANE_PLACEMENT_SCORING', default='spread')
+BUDGET = float(os.getenv('CRANE_PLACEMENT_BUDGET', default='2'))
+
+SCORINGS: Dict[str, Callable[[Node, Task], float]] = {
+    'spread': lambda node, task: float(
+        node.cpu_cores - utilization(scale(node.tasks + [task], node))),
+    'pack': lambda node, task: -float(
+        node.cpu_cores - utilization(scale(node.tasks + [task], node))),
+    'fewest-tasks': lambda node, task: -len(node.tasks)
+}
+
+
+class Candidate(NamedTuple):
+    """A node where a task can be placed, with its copy of the task."""
+
+    node: Node
+    task: Task
+    verdict: Verdict
+    score: float
+
+
+def rank_nodes(task: Task, nodes: List[Node],
+               scoring: str = SCORING) -> List[Candidate]:
+    """
+    Returns the nodes where the task can be placed, best first.
+
+    Everything is computed from the given nodes, so they must be loaded with
+    their tasksets beforehand. Nodes already running the task are skipped.
+    On partitioned nodes, the cores of the candidate's tasks are set as
+    returned by `check_placement`.
+    """
+
+    score = SCORINGS[scoring]
+
+    candidates = []
+    for n in _eligible(task, nodes):
+        node = nodes[n]
+        placed = dataclasses.replace(task, core=None, scaled_runtime=None)
+        verdict = check_placement(node.tasks + [placed], node)
+        if verdict:
+            candidates.append(
+                Candidate(node, placed, verdict, score(node, placed)))
+
+    candidates.sort(key=lambda c: c.score, reverse=True)
+    return candidates
+
+
+class Assignment(NamedTuple):
+    """
+    Tasks planned for a node. The node is a copy whose tasks have the cores
+    they must be moved to, if any.
+    """
+
+    node: Node
+    tasks: List[Task]
+
+
+class _OutOfTime(Exception):
+    pass
+
+
+def plan_batch(tasks: List[Task], nodes: List[Node], budget: float,
+               improve: bool = True) -> Tuple[List[Assignment], List[Task]]:
+    """
+    Computes a joint assignment of several tasks to nodes.
+
+    Tasks are first placed in decreasing density order, each one in the
+    feasible node where it fits tightest. If `improve` is set, a branch and
+    bound search then looks for a better assignment until `budget` seconds
+    have passed since the start: one that places more tasks, or as many
+    tasks using fewer nodes. The search is skipped if the first assignment
+    can't be improved.
+
+    Returns the tasks planned for every node and the tasks that couldn't be
+    placed. The given nodes and tasks are not modified.
+    """
+
+    deadline = time.monotonic() + budget
+    order = sorted(range(len(tasks)), key=lambda i: density([tasks[i]]),
+                   reverse=True)
+    fits = [_eligible(task, nodes) for task in tasks]
+
+    def fresh() -> List[List[Task]]:
+        return [[dataclasses.replace(t) for t in node.tasks] for node in nodes]
+
+    def snapshot() -> List[List[Optional[int]]]:
+        return [[t.core for t in w] for w in working]
+
+    def push(n: int, i: int) -> Optional[List[Optional[int]]]:
+        # Adds the task to the node if it fits, returning the previous cores
+        cores = [t.core for t in working[n]]
+        working[n].append(
+            dataclasses.replace(tasks[i], core=None, scaled_runtime=None))
+        if check_placement(working[n], nodes[n]):
+            return cores
+        working[n].pop()
+        return None
+
+    def pop(n: int, cores: List[Optional[int]]):
+        working[n].pop()
+        for task, core in zip(working[n], cores):
+            task.core = core
+
+    # Plans are compared by how many tasks they place and then by how many
+    # nodes end up with tasks, including the ones that already had some
+    occupied = {n for n, node in enumerate(nodes) if node.tasks}
+
+    def value(placed: int, plan: Dict[int, int]) -> Tuple[int, int]:
+        return placed, -len(occupied.union(plan.values()))
+
+    # No plan does better than placing every task on the nodes that already
+    # have some, or on a single one if none does
+    ideal = (len(tasks), -max(len(occupied), min(len(tasks), 1)))
+
+    # Greedy pass
+    working = fresh()
+    best: Dict[int, int] = {}
+    for i in order:
+        chosen = None
+        for n in fits[i]:
+            cores = push(n, i)
+            if cores is not None:
+                free = nodes[n].cpu_cores - \
+                    utilization(scale(working[n], nodes[n]))
+                if chosen is None or free < chosen[1]:
+                    chosen = (n, free)
+                pop(n, cores)
+        if chosen is not None:
+            push(chosen[0], i)
+            best[i] = chosen[0]
+    best_cores = snapshot()
+    best_value = value(len(best), best)
+
+    # Improvement pass
+    if improve and best_value < ideal:
+        working = fresh()
+        current: Dict[int, int] = {}
+
+        def search(k: int):
+            nonlocal best, best_cores, best_value
+            if time.monotonic() > deadline:
+                raise _OutOfTime
+            # Placing every task left only adds nodes, so this bounds the
+            # value of any plan reached from here
+            if value(len(current) + len(order) - k, current) <= best_value:
+                return
+            if k == len(order):
+                best, best_cores = dict(current), snapshot()
+                best_value = value(len(best), best)
+                return
+
+            i = order[k]
+            for n in fits[i]:
+                cores = push(n, i)
+                if cores is not None:
+                    current[i] = n
+                    search(k + 1)
+                    del current[i]
+                    pop(n, cores)
+                if best_value == ideal:
+                    return
+            search(k + 1)
+
+        try:
+            search(0)
+        except _OutOfTime:
+            pass
+
+    # Rebuild the best plan, in the order its cores were computed in
+    planned: List[List[Task]] = [[] for _ in nodes]
+    for i in order:
+        if i in best:
+            planned[best[i]].append(
+                dataclasses.replace(tasks[i], scaled_runtime=None))
+
+    assignments = []
+    for n, node in enumerate(nodes):
+        if not planned[n]:
+            continue
+        node = dataclasses.replace(node, tasks=[
+            dataclasses.replace(t) for t in node.tasks])
+        for task, core in zip(node.tasks + planned[n], best_cores[n]):
+            task.core = core
+        assignments.append(Assignment(node, planned[n]))
+
+    unplaced = [tasks[i] for i in range(len(tasks)) if i not in best]
+    return assignments, unplaced
+
+
+def _eligible(task: Task, nodes: List[Node]) -> List[int]:
+    devices = set(task.devices)
+    return [
+        n for n, node in enumerate(nodes)
+        if devices.issubset(node.devices)
+        and not any(t._id == task._id for t in node.tasks)
+    ]
@@ -0,0 +1,125 @@
+"""
+Docker client pooling.
+"""
+
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import docker
+from shipyard.node.model import Node
+
+MAX_CLIENTS = int(os.getenv('CRANE_POOL_SIZE', default='4'))
+IDLE_TIMEOUT = float(os.getenv('CRANE_POOL_IDLE_TIMEOUT', default='300'))
+CHECK_INTERVAL = float(os.getenv('CRANE_POOL_CHECK_INTERVAL', default='30'))
+
+
+class ClientPool():
+    """
+    A pool of Docker clients connected to the nodes over SSH.
+
+    Clients are kept open after each operation so the next one on the same node
+    can skip the SSH handshake. Every node has at most `max_clients` clients in
+    use at the same time, idle clients are closed after `idle_timeout` seconds
+    and reused clients are pinged if they haven't been checked in the last
+    `check_interval` seconds.
+    """
+
+    def __init__(self, max_clients: int = MAX_CLIENTS,
+                 idle_timeout: float = IDLE_TIMEOUT,
+                 check_interval: float = CHECK_INTERVAL):
+        self.max_clients = max_clients
+        self.idle_timeout = idle_timeout
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._idle = defaultdict(list)
+        self._slots = {}
+
+    @staticmethod
+    def url(node: Node) -> str:
+        """Returns the Docker server URL of the given node."""
+
+        return f'ssh://{node.ssh_user}@{node.ip}'
+
+    @contextmanager
+    def client(self, node: Node):
+        """
+        Borrows a client connected to the given node.
+
+        The client is returned to the pool when the block exits. If the block
+        fails with something other than a Docker API error the connection is
+        considered broken and the client is closed instead.
+        """
+
+        url = self.url(node)
+        with self._lock:
+            slots = self._slots.setdefault(
+                url, threading.BoundedSemaphore(self.max_clients))
+
+        with slots:
+            client = self._checkout(url)
+            try:
+                yield client
+            except docker.errors.APIError:
+                self._checkin(url, client)
+                raise
+            except BaseException:
+                client.close()
+                raise
+            else:
+                self._checkin(url, client)
+
+    def discard(self, node: Node):
+        """Closes every idle client connected to the given node."""
+
+        with self._lock:
+            entries = self._idle.pop(self.url(node), [])
+        for client, _, _ in entries:
+            client.close()
+
+    def evict_idle(self):
+        """Closes the clients that have been idle for too long."""
+
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            for url, entries in list(self._idle.items()):
+                alive = [e for e in entries if now - e[1] < self.idle_timeout]
+                expired += [e for e in entries if now - e[1] >= self.idle_timeout]
+                if alive:
+                    self._idle[url] = alive
+                else:
+                    del self._idle[url]
+
+        for client, _, _ in expired:
+            client.close()
+
+    def _checkout(self, url: str) -> docker.DockerClient:
+        self.evict_idle()
+
+        while True:
+            with self._lock:
+                entries = self._idle.get(url)
+                if not entries:
+                    break
+                client, _, checked = entries.pop()
+
+            if time.monotonic() - checked < self.check_interval:
+                return client
+            try:
+                client.ping()
+                return client
+            except Exception:
+                client.close()
+
+        return docker.DockerClient(base_url=url)
+
+    def _checkin(self, url: str, client: docker.DockerClient):
+        now = time.monotonic()
+        with self._lock:
+            self._idle[url].append((client, now, now))
+
+
+pool = ClientPool()
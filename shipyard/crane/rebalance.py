@@ -0,0 +1,160 @@
+"""
+Rebalancing of the tasks deployed in the cluster.
+
+After many additions and removals, the free capacity of the cluster ends up
+spread in small pieces among the nodes. The planner in this module computes a
+set of task moves that either makes room for a given task in some node or, if
+no task is given, drains the least loaded nodes. In both cases it tries to move
+as few tasks as possible.
+
+Plans are built so that moves can be executed one at a time, deploying each
+task to its target before removing it from its source. Nodes only lose or only
+receive tasks, so every intermediate taskset is a subset of a feasible one.
+"""
+
+import dataclasses
+import time
+from itertools import combinations
+from typing import Dict, List, NamedTuple, Optional
+
+from shipyard.crane.feasibility import density, utilization
+from shipyard.crane.partition import check_placement
+from shipyard.crane.placement import BUDGET, plan_batch
+from shipyard.crane.speed import scale
+from shipyard.node.model import Node
+from shipyard.task.model import Task
+
+
+class Move(NamedTuple):
+    """
+    A task moved between nodes. The target is a copy of the node whose tasks
+    have the cores they must be moved to, if any.
+    """
+
+    task: Task
+    source: Node
+    target: Node
+
+
+class Plan(NamedTuple):
+    """
+    The moves of a rebalance, along with the node where the requested task can
+    be placed afterwards or the nodes left empty.
+    """
+
+    moves: List[Move]
+    host: Optional[Node] = None
+    freed: List[Node] = []
+
+
+def plan_rebalance(nodes: List[Node], task: Task = None,
+                   budget: float = BUDGET) -> Optional[Plan]:
+    """
+    Computes the moves needed to make room for the given task, or to drain as
+    many nodes as possible if no task is given.
+
+    The search stops after `budget` seconds, returning the best plan found.
+    Returns `None` if no plan makes room for the task.
+    """
+
+    deadline = time.monotonic() + budget
+    if task is not None:
+        return _make_room(nodes, task, deadline)
+    return _drain(nodes, deadline)
+
+
+def _make_room(nodes: List[Node], task: Task, deadline: float) -> Optional[Plan]:
+    devices = set(task.devices)
+    hosts = [
+        node for node in nodes
+        if devices.issubset(node.devices)
+        and not any(t._id == task._id for t in node.tasks)
+    ]
+
+    best: Optional[Plan] = None
+    for host in hosts:
+        others = [node for node in nodes if node is not host]
+        candidates = sorted(host.tasks, key=lambda t: density([t]),
+                            reverse=True)
+
+        for size in range(len(candidates) + 1):
+            if best is not None and size >= len(best.moves):
+                break
+
+            moves = None
+            for evicted in combinations(candidates, size):
+                if time.monotonic() > deadline:
+                    return best
+
+                remaining = [dataclasses.replace(t) for t in candidates
+                             if all(t is not e for e in evicted)]
+                placed = dataclasses.replace(task, core=None,
+                                             scaled_runtime=None)
+                if not check_placement(remaining + [placed], host):
+                    continue
+
+                moves = _relocate(list(evicted), host, others, deadline)
+                if moves is not None:
+                    break
+
+            if moves is not None:
+                best = Plan(moves, host)
+                break
+
+        if best is not None and not best.moves:
+            break
+    return best
+
+
+def _drain(nodes: List[Node], deadline: float) -> Plan:
+    # Current state of every node, including the tasks it has received
+    state: Dict[str, Node] = {node._id: node for node in nodes}
+    freed: List[Node] = []
+    receiving = set()
+    moves: List[Move] = []
+
+    order = sorted((node for node in nodes if node.tasks),
+                   key=lambda n: (utilization(scale(n.tasks, n)) / n.cpu_cores,
+                                  len(n.tasks)))
+    for node in order:
+        if time.monotonic() > deadline:
+            break
+        if node._id in receiving:
+            continue
+
+        others = [state[n._id] for n in nodes
+                  if n._id != node._id and all(n is not f for f in freed)]
+        relocation = _relocate(node.tasks, node, others, deadline)
+        if relocation is None:
+            continue
+
+        received: Dict[str, List[Task]] = {}
+        for move in relocation:
+            received.setdefault(move.target._id, []).append(move.task)
+        for move in relocation:
+            state[move.target._id] = dataclasses.replace(
+                move.target, tasks=move.target.tasks + received[move.target._id])
+            receiving.add(move.target._id)
+
+        moves.extend(relocation)
+        freed.append(node)
+
+    return Plan(moves, freed=freed)
+
+
+def _relocate(tasks: List[Task], source: Node, nodes: List[Node],
+              deadline: float) -> Optional[List[Move]]:
+    """Plans moving all the given tasks from their node to the others."""
+
+    if not tasks:
+        return []
+
+    budget = max(0.0, deadline - time.monotonic())
+    assignments, unplaced = plan_batch(tasks, nodes, budget)
+    if unplaced:
+        return None
+
+    return [
+        Move(moved, source, assignment.node)
+        for assignment in assignments for moved in assignment.tasks
+    ]
@@ -2,19 +2,94 @@
 Task removal logic.
 """
 
+from typing import List
+
 import docker
+from shipyard.crane import fanout
+from shipyard.crane.deploy import CACHE_REPOSITORY
+from shipyard.crane.pool import pool
 from shipyard.node.model import Node
 
 
-def remove_task(task_name: str, node: Node):
+def remove_task(task_name: str, node: Node, digest: str = None):
     """
     Removes a task from a given node.
 
-    This function connects to the node's Docker server and removes both the
-    task's container and its image.
+    This function borrows a client connected to the node's Docker server from
+    the pool and removes both the task's container and its image.
+
+    Images built from a file with a known content hash are kept in the node's
+    cache so the task can be deployed again without rebuilding it. If `digest`
+    is given, the cached image built from that file is dropped too.
+    """
+
+    with pool.client(node) as client:
+        client.containers.get(task_name).remove(force=True)
+        client.images.remove(image=task_name)
+        if digest is not None:
+            _drop_cached_image(client, digest)
+
+
+def drop_cached_image(digest: str, node: Node):
+    """
+    Drops the image cached in a given node that was built from the file with
+    the given content hash, if there's one.
+    """
+
+    with pool.client(node) as client:
+        _drop_cached_image(client, digest)
+
+
+def remove_tasks(task_names: List[str], node: Node) -> List[dict]:
     """
+    Removes several tasks from a given node concurrently.
+
+    Returns a report with the result of every removal, which can be
+    `succeeded`, `failed` or `timed_out`.
+    """
+
+    futures = {
+        name: fanout.submit(node, remove_task, name, node)
+        for name in task_names
+    }
+    return fanout.collect(futures, key='task')
+
+
+def remove_from_nodes(task_name: str, nodes: List[Node], digest: str = None) -> List[dict]:
+    """
+    Removes a task from several nodes concurrently, dropping the cached image
+    built from the file with the given content hash if there's one.
+
+    Returns a report with the result of the removal on every node, identified
+    by its ID.
+    """
+
+    futures = {
+        str(node._id): fanout.submit(
+            node, remove_task, task_name, node, digest)
+        for node in nodes
+    }
+    return fanout.collect(futures, key='node')
+
+
+def drop_from_nodes(digest: str, nodes: List[Node]) -> List[dict]:
+    """
+    Drops the cached image built from the file with the given content hash
+    from several nodes concurrently, such as the ones a task was removed from
+    before its file stopped being used.
+
+    Returns a report with the result on every node, identified by its ID.
+    """
+
+    futures = {
+        str(node._id): fanout.submit(node, drop_cached_image, digest, node)
+        for node in nodes
+    }
+    return fanout.collect(futures, key='node')
+
 
-    client = docker.DockerClient(base_url=f'ssh://{node.ssh_user}@{node.ip}')
-    client.containers.get(task_name).remove(force=True)
-    client.images.remove(image=task_name)
-    client.close()
+def _drop_cached_image(client: docker.DockerClient, digest: str):
+    try:
+        client.images.remove(image=f'{CACHE_REPOSITORY}:{digest}')
+    except docker.errors.ImageNotFound:
+        pass
@@ -0,0 +1,44 @@
+"""
+Scaling of task runtimes to the speed of each node.
+
+Tasks can declare the CPU frequency their runtime was measured at, in the same
+unit as the nodes' `cpu_freq`. On a node with a different frequency, the
+runtime is scaled proportionally, so every node is treated as a set of
+identical cores running at its own speed.
+
+The scaled runtime of the tasks deployed to a node is stored along with them,
+so the node's taskset can be checked without scaling it again.
+"""
+
+import dataclasses
+from typing import List
+
+from shipyard.node.model import Node
+from shipyard.task.model import Task
+
+
+def scaled_runtime(task: Task, node: Node) -> int:
+    """
+    Returns the runtime the task needs on the given node, rounded up.
+
+    If either the task's reference frequency or the node's frequency are
+    unknown, the runtime is used as is.
+    """
+
+    if not task.ref_freq or not node.cpu_freq:
+        return task.runtime
+    return -(-task.runtime * task.ref_freq // node.cpu_freq)
+
+
+def scale(tasks: List[Task], node: Node) -> List[Task]:
+    """
+    Returns copies of the given tasks with their runtime scaled to the node,
+    using the precomputed value when there is one.
+    """
+
+    return [
+        dataclasses.replace(task, runtime=task.scaled_runtime)
+        if task.scaled_runtime is not None
+        else dataclasses.replace(task, runtime=scaled_runtime(task, node))
+        for task in tasks
+    ]
@@ -28,3 +28,11 @@ class MissingDevices(Exception):
     """
 
     pass
+
+
+class Conflict(Exception):
+    """
+    Error used when an object keeps changing while trying to update it.
+    """
+
+    pass
@@ -0,0 +1,36 @@
+"""
+Conditional requests.
+
+Responses carry a weak `ETag` built from the version of what they contain, and
+requests whose `If-None-Match` header has the same tag get an empty 304
+response instead, before anything is serialized.
+"""
+
+import hug
+
+
+def etag(*parts) -> str:
+    """Returns a weak entity tag made of the given parts."""
+
+    return 'W/"{}"'.format('-'.join(str(part) for part in parts))
+
+
+def not_modified(request, response, tag: str) -> bool:
+    """
+    Sets the response's `ETag` header to the given tag and checks it against
+    the request's `If-None-Match` header. If it matches, sets the response's
+    status to 304 and returns `True`.
+    """
+
+    response.set_header('ETag', tag)
+    header = request.get_header('If-None-Match')
+    if header is None:
+        return False
+
+    # Weak comparison, as the tags only change along with the content
+    tags = {t.strip()[2:] if t.strip().startswith('W/') else t.strip()
+            for t in header.split(',')}
+    if '*' in tags or tag[2:] in tags:
+        response.status = hug.HTTP_NOT_MODIFIED
+        return True
+    return False
@@ -0,0 +1,20 @@
+"""
+API controllers for database index related operations.
+"""
+
+import hug
+from shipyard.index.service import IndexService
+
+
+@hug.get('/')
+def get_index_report(response):
+    """
+    Retrieve the indexes of every collection and the query plans of the
+    lookups done by the server, to check that they are served by indexes.
+    """
+
+    try:
+        return IndexService.report()
+    except Exception:
+        response.status = hug.HTTP_INTERNAL_SERVER_ERROR
+        return {'error': 'Unable to fetch index report.'}
@@ -0,0 +1,103 @@
+"""
+Business logic for the database indexes.
+"""
+
+from typing import Dict, List
+
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import OperationFailure
+from shipyard.db import db
+
+# Indexes every collection must have
+INDEXES: Dict[str, List[IndexModel]] = {
+    'nodes': [
+        IndexModel([('name', ASCENDING)], name='name', unique=True),
+        IndexModel([('tasks._id', ASCENDING)], name='tasks._id')
+    ],
+    'tasks': [
+        IndexModel([('name', ASCENDING)], name='name', unique=True)
+    ],
+    'uploads': [
+        IndexModel([('updated', ASCENDING)], name='updated')
+    ],
+    'fs.files': [
+        IndexModel([('digest', ASCENDING)], name='digest')
+    ],
+    # Resumable uploads write chunks without GridFS creating its index first
+    'fs.chunks': [
+        IndexModel([('files_id', ASCENDING), ('n', ASCENDING)],
+                   name='files_id_1_n_1', unique=True)
+    ]
+}
+
+# Queries run by the services, explained in the report
+LOOKUPS = {
+    'node by name': ('nodes', {'name': ''}),
+    'task by name': ('tasks', {'name': ''}),
+    'nodes running a task': ('nodes', {'tasks._id': ObjectId()}),
+    'task file by digest': ('fs.files', {'digest': '', 'refs': {'$gt': 0}})
+}
+
+
+class IndexService():
+    """Index business logic."""
+
+    @staticmethod
+    def ensure() -> List[str]:
+        """
+        Creates the declared indexes that don't exist yet.
+
+        Returns the names of the indexes that couldn't be created, such as
+        unique indexes over fields that already have repeated values.
+        """
+
+        failed = []
+        for collection, indexes in INDEXES.items():
+            for index in indexes:
+                try:
+                    db[collection].create_indexes([index])
+                except OperationFailure:
+                    failed.append(f'{collection}.{index.document["name"]}')
+        return failed
+
+    @staticmethod
+    def report() -> dict:
+        """
+        Returns the indexes of every collection, with the declared ones that
+        are missing, and the query plan of every lookup in `LOOKUPS`: its
+        stages and the indexes it uses.
+        """
+
+        collections = {}
+        for collection, indexes in INDEXES.items():
+            present = db[collection].index_information()
+            collections[collection] = {
+                'indexes': sorted(present),
+                'missing': [index.document['name'] for index in indexes
+                            if index.document['name'] not in present]
+            }
+
+        lookups = []
+        for name, (collection, query) in LOOKUPS.items():
+            plan = db[collection].find(query).explain()
+            stages, indexes = [], []
+            IndexService._walk(
+                plan['queryPlanner']['winningPlan'], stages, indexes)
+            lookups.append({
+                'name': name,
+                'collection': collection,
+                'stages': stages,
+                'indexes': indexes
+            })
+
+        return {'collections': collections, 'lookups': lookups}
+
+    @staticmethod
+    def _walk(stage: dict, stages: List[str], indexes: List[str]):
+        stages.append(stage['stage'])
+        if 'indexName' in stage:
+            indexes.append(stage['indexName'])
+        for child in stage.get('inputStages', [stage.get('inputStage')]):
+            if child is not None:
+                IndexService._walk(child, stages, indexes)
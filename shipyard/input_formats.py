@@ -3,18 +3,53 @@ Custom hug input formats.
 """
 
 from hug.format import content_type
-from multipart import MultipartParser
+from shipyard.task.artifacts import Upload
+from shipyard.multipart import parse_multipart
+
+
+class _Skipped():
+    """A file part that is read and dropped."""
+
+    def __init__(self, file_name: str):
+        pass
+
+    def write(self, chunk: bytes):
+        pass
+
+    def close(self):
+        pass
+
+    def abort(self):
+        pass
 
 
 @content_type('multipart/form-data')
 def multipart(body, **header_params):
-    """Format for multipart requests."""
-
-    if header_params and 'boundary' in header_params:
-        if type(header_params['boundary']) is str:
-            header_params['boundary'] = header_params['boundary'].encode()
-    parser = MultipartParser(
-        stream=body, boundary=header_params['boundary'], disk_limit=17179869184)
-    form = dict(zip([p.name for p in parser.parts()],
-                    [(p.filename, p.file) if p.filename else p.file.read().decode() for p in parser.parts()]))
-    return form
+    """
+    Format for multipart requests to the endpoints that take task files.
+
+    Files are stored as task artifacts while the body is read, and are given
+    as `(file_name, upload)` pairs.
+    """
+
+    return parse_multipart(body, _boundary(header_params), Upload)
+
+
+@content_type('multipart/form-data')
+def form_fields(body, **header_params):
+    """
+    Format for multipart requests to any other endpoint.
+
+    Only the form's text fields are kept. Files are read without storing them.
+    """
+
+    form = parse_multipart(body, _boundary(header_params), _Skipped)
+    return {name: value for name, value in form.items()
+            if not isinstance(value, tuple)}
+
+
+def _boundary(header_params: dict) -> bytes:
+    boundary = header_params['boundary']
+    if type(boundary) is str:
+        boundary = boundary.encode()
+    return boundary
@@ -0,0 +1,53 @@
+"""
+API controllers for deployment job related operations.
+"""
+
+import hug
+from bson.objectid import InvalidId
+from shipyard.errors import NotFound
+from shipyard.job.model import Job
+from shipyard.job.service import JobService
+from shipyard.serialization import schema
+
+
+@hug.get('/')
+def get_job_list(response, node_id: str = None, status: str = None):
+    """
+    Retrieve the full list of jobs, optionally filtered by node or status.
+
+    If the given node ID is invalid, returns a 400 response.
+    """
+
+    try:
+        results = JobService.get_all(node_id, status)
+        return schema(Job, exclude=['phases']).dump(results, many=True)
+    except InvalidId as e:
+        response.status = hug.HTTP_BAD_REQUEST
+        return {'error': str(e)}
+    except Exception:
+        response.status = hug.HTTP_INTERNAL_SERVER_ERROR
+        return {'error': 'Unable to fetch job list.'}
+
+
+@hug.get('/{job_id}')
+def get_job(job_id: str, response):
+    """
+    Retrieve the job with the given ID, including the timings of each of its
+    phases.
+
+    If no job is found, returns a 404 response. If the given ID is invalid,
+    returns a 400 response.
+    """
+
+    try:
+        result = JobService.get_by_id(job_id)
+        return schema(Job).dump(result)
+    except InvalidId as e:
+        response.status = hug.HTTP_BAD_REQUEST
+        return {'error': str(e)}
+    except NotFound as e:
+        response.status = hug.HTTP_NOT_FOUND
+        return {'error': str(e)}
+    except Exception:
+        response.status = hug.HTTP_INTERNAL_SERVER_ERROR
+        return {'error': 'Unable to fetch job.'}
@@ -0,0 +1,58 @@
+"""
+The deployment job model.
+"""
+
+from dataclasses import field
+from typing import ClassVar, List, Optional, Type
+
+from marshmallow import Schema
+from marshmallow_dataclass import NewType, dataclass
+from shipyard.fields import ObjectId
+
+objectid = NewType('objectid', str, ObjectId)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+
+@dataclass
+class Phase:
+    """A timed step of a deployment, such as uploading or building."""
+
+    name: str
+    started: float
+    finished: Optional[float] = field(default=None, metadata={
+        'required': False
+    })
+
+
+@dataclass
+class Job:
+    """
+    A deployment of a task to a node that runs in the background, in the
+    server process with the ID given by `worker`.
+    """
+
+    _id: Optional[objectid] = field(metadata={'required': False})
+    node_id: objectid
+    task_id: objectid
+    status: str = QUEUED
+    phases: List[Phase] = field(default_factory=lambda: [], metadata={
+        'required': False
+    })
+    error: Optional[str] = field(default=None, metadata={'required': False})
+    resumed: bool = False
+    worker: Optional[str] = field(default=None, metadata={'required': False})
+    created: Optional[float] = field(default=None, metadata={
+        'required': False
+    })
+    started: Optional[float] = field(default=None, metadata={
+        'required': False
+    })
+    finished: Optional[float] = field(default=None, metadata={
+        'required': False
+    })
+
+    Schema: ClassVar[Type[Schema]] = Schema
@@ -0,0 +1,186 @@
+"""
+Business logic for deployment job related operations.
+"""
+
+import os
+import time
+from typing import List
+
+from bson.objectid import ObjectId
+from pymongo import ReturnDocument
+from shipyard.crane.fanout import KeyedExecutor
+from shipyard.crane.remove import remove_task
+from shipyard.db import db
+from shipyard.errors import NotFound
+from shipyard.job.model import FAILED, QUEUED, RUNNING, SUCCEEDED, Job
+from shipyard.leases import WORKER, live
+from shipyard.node.model import Node, with_task
+from shipyard.node.service import NodeService
+from shipyard.serialization import schema
+
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', default='4'))
+
+executor = KeyedExecutor(JOB_WORKERS, 1, 'jobs')
+
+
+class JobService():
+    """Deployment job business logic."""
+
+    @staticmethod
+    def get_all(node_id: str = None, status: str = None) -> List[Job]:
+        """
+        Fetch all jobs from the database, optionally filtered by node or
+        status. The timings of the jobs' phases aren't fetched.
+        """
+
+        query = {}
+        if node_id is not None:
+            query['node_id'] = ObjectId(node_id)
+        if status is not None:
+            query['status'] = status
+        return schema(Job).load(db.jobs.find(query, {'phases': False}),
+                                 many=True)
+
+    @staticmethod
+    def get_by_id(job_id: str) -> Job:
+        """
+        Fetch a job from the database by its ID.
+
+        Raises a `NotFound` error if no job is found with the given ID.
+        """
+
+        result = db.jobs.find_one({'_id': ObjectId(job_id)})
+        if result is None:
+            raise NotFound('No job found with the given ID.')
+        return schema(Job).load(result)
+
+    @staticmethod
+    def create(node_id: str, task_id: str) -> str:
+        """
+        Queues the deployment of a task to a node.
+
+        The task is admitted to the node right away, so this method raises the
+        same errors as `NodeService.add_task`. The job is then stored and run
+        in the background, and its new ID is returned.
+        """
+
+        node, task, _ = NodeService.admit(node_id, task_id)
+
+        job_id = db.jobs.insert_one({
+            'node_id': node._id,
+            'task_id': task._id,
+            'status': QUEUED,
+            'phases': [],
+            'resumed': False,
+            'worker': WORKER,
+            'created': time.time()
+        }).inserted_id
+
+        JobService._submit(job_id, node._id)
+        return str(job_id)
+
+    @staticmethod
+    def resume() -> int:
+        """
+        Queues again the unfinished jobs of the server processes that stopped,
+        returning how many there are.
+
+        Only the jobs of processes whose lease expired are taken over, so jobs
+        still queued or running in other processes are left alone. Jobs that
+        were running are marked as resumed, so the remains of their interrupted
+        deployment are cleaned up before running them again.
+        """
+
+        jobs = db.jobs.find(
+            {'status': {'$in': [QUEUED, RUNNING]}, 'worker': {'$nin': live()}},
+            {'node_id': True, 'status': True, 'worker': True}
+        ).sort('created')
+
+        resumed = 0
+        for job in list(jobs):
+            values = {'status': QUEUED, 'worker': WORKER}
+            if job['status'] == RUNNING:
+                values['resumed'] = True
+
+            # Another process may be taking it over too
+            taken = db.jobs.update_one(
+                {
+                    '_id': job['_id'],
+                    'status': job['status'],
+                    'worker': job.get('worker')
+                },
+                {'$set': values}
+            )
+            if taken.modified_count:
+                JobService._submit(job['_id'], job['node_id'])
+                resumed += 1
+        return resumed
+
+    @staticmethod
+    def run(job_id: ObjectId):
+        """
+        Executes a queued job.
+
+        The task is admitted to the node again, since its taskset may have
+        changed while the job was queued, and then deployed. The start and end
+        times of every deployment phase are saved as they happen.
+        """
+
+        job = db.jobs.find_one_and_update(
+            {'_id': job_id, 'status': QUEUED},
+            {'$set': {'status': RUNNING, 'started': time.time(), 'phases': []}},
+            return_document=ReturnDocument.AFTER
+        )
+        if job is None:
+            return
+
+        phases = []
+
+        def progress(phase: str):
+            now = time.time()
+            if phases:
+                phases[-1]['finished'] = now
+            phases.append({'name': phase, 'started': now})
+            db.jobs.update_one({'_id': job_id}, {'$set': {'phases': phases}})
+
+        try:
+            if not (job['resumed'] and JobService._recover(job)):
+                node, task, _ = NodeService.admit(job['node_id'],
+                                                  job['task_id'])
+                NodeService.deploy(node, task, progress)
+            result = {'status': SUCCEEDED}
+        except Exception as e:
+            result = {'status': FAILED, 'error': str(e)}
+
+        now = time.time()
+        if phases:
+            phases[-1]['finished'] = now
+        db.jobs.update_one(
+            {'_id': job_id},
+            {'$set': {**result, 'phases': phases, 'finished': now}}
+        )
+
+    @staticmethod
+    def _submit(job_id: ObjectId, node_id: ObjectId):
+        executor.submit(str(node_id), JobService.run, job_id)
+
+    @staticmethod
+    def _recover(job: dict) -> bool:
+        if db.nodes.count_documents({'_id': job['node_id'],
+                                     'tasks._id': job['task_id'],
+                                     'reserved': {'$ne': job['task_id']}}):
+            return True
+
+        node = db.nodes.find_one({'_id': job['node_id']},
+                                 with_task(job['task_id']))
+        task = db.tasks.find_one({'_id': job['task_id']}, {'name': True})
+        if node is not None:
+            node = schema(Node).load(node)
+            if node.tasks:
+                NodeService.release(node, node.tasks[0])
+        if node is not None and task is not None:
+            try:
+                remove_task(task['name'], node)
+            except Exception:
+                pass
+        return False
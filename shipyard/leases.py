@@ -0,0 +1,70 @@
+"""
+Leases of the server processes on the work they have in progress.
+
+Several server processes can share the database. Each one has its own
+`WORKER` ID, which it stores along with the work it starts, and holds a lease
+in the `workers` collection that it renews every third of `LEASE_TTL`
+seconds while it runs.
+
+Work stored with the ID of a process whose lease expired was left behind by a
+process that stopped, and is taken over by the recovery functions that every
+process runs after renewing its lease. Work of the processes still running is
+never taken over.
+"""
+
+import os
+import threading
+import time
+from typing import Callable, List
+
+from bson.objectid import ObjectId
+from shipyard.db import db
+
+LEASE_TTL = float(os.getenv('LEASE_TTL', default='60'))
+
+WORKER = str(ObjectId())
+
+
+def renew(now: float = None):
+    """Extends the lease of this process and removes the expired ones."""
+
+    now = time.time() if now is None else now
+    db.workers.update_one({'_id': WORKER},
+                          {'$set': {'expires': now + LEASE_TTL}}, upsert=True)
+    db.workers.delete_many({'expires': {'$lte': now}})
+
+
+def live(now: float = None) -> List[str]:
+    """
+    Returns the IDs of the processes whose lease hasn't expired, which always
+    include this one.
+    """
+
+    now = time.time() if now is None else now
+    workers = db.workers.find({'expires': {'$gt': now}}, {'_id': True})
+    return list({WORKER, *(worker['_id'] for worker in workers)})
+
+
+def hold(*recoveries: Callable[[], int]):
+    """
+    Renews the lease of this process and runs the given recovery functions,
+    in order. Then keeps doing so in the background while the process runs.
+    """
+
+    def beat():
+        while True:
+            time.sleep(LEASE_TTL / 3)
+            try:
+                _renew(recoveries)
+            except Exception:
+                # The database may be unreachable for a while
+                pass
+
+    _renew(recoveries)
+    threading.Thread(target=beat, name='leases', daemon=True).start()
+
+
+def _renew(recoveries):
+    renew()
+    for recover in recoveries:
+        recover()
@@ -0,0 +1,123 @@
+"""
+Streaming parser of multipart requests.
+
+The body is read in chunks and every file part is written to its destination
+as it arrives, so a file is never held whole in memory or spooled to disk
+first. Other parts are small form fields, kept in memory up to `FIELD_LIMIT`
+bytes each.
+"""
+
+import email
+import os
+from typing import BinaryIO, Callable, Dict, Union
+
+CHUNK_SIZE = 255 * 1024
+FIELD_LIMIT = int(os.getenv('UPLOAD_FIELD_LIMIT', default='1048576'))
+HEADER_LIMIT = 16 * 1024
+
+
+class UploadError(ValueError):
+    """Raised when a multipart body is malformed or a field is too large."""
+
+
+def parse_multipart(stream: BinaryIO, boundary: bytes,
+                    open_file: Callable[[str], object]
+                    ) -> Dict[str, Union[str, tuple]]:
+    """
+    Parses a multipart body read from the stream.
+
+    Returns the form fields by name. Text fields are decoded as UTF-8, and
+    file fields are `(file_name, file)` pairs, where the file is the object
+    returned by `open_file(file_name)`. File data is passed to its `write`
+    method chunk by chunk and its `close` method is called when the part
+    ends. If parsing fails, the `abort` method of every file is called and an
+    `UploadError` is raised.
+    """
+
+    files = []
+    try:
+        return _parse(stream, boundary, open_file, files)
+    except BaseException:
+        for file in files:
+            file.abort()
+        raise
+
+
+def _parse(stream: BinaryIO, boundary: bytes, open_file: Callable,
+           files: list) -> dict:
+    delimiter = b'\r\n--' + boundary
+    form = {}
+
+    # The first boundary isn't preceded by a line break
+    buffer = b'\r\n'
+    eof = False
+
+    def fill() -> bool:
+        nonlocal buffer, eof
+        if eof:
+            return False
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            eof = True
+            return False
+        buffer += chunk
+        return True
+
+    # Skip the preamble
+    while delimiter not in buffer:
+        buffer = buffer[-len(delimiter):]
+        if not fill():
+            raise UploadError('The body has no multipart boundary.')
+    buffer = buffer[buffer.index(delimiter) + len(delimiter):]
+
+    while True:
+        while len(buffer) < 2 and fill():
+            pass
+        if buffer.startswith(b'--'):
+            return form
+        if not buffer.startswith(b'\r\n'):
+            raise UploadError('Malformed multipart boundary.')
+        buffer = buffer[2:]
+
+        while b'\r\n\r\n' not in buffer:
+            if len(buffer) > HEADER_LIMIT or not fill():
+                raise UploadError('Malformed multipart part headers.')
+        end = buffer.index(b'\r\n\r\n')
+        headers = email.message_from_bytes(buffer[:end + 2])
+        buffer = buffer[end + 4:]
+
+        name = headers.get_param('name', header='content-disposition')
+        file_name = headers.get_filename()
+        if name is None:
+            raise UploadError('Multipart part without a name.')
+
+        if file_name:
+            file = open_file(file_name)
+            files.append(file)
+            write = file.write
+        else:
+            field = bytearray()
+
+            def write(data: bytes):
+                if len(field) + len(data) > FIELD_LIMIT:
+                    raise UploadError(f'The {name} field is too large.')
+                field.extend(data)
+
+        while delimiter not in buffer:
+            # Keep what could be the start of a delimiter split across reads
+            keep = len(delimiter) - 1
+            if len(buffer) > keep:
+                write(buffer[:-keep])
+                buffer = buffer[-keep:]
+            if not fill():
+                raise UploadError('Unexpected end of multipart body.')
+
+        end = buffer.index(delimiter)
+        write(buffer[:end])
+        buffer = buffer[end + len(delimiter):]
+
+        if file_name:
+            file.close()
+            form[name] = (file_name, file)
+        else:
+            form[name] = field.decode()
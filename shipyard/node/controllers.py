@@ -7,32 +7,87 @@ import base64
 import hug
 from bson.objectid import InvalidId
 from marshmallow import ValidationError
-from shipyard.errors import (AlreadyPresent, MissingDevices, NotFeasible,
-                             NotFound)
+from shipyard.errors import (AlreadyPresent, Conflict, MissingDevices,
+                             NotFeasible, NotFound)
+from shipyard.etags import etag, not_modified
+from shipyard.job.service import JobService
 from shipyard.node.model import Node
 from shipyard.node.service import NodeService
+from shipyard.serialization import dump_trusted, schema
+from shipyard.streaming import JSON, NDJSON, accepts_ndjson
+from shipyard.streaming import stream as stream_documents
 
 
 @hug.get('/')
-def get_node_list(response, name: str = None):
+def get_node_list(request, response, name: str = None,
+                  summary: hug.types.smart_boolean = False,
+                  stream: hug.types.smart_boolean = False,
+                  limit: hug.types.number = None, after: str = None,
+                  cpu_arch: str = None, device: str = None,
+                  min_free: hug.types.float_number = None):
     """
-    Retrieve the full list of nodes or a node with a given name.
+    Retrieve the list of nodes or a node with a given name.
 
     If the `name` parameter is specified in the request, this function attempts
     to return the node with that name. If it is not found, returns a 404
     response.
 
-    If no name is given, the function returns the full list of nodes present in
-    the system.
+    If no name is given, the function returns the list of nodes present in
+    the system, along with their load. If the `summary` parameter is set, the
+    nodes' tasks are left out. Nodes can be filtered by `cpu_arch`, by a
+    `device` they have and by the minimum utilization left in their cores
+    with `min_free`.
+
+    If `limit` is given, at most that many nodes are returned and the
+    `X-Next-Cursor` header holds the value to pass as `after` to get the next
+    ones, unless there are no more. If the limit or the cursor are invalid,
+    returns a 400 response.
+
+    If the `stream` parameter is set, or the request accepts NDJSON, the nodes
+    are sent as they are read from the database, as a JSON array or as NDJSON.
+    Streamed lists have no `X-Next-Cursor` header, and the ID of the last node
+    is used as `after` instead.
+
+    The response has an `ETag` header that changes whenever any node changes.
+    If the request's `If-None-Match` header has the same tag, returns an empty
+    304 response.
     """
 
     try:
         if name is not None:
             result = NodeService.get_by_name(name)
-            return Node.Schema().dump(result)
-
-        results = NodeService.get_all()
-        return Node.Schema(only=['_id', 'name', 'ip', 'cpu', 'cpu_arch', 'tasks._id', 'tasks.name']).dump(results, many=True)
+            if not_modified(request, response, _etag(result)):
+                return None
+            return schema(Node).dump(result)
+
+        fields = ['_id', 'name', 'ip', 'cpu', 'cpu_arch', 'load']
+        if not summary:
+            fields += ['tasks._id', 'tasks.name']
+
+        ndjson = accepts_ndjson(request)
+        response.set_header('Vary', 'Accept')
+        tag = etag('nodes', NodeService.get_version(),
+                   NDJSON if ndjson else JSON)
+        if not_modified(request, response, tag):
+            return None
+
+        if stream or ndjson:
+            results = NodeService.iterate(
+                fields, limit, after, cpu_arch, device, min_free)
+            response.content_type = NDJSON if ndjson else JSON
+            return stream_documents(results, ndjson)
+
+        results, cursor = NodeService.get_page(
+            fields, limit, after, cpu_arch, device, min_free)
+        if cursor is not None:
+            response.set_header('X-Next-Cursor', cursor)
+        return dump_trusted(results)
+    except ValidationError as e:
+        response.status = hug.HTTP_BAD_REQUEST
+        return {'error': e.messages}
+    except InvalidId as e:
+        response.status = hug.HTTP_BAD_REQUEST
+        return {'error': str(e)}
     except NotFound as e:
         response.status = hug.HTTP_NOT_FOUND
         return {'error': str(e)}
@@ -41,6 +96,12 @@ def get_node_list(response, name: str = None):
         return {'error': 'Unable to fetch node list.'}
 
 
+def _etag(node: Node) -> str:
+    # Finishing a deployment only removes the task from the reserved ones,
+    # without increasing the node's version
+    return etag(node._id, node.version, len(node.reserved))
+
+
 @hug.post('/')
 def post_node(request, body, response):
     """
@@ -58,7 +119,7 @@ def post_node(request, body, response):
         decoded_auth = base64.b64decode(auth_header.split()[1]).decode()
         ssh_user, ssh_pass = decoded_auth.split(':')
 
-        new_node = Node.Schema().load(body)
+        new_node = schema(Node).load(body)
 
         new_id = NodeService.create(new_node, ssh_user, ssh_pass)
         return {'_id': new_id}
@@ -73,18 +134,60 @@ def post_node(request, body, response):
         return {'error': 'Unable to create node.' + str(e)}
 
 
+@hug.post('/rebalance')
+def post_rebalance(response, task_id: str = None,
+                   execute: hug.types.smart_boolean = False,
+                   budget: hug.types.float_number = None):
+    """
+    Plan moving tasks between nodes to make room for the task with the given
+    ID or, if no ID is given, to free as many nodes as possible.
+
+    Returns the planned moves in the response, along with the node that can
+    host the task or the nodes that are freed. If the `execute` parameter is
+    set, the moves are carried out and the result of each one is included.
+
+    If no task is found, returns a 404 response. If the given ID or budget are
+    invalid, returns a 400 response. If no rebalance can make room for the
+    task, returns a 500 response.
+    """
+
+    try:
+        return NodeService.rebalance(task_id, execute, budget)
+    except ValidationError as e:
+        response.status = hug.HTTP_BAD_REQUEST
+        return {'error': e.messages}
+    except InvalidId as e:
+        response.status = hug.HTTP_BAD_REQUEST
+        return {'error': str(e)}
+    except NotFound as e:
+        response.status = hug.HTTP_NOT_FOUND
+        return {'error': str(e)}
+    except NotFeasible as e:
+        response.status = hug.HTTP_INTERNAL_SERVER_ERROR
+        return {'error': str(e)}
+    except Exception:
+        response.status = hug.HTTP_INTERNAL_SERVER_ERROR
+        return {'error': 'Unable to rebalance nodes.'}
+
+
 @hug.get('/{node_id}')
-def get_node(node_id: str, response):
+def get_node(node_id: str, request, response):
     """
     Retrieve the node with the given ID.
 
     If no node is found, returns a 404 response. If the given ID is invalid,
     returns a 400 response.
+
+    The response has an `ETag` header that changes whenever the node changes.
+    If the request's `If-None-Match` header has the same tag, returns an empty
+    304 response.
     """
 
     try:
         result = NodeService.get_by_id(node_id)
-        return Node.Schema().dump(result)
+        if not_modified(request, response, _etag(result)):
+            return None
+        return schema(Node).dump(result)
     except InvalidId as e:
         response.status = hug.HTTP_BAD_REQUEST
         return {'error': str(e)}
@@ -101,15 +204,17 @@ def put_node(node_id: str, body, response):
     """
     Put the values given in the body in a node resource.
 
-    Returns the updated node resource in the response.
+    Returns the updated node resource in the response, along with the result of
+    every task removal triggered by the update.
 
     If no node is found, returns a 404 response. If the given ID is invalid,
-    returns a 400 response.
+    returns a 400 response. If the new name is already in use or the node keeps
+    changing while it's updated, returns a 409 response.
     """
 
     try:
-        result = NodeService.update(node_id, body)
-        return Node.Schema().dump(result)
+        result, removals = NodeService.update(node_id, body)
+        return {**schema(Node).dump(result), 'removals': removals}
     except ValidationError as e:
         response.status = hug.HTTP_BAD_REQUEST
         return {'error': e.messages}
@@ -119,6 +224,9 @@ def put_node(node_id: str, body, response):
     except NotFound as e:
         response.status = hug.HTTP_NOT_FOUND
         return {'error': str(e)}
+    except (AlreadyPresent, Conflict) as e:
+        response.status = hug.HTTP_CONFLICT
+        return {'error': str(e)}
     except Exception:
         response.status = hug.HTTP_INTERNAL_SERVER_ERROR
         return {'error': 'Unable to update node.'}
@@ -129,15 +237,19 @@ def delete_node(node_id: str, response):
     """
     Delete the node with the given ID.
 
-    Returns the deleted node's data in the response.
+    Returns the deleted node's data in the response, along with the result of
+    the removal of each of its tasks.
 
     If no node is found, returns a 404 response. If the given ID is invalid,
     returns a 400 response.
     """
 
     try:
-        result = NodeService.delete(node_id)
-        return Node.Schema(exclude=['_id', 'tasks']).dump(result)
+        result, removals = NodeService.delete(node_id)
+        return {
+            **schema(Node, exclude=['_id', 'tasks']).dump(result),
+            'removals': removals
+        }
     except InvalidId as e:
         response.status = hug.HTTP_BAD_REQUEST
         return {'error': str(e)}
@@ -150,17 +262,27 @@ def delete_node(node_id: str, response):
 
 
 @hug.post('/{node_id}/tasks')
-def post_node_tasks(node_id: str, response, task_id: str = None):
+def post_node_tasks(node_id: str, response, task_id: str = None,
+                    background: hug.types.smart_boolean = False):
     """
     Add a task to a node using their IDs.
 
-    Returns the updated node's data in the response.
+    Returns the updated node's data in the response, along with the name of the
+    feasibility test that accepted the new taskset in `feasibility`.
+
+    If the `background` parameter is set, the task is only checked against the
+    node before returning a 202 response with the ID of a deployment job. The
+    deployment then runs in the background and its progress can be followed
+    through `/jobs/{job_id}`.
 
     If no task ID is present in the request or any ID is invalid, returns a 400
     response.
 
     If no node or task are found with the given IDs, returns a 404 response.
 
+    If the task is already in the node or the node keeps changing while the
+    task is admitted, returns a 409 response.
+
     If the operation can't be finished, returns a 500 response.
     """
 
@@ -169,17 +291,22 @@ def post_node_tasks(node_id: str, response, task_id: str = None):
         return {'error': 'No task ID was specified in the request'}
 
     try:
-        result = NodeService.add_task(node_id, task_id)
-        if result is None:
-            response.status = hug.HTTP_INTERNAL_SERVER_ERROR
-            return {'error': 'Unable to add task to node.'}
-        return Node.Schema().dump(result)
+        if background:
+            job_id = JobService.create(node_id, task_id)
+            response.status = hug.HTTP_ACCEPTED
+            return {'_id': job_id}
+
+        result, verdict = NodeService.add_task(node_id, task_id)
+        return {**schema(Node).dump(result), 'feasibility': verdict.test}
     except InvalidId as e:
         response.status = hug.HTTP_BAD_REQUEST
         return {'error': str(e)}
     except NotFound as e:
         response.status = hug.HTTP_NOT_FOUND
         return {'error': str(e)}
+    except (AlreadyPresent, Conflict) as e:
+        response.status = hug.HTTP_CONFLICT
+        return {'error': str(e)}
     except (NotFeasible, MissingDevices) as e:
         response.status = hug.HTTP_INTERNAL_SERVER_ERROR
         return {'error': str(e)}
@@ -208,7 +335,7 @@ def delete_node_tasks(node_id: str, task_id: str, response):
         if result is None:
             response.status = hug.HTTP_INTERNAL_SERVER_ERROR
             return {'error': 'Unable to add task to node.'}
-        return Node.Schema().dump(result)
+        return schema(Node).dump(result)
     except InvalidId as e:
         response.status = hug.HTTP_BAD_REQUEST
         return {'error': str(e)}
@@ -0,0 +1,178 @@
+"""
+Load summaries of the nodes.
+
+Every node document carries a `load` summary of its taskset. Instead of
+computing it again from the tasks, the updates built here change the summary
+with `$inc` in the same operation that adds, removes or changes a task, so it
+always matches the stored taskset.
+
+These updates also increase the node's version, which admissions use to
+detect concurrent changes to the taskset.
+
+The summary is enough to decide most admissions without loading the node's
+tasks, using `check_load`.
+"""
+
+from typing import Dict, List, Optional
+
+from shipyard.crane.feasibility import (EPSILON, FEASIBILITY_TESTS, Verdict,
+                                        density, utilization)
+from shipyard.crane.partition import BEST_FIT, HEURISTIC, WORST_FIT
+from shipyard.crane.speed import scale
+from shipyard.node.model import DOT, PARTITIONED, Load, Node
+from shipyard.serialization import schema
+from shipyard.task.model import Task
+
+
+def summarize(tasks: List[Task], node: Node) -> Load:
+    """Computes the load summary of the given taskset on a node."""
+
+    load = Load(free=float(node.cpu_cores))
+    for field, value in _increments(tasks, node, 1).items():
+        keys = field.split('.')[1:]
+        if len(keys) == 1:
+            setattr(load, keys[0], getattr(load, keys[0]) + value)
+        else:
+            values = getattr(load, keys[0])
+            values[keys[1]] = values.get(keys[1], 0) + value
+    return load
+
+
+def push_task(task: Task, node: Node) -> dict:
+    """Returns the update that adds a task to a node's taskset."""
+
+    return {
+        '$push': {'tasks': _document(task)},
+        '$inc': {**_increments([task], node, 1), 'version': 1}
+    }
+
+
+def pull_task(task: Task, node: Node) -> dict:
+    """
+    Returns the update that removes a task from a node's taskset. It must be
+    applied only if the task is in the node.
+    """
+
+    return {
+        '$pull': {'tasks': {'_id': task._id}},
+        '$inc': {**_increments([task], node, -1), 'version': 1}
+    }
+
+
+def replace_task(old: Task, new: Task, node: Node) -> dict:
+    """
+    Returns the update that replaces a task in a node's taskset with a new
+    version. It must be applied to the task's element with the positional
+    operator.
+    """
+
+    return {
+        '$set': {'tasks.$': _document(new)},
+        '$inc': {
+            **_merge(_increments([old], node, -1), _increments([new], node, 1)),
+            'version': 1
+        }
+    }
+
+
+def repin_task(task: Task, old_core: Optional[int], node: Node) -> dict:
+    """
+    Returns the update that moves a task from its old core to its current one.
+    It must be applied to the task's element with the positional operator.
+    """
+
+    load = float(density(scale([task], node)))
+    increments = {}
+    if old_core is not None:
+        increments[f'load.cores.{old_core}'] = -load
+    if task.core is not None:
+        increments = _merge(increments, {f'load.cores.{task.core}': load})
+
+    return {
+        '$set': {'tasks.$.core': task.core},
+        '$inc': {**increments, 'version': 1}
+    }
+
+
+def set_tasks(tasks: List[Task], node: Node) -> dict:
+    """
+    Returns the update that replaces a node's whole taskset, along with its
+    summary. It must only be applied if the node's version hasn't changed.
+    """
+
+    return {
+        '$set': {
+            'tasks': [_document(task) for task in tasks],
+            'load': schema(Load).dump(summarize(tasks, node))
+        },
+        '$inc': {'version': 1}
+    }
+
+
+def check_load(task: Task, node: Node) -> Optional[Verdict]:
+    """
+    Decides if the task can be added to the node using only its load summary.
+
+    Rejects the task if the node's utilization would exceed its cores. Accepts
+    it if the density of a single core stays at most one: the whole node on
+    single-core nodes, or the core chosen with the partitioning heuristic on
+    partitioned nodes, which is set as the task's core. Returns `None` if the
+    summary isn't enough to decide.
+    """
+
+    scaled = scale([task], node)
+    if node.load.utilization + float(utilization(scaled)) > \
+            node.cpu_cores + EPSILON:
+        return Verdict(False, 'utilization')
+
+    load = float(density(scaled))
+    if node.scheduling == PARTITIONED:
+        fits = [core for core in range(node.cpu_cores)
+                if node.load.cores.get(str(core), 0) + load <= 1 - EPSILON]
+        if not fits:
+            return None
+
+        if HEURISTIC == BEST_FIT:
+            core = max(fits, key=lambda c: node.load.cores.get(str(c), 0))
+        elif HEURISTIC == WORST_FIT:
+            core = min(fits, key=lambda c: node.load.cores.get(str(c), 0))
+        else:
+            core = fits[0]
+
+        task.core = core
+        return Verdict(True, HEURISTIC)
+
+    if node.cpu_cores == 1 and 'density' in FEASIBILITY_TESTS and \
+            node.load.density + load <= 1 - EPSILON:
+        return Verdict(True, 'density')
+    return None
+
+
+def _document(task: Task) -> dict:
+    return {**schema(Task).dump(task), '_id': task._id, 'file_id': task.file_id}
+
+
+def _increments(tasks: List[Task], node: Node, sign: int) -> Dict[str, float]:
+    increments: Dict[str, float] = {}
+    for task in scale(tasks, node):
+        load = float(density([task]))
+        used = float(utilization([task]))
+        task_increments = {
+            'load.tasks': sign,
+            'load.utilization': sign * used,
+            'load.density': sign * load,
+            'load.free': -sign * used
+        }
+        if task.core is not None:
+            task_increments[f'load.cores.{task.core}'] = sign * load
+        for device in task.devices:
+            task_increments[f'load.devices.{device.replace(".", DOT)}'] = sign
+        increments = _merge(increments, task_increments)
+    return increments
+
+
+def _merge(first: Dict[str, float], second: Dict[str, float]) -> Dict[str, float]:
+    merged = dict(first)
+    for field, value in second.items():
+        merged[field] = merged.get(field, 0) + value
+    return merged
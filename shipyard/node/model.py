@@ -2,10 +2,12 @@
 The node model.
 """
 
+import dataclasses
 from dataclasses import field
-from typing import ClassVar, List, Optional, Type
+from typing import ClassVar, Dict, List, Optional, Type
 
-from marshmallow import Schema
+import bson
+from marshmallow import Schema, validate
 from marshmallow_dataclass import NewType, dataclass
 from shipyard.fields import ObjectId
 from shipyard.task.model import Task
@@ -13,10 +15,44 @@ from shipyard.validators import validate_devices, validate_ip
 
 objectid = NewType('objectid', str, ObjectId)
 
+GLOBAL = 'global'
+PARTITIONED = 'partitioned'
+
+# Field names in MongoDB can't contain dots
+DOT = '\uff0e'
+
+
+@dataclass
+class Load:
+    """
+    Summary of a node's taskset, updated along with it.
+
+    Runtimes are scaled to the node's speed. `free` is the utilization left
+    in the node's cores, `cores` holds the density of the tasks pinned to
+    each core and `devices` the number of tasks using each device, with dots
+    in the device paths replaced by `DOT`.
+    """
+
+    tasks: int = 0
+    utilization: float = 0.0
+    density: float = 0.0
+    free: float = 0.0
+    cores: Dict[str, float] = field(default_factory=lambda: {})
+    devices: Dict[str, int] = field(default_factory=lambda: {})
+
+    Schema: ClassVar[Type[Schema]] = Schema
+
 
 @dataclass(order=True)
 class Node:
-    """A node is a device where tasks can be deployed."""
+    """
+    A node is a device where tasks can be deployed.
+
+    The version is increased on every change to the node's taskset. Tasks
+    being deployed are already in the taskset, and their IDs are listed in
+    `reserved` until the deployment finishes. `reserved_by` holds the ID of
+    the server process deploying each of them, by task ID.
+    """
 
     _id: Optional[objectid] = field(metadata={'required': False})
     name: str
@@ -34,5 +70,30 @@ class Node:
     tasks: List[Task] = field(default_factory=lambda: [], metadata={
         'required': False
     })
+    builder: bool = field(default=False, metadata={'required': False})
+    scheduling: str = field(default=GLOBAL, metadata={
+        'required': False,
+        'validate': validate.OneOf([GLOBAL, PARTITIONED])
+    })
+    load: Load = field(default_factory=Load, metadata={'required': False})
+    version: int = field(default=0, metadata={'required': False})
+    reserved: List[objectid] = field(default_factory=lambda: [], metadata={
+        'required': False
+    })
+    reserved_by: Dict[str, str] = field(default_factory=lambda: {}, metadata={
+        'required': False
+    })
 
     Schema: ClassVar[Type[Schema]] = Schema
+
+
+def with_task(task_id: bson.ObjectId) -> dict:
+    """
+    Projection of a node document that only keeps the task with the given ID
+    in its taskset.
+    """
+
+    return {
+        **{f.name: True for f in dataclasses.fields(Node) if f.name != 'tasks'},
+        'tasks': {'$elemMatch': {'_id': task_id}}
+    }
@@ -2,23 +2,44 @@
 Business logic for node related operations.
 """
 
-from typing import List
+import dataclasses
+import os
+from typing import Callable, Iterable, List, Optional, Tuple
 
 import gridfs
 from bson.objectid import ObjectId
+from marshmallow import ValidationError
 from pymongo import ReturnDocument
-from shipyard.crane.deploy import deploy_task
-from shipyard.crane.feasibility import check_feasibility
-from shipyard.crane.remove import remove_task
+from pymongo.errors import DuplicateKeyError
+from shipyard.cache.documents import node_cache, task_cache
+from shipyard.crane import fanout
+from shipyard.crane.deploy import deploy_task, pin_task
+from shipyard.crane.feasibility import Verdict
+from shipyard.crane.fanout import FAILED, SKIPPED, SUCCEEDED
+from shipyard.crane.partition import check_placement
+from shipyard.crane.placement import BUDGET
+from shipyard.crane.rebalance import Move, plan_rebalance
+from shipyard.crane.pool import pool
+from shipyard.crane.remove import remove_task, remove_tasks
+from shipyard.crane.speed import scaled_runtime
 from shipyard.crane.set_up import set_up_node
 from shipyard.db import db
-from shipyard.errors import (AlreadyPresent, MissingDevices, NotFeasible,
-                             NotFound)
-from shipyard.node.model import Node
+from shipyard.errors import (AlreadyPresent, Conflict, MissingDevices,
+                             NotFeasible, NotFound)
+from shipyard.job.model import QUEUED, RUNNING
+from shipyard.leases import WORKER, live
+from shipyard.node.load import (check_load, pull_task, push_task, repin_task,
+                                 set_tasks, summarize)
+from shipyard.node.model import PARTITIONED, Load, Node, with_task
+from shipyard.pagination import find_page, paginate
+from shipyard.serialization import schema
 from shipyard.task.model import Task
+from shipyard.versions import bump, version
 
 fs = gridfs.GridFS(db)
 
+ADMISSION_RETRIES = int(os.getenv('NODE_ADMISSION_RETRIES', default='5'))
+
 
 class NodeService():
     """Node business logic."""
@@ -27,33 +48,102 @@ class NodeService():
     def get_all() -> List[Node]:
         """Fetch all nodes from the database."""
 
-        return Node.Schema().load(db.nodes.find(), many=True)
+        return schema(Node).load(db.nodes.find(), many=True)
+
+    @staticmethod
+    def get_page(fields: List[str], limit: int = None, after: str = None,
+                 cpu_arch: str = None, device: str = None,
+                 min_free: float = None) -> Tuple[List[dict], Optional[str]]:
+        """
+        Fetch a page of nodes from the database, with only the given fields.
+
+        Nodes can be filtered by CPU architecture, by a device they have and by
+        the minimum utilization left in their cores. Returns the node documents
+        and the cursor of the next page, as described in `paginate`.
+        """
+
+        query = NodeService._filter(cpu_arch, device, min_free)
+        return paginate(db.nodes, query, fields, limit, after)
+
+    @staticmethod
+    def iterate(fields: List[str], limit: int = None, after: str = None,
+                cpu_arch: str = None, device: str = None,
+                min_free: float = None) -> Iterable[dict]:
+        """
+        Returns a cursor over the nodes that `get_page` would fetch, reading
+        them from the database as it is iterated.
+        """
+
+        query = NodeService._filter(cpu_arch, device, min_free)
+        return find_page(db.nodes, query, fields, limit, after)
+
+    @staticmethod
+    def _filter(cpu_arch: str, device: str, min_free: float) -> dict:
+        query = {}
+        if cpu_arch is not None:
+            query['cpu_arch'] = cpu_arch
+        if device is not None:
+            query['devices'] = device
+        if min_free is not None:
+            query['load.free'] = {'$gte': min_free}
+        return query
+
+    @staticmethod
+    def get_version() -> int:
+        """
+        Returns the version of the nodes, which increases whenever any
+        node changes.
+        """
+
+        return version(db.nodes)
 
     @staticmethod
     def get_by_id(node_id: str) -> Node:
         """
-        Fetch a node from the database by its ID.
+        Fetch a node by its ID, from the cache if possible.
 
         Raises a `NotFound` error if no node is found with the given ID.
         """
 
-        result = db.nodes.find_one({'_id': ObjectId(node_id)})
+        node_id = ObjectId(node_id)
+        result = node_cache.get(
+            node_id, lambda: db.nodes.find_one({'_id': node_id}))
         if result is None:
             raise NotFound('No node found with the given ID.')
-        return Node.Schema().load(result)
+        return result
 
     @staticmethod
     def get_by_name(node_name: str) -> Node:
         """
-        Fetch a node from the database by its name.
+        Fetch a node by its name, from the cache if possible.
 
         Raises a `NotFound` error if no node is found with the given name.
         """
 
-        result = db.nodes.find_one({'name': node_name})
+        result = node_cache.get_by_name(
+            node_name, lambda: db.nodes.find_one({'name': node_name}))
         if result is None:
             raise NotFound('No node found with the given name.')
-        return Node.Schema().load(result)
+        return result
+
+    @staticmethod
+    def summarize():
+        """
+        Computes the load summary of the nodes stored without a complete one or
+        without a version, such as those created by previous versions.
+        """
+
+        for node in db.nodes.find({'$or': [{'load.free': {'$exists': False}},
+                                           {'version': {'$exists': False}}]}):
+            node = schema(Node).load(node)
+            db.nodes.update_one(
+                {'_id': node._id},
+                {'$set': {
+                    'load': schema(Load).dump(summarize(node.tasks, node)),
+                    'version': node.version
+                }}
+            )
+            bump(db.nodes, node._id)
 
     @staticmethod
     def create(new_node: Node, ssh_user: str, ssh_pass: str) -> str:
@@ -65,76 +155,163 @@ class NodeService():
         is returned.
         """
 
-        result = db.nodes.find_one({'name': new_node.name})
+        result = db.nodes.find_one({'name': new_node.name}, {'_id': True})
         if result is not None:
             raise AlreadyPresent('A node already exists with the given name.')
 
         set_up_node(new_node.ip, ssh_user, ssh_pass)
 
-        new_id = db.nodes.insert_one(
-            {
-                **Node.Schema(exclude=['_id']).dump(new_node),
-                'ssh_user': ssh_user
-            }
-        ).inserted_id
+        try:
+            new_id = db.nodes.insert_one(
+                {
+                    **schema(Node, exclude=['_id']).dump(new_node),
+                    'ssh_user': ssh_user,
+                    'load': schema(Load).dump(
+                        summarize(new_node.tasks, new_node))
+                }
+            ).inserted_id
+        except DuplicateKeyError:
+            raise AlreadyPresent('A node already exists with the given name.')
+        bump(db.nodes)
         return str(new_id)
 
     @staticmethod
-    def update(node_id: str, new_values: dict) -> Node:
+    def update(node_id: str, new_values: dict) -> Tuple[Node, List[dict]]:
         """
         Updates an existing node.
 
         The node is retrieved using the given ID and updated with the values
-        specified in the given dictionary. Returns the updated node.
+        specified in the given dictionary. Returns the updated node and the
+        report of the task removals triggered by the update.
 
-        If no node is found with the given ID, raises a `NotFound` exception.
-        """
+        Changing the node's devices or connection details removes all of its
+        tasks. The removals run concurrently and the update is applied even if
+        some of them fail or time out. Changing its frequency scales the
+        runtime of its tasks again.
 
-        node = db.nodes.find_one({'_id': ObjectId(node_id)})
-        if node is None:
-            raise NotFound('No node found with the given ID.')
-        node = Node.Schema().load(node)
+        The update is only applied if the node hasn't changed since it was
+        read, comparing its version, so tasks reserved in the meantime aren't
+        lost. Otherwise, it's computed again from the current node, up to
+        `ADMISSION_RETRIES` times.
 
-        if any(k in new_values for k in ('devices', 'ssh_user', 'ip')):
-            for task in node.tasks:
-                remove_task(task.name, node)
-            new_values = {**new_values, 'tasks': []}
+        If no node is found with the given ID, raises a `NotFound` exception.
+        If the new values include the node's load, version or reservations,
+        raises a `ValidationError`. If the new name is already in use, raises
+        an `AlreadyPresent` error. If the node keeps changing, raises a
+        `Conflict` error.
+        """
 
-        updated_node = db.nodes.find_one_and_update(
-            {'_id': node._id},
-            {'$set': new_values},
-            return_document=ReturnDocument.AFTER
-        )
+        for key in ('load', 'version', 'reserved', 'reserved_by'):
+            if key in new_values:
+                raise ValidationError(f'The {key} of a node can\'t be set.')
+
+        # The tasks are only needed if the update changes them
+        reset = any(k in new_values for k in ('devices', 'ssh_user', 'ip'))
+        projection = None if reset or 'cpu_freq' in new_values \
+            else {'tasks': False}
+
+        removals = []
+        removed = set()
+        for _ in range(ADMISSION_RETRIES + 1):
+            node = db.nodes.find_one({'_id': ObjectId(node_id)}, projection)
+            if node is None:
+                raise NotFound('No node found with the given ID.')
+            node = schema(Node).load(node)
+
+            if reset:
+                # Tasks added since a previous attempt are removed too
+                names = [task.name for task in node.tasks
+                         if task.name not in removed]
+                removals += remove_tasks(names, node)
+                removed.update(names)
+                pool.discard(node)
+
+            values, increments = NodeService._changes(node, new_values, reset)
+            try:
+                updated_node = db.nodes.find_one_and_update(
+                    {'_id': node._id, 'version': node.version},
+                    {'$set': values, '$inc': increments},
+                    return_document=ReturnDocument.AFTER
+                )
+            except DuplicateKeyError:
+                raise AlreadyPresent(
+                    'A node already exists with the given name.')
+            if updated_node is not None:
+                break
+        else:
+            raise Conflict('The node changed too many times while updating '
+                           'it')
+        bump(db.nodes, node._id)
+
+        return schema(Node).load(updated_node), removals
 
-        return Node.Schema().load(updated_node)
+    @ staticmethod
+    def _changes(node: Node, new_values: dict, reset: bool) -> Tuple[dict, dict]:
+        # The values set by an update of the node as read and the increments
+        increments = {'version': 1}
+        if 'cpu_cores' in new_values:
+            increments['load.free'] = new_values['cpu_cores'] - node.cpu_cores
+            node.cpu_cores = new_values['cpu_cores']
+
+        if reset:
+            return {
+                **new_values,
+                'tasks': [],
+                'load': schema(Load).dump(summarize([], node))
+            }, {'version': 1}
+
+        if 'cpu_freq' in new_values:
+            node.cpu_freq = new_values['cpu_freq']
+            tasks = [
+                dataclasses.replace(
+                    task, scaled_runtime=scaled_runtime(task, node))
+                for task in node.tasks
+            ]
+            return {
+                **new_values,
+                'tasks': [
+                    {
+                        **schema(Task).dump(task),
+                        '_id': task._id,
+                        'file_id': task.file_id
+                    }
+                    for task in tasks
+                ],
+                'load': schema(Load).dump(summarize(tasks, node))
+            }, {'version': 1}
+
+        return new_values, increments
 
     @ staticmethod
-    def delete(node_id: str) -> Node:
+    def delete(node_id: str) -> Tuple[Node, List[dict]]:
         """
         Removes the node with the given ID from the database.
 
-        Returns the node that has been deleted. If no node is found with the
-        given ID, this method returns `None`.
+        The node's tasks are removed concurrently. Returns the node that has
+        been deleted and the report of the task removals. If no node is found
+        with the given ID, raises a `NotFound` exception.
         """
 
         node = db.nodes.find_one({'_id': ObjectId(node_id)})
         if node is None:
             raise NotFound('No node found with the given ID.')
-        node = Node.Schema().load(node)
+        node = schema(Node).load(node)
 
         db.nodes.delete_one({'_id': ObjectId(node_id)})
+        bump(db.nodes, node._id)
 
-        for task in node.tasks:
-            remove_task(task.name, node)
+        removals = remove_tasks([task.name for task in node.tasks], node)
+        pool.discard(node)
 
-        return node
+        return node, removals
 
     @ staticmethod
-    def add_task(node_id: str, task_id: str) -> Node:
+    def add_task(node_id: str, task_id: str) -> Tuple[Node, Verdict]:
         """
         Adds a new task to the given node's taskset.
 
-        Returns the updated node with the new task added to its task list.
+        Returns the updated node with the new task added to its task list,
+        along with the verdict of the feasibility check that accepted it.
 
         If the node or the task can't be found using the given IDs, raises a
         `NotFound` exception.
@@ -146,37 +323,234 @@ class NodeService():
         `NotFeasible` exception.
         """
 
-        node = db.nodes.find_one({'_id': ObjectId(node_id)})
-        if node is None:
-            raise NotFound('No node found with the given ID')
-        node = Node.Schema().load(node)
+        node, task, verdict = NodeService.admit(node_id, task_id)
+        return NodeService.deploy(node, task), verdict
+
+    @ staticmethod
+    def admit(node_id: str, task_id: str) -> Tuple[Node, Task, Verdict]:
+        """
+        Checks if a task can be added to the given node's taskset.
+
+        Returns the node, the task and the feasibility verdict if the task can
+        be added. Raises the same errors as `add_task` otherwise.
+
+        On nodes with partitioned scheduling, the returned task and the node's
+        tasks have the cores they must be pinned to set.
+
+        The node and the task are read from the cache if possible. The node's
+        load summary is checked first, and its tasks are only kept if the
+        summary isn't enough to decide. Otherwise, the returned node has no
+        tasks.
+        """
 
-        task = db.tasks.find_one({'_id': ObjectId(task_id)})
+        node = NodeService.get_by_id(node_id)
+
+        task_id = ObjectId(task_id)
+        task = task_cache.get(
+            task_id, lambda: db.tasks.find_one({'_id': task_id}))
         if task is None:
             raise NotFound('No task found with the given ID')
-        task = Task.Schema().load(task)
+
+        # Runtimes are only scaled and tasks pinned by the nodes' tasksets
+        task.scaled_runtime = task.core = None
 
         if not set(task.devices).issubset(set(node.devices)):
             raise MissingDevices(
                 'The target node doesn\'t have the needed devices for the task'
             )
 
-        if check_feasibility(node.tasks + [task], node.cpu_cores) is False:
-            raise NotFeasible('The new taskset isn\'t feasible')
+        tasks, node.tasks = node.tasks, []
+        return node, task, NodeService._check(node, task, tasks)
+
+    @ staticmethod
+    def _check(node: Node, task: Task, tasks: List[Task] = None) -> Verdict:
+        verdict = check_load(task, node)
+        if verdict is None:
+            if tasks is None:
+                stored = db.nodes.find_one({'_id': node._id}, {'tasks': True})
+                tasks = schema(Task).load(stored['tasks'], many=True)
+            node.tasks = tasks
+            verdict = check_placement(node.tasks + [task], node)
+        if not verdict:
+            raise NotFeasible(
+                f'The new taskset isn\'t feasible ({verdict.test} test)')
+        return verdict
 
-        with fs.get(task.file_id) as task_file:
-            deploy_task(task_file, task, node)
+    @ staticmethod
+    def deploy(node: Node, task: Task, progress: Callable[[str], None] = None) -> Node:
+        """
+        Deploys an admitted task to the given node and adds it to the node's
+        taskset.
+
+        Returns the updated node. The `progress` function, if given, is called
+        with the name of every deployment phase as it begins.
+
+        Before deploying it, the task is added to the node's taskset only if
+        the node hasn't changed since it was admitted, comparing its version.
+        If it has, the task is admitted again against the current taskset, up
+        to `ADMISSION_RETRIES` times. The task is removed from the taskset if
+        the deployment fails.
+
+        Tasks already in the node whose core was changed during admission get
+        their new core in the same write that adds the task, and are moved to
+        it before deploying the task. If moving them fails, they're moved back.
+        The task's runtime scaled to the node's speed is stored along with it.
+
+        Raises a `Conflict` error if the node keeps changing, an
+        `AlreadyPresent` error if the task is already in the node and the same
+        errors as `admit` if the task can't be admitted again.
+        """
 
-        updated_node = db.nodes.find_one_and_update({'_id': ObjectId(node_id)},
-                                                    {'$push': {
-                                                        'tasks': {
-                                                            **Task.Schema().dump(task),
-                                                            '_id': ObjectId(task_id),
-                                                            'file_id': ObjectId(task.file_id)
-                                                        }
+        for attempt in range(ADMISSION_RETRIES + 1):
+            if attempt:
+                stored = db.nodes.find_one({'_id': node._id}, {'tasks': False})
+                if stored is None:
+                    raise NotFound('No node found with the given ID')
+                node = schema(Node).load(stored)
+                NodeService._check(node, task)
+            cores = NodeService._reserve(node, task)
+            if cores is not None:
+                break
+        else:
+            raise Conflict('The node changed too many times while admitting '
+                           'the task')
+
+        try:
+            NodeService._repin(node, cores)
+            with fs.get(task.file_id) as task_file:
+                deploy_task(task_file, task, node, progress)
+        except Exception:
+            NodeService.release(node, task)
+            raise
+
+        updated_node = db.nodes.find_one_and_update({'_id': node._id},
+                                                    {'$pull': {
+                                                        'reserved': task._id
+                                                    }, '$unset': {
+                                                        f'reserved_by.{task._id}': True
                                                     }},
                                                     return_document=ReturnDocument.AFTER)
-        return Node.Schema().load(updated_node)
+        bump(db.nodes, node._id)
+        return schema(Node).load(updated_node)
+
+    @ staticmethod
+    def release(node: Node, task: Task):
+        """
+        Removes a task whose deployment didn't finish from the node's taskset,
+        freeing the capacity reserved for it.
+        """
+
+        NodeService._unreserve(node, task, {})
+
+    @ staticmethod
+    def recover() -> int:
+        """
+        Releases the tasks left reserved in the nodes by deployments of server
+        processes that stopped, removing whatever was deployed of them, and
+        returns how many there are.
+
+        Only the reservations of processes whose lease expired are released,
+        so deployments still running in other processes are left alone. The
+        reservations of unfinished deployment jobs are kept too, since the
+        jobs recover them when they're resumed.
+        """
+
+        workers = set(live())
+        jobs = {
+            (job['node_id'], job['task_id'])
+            for job in db.jobs.find({'status': {'$in': [QUEUED, RUNNING]}},
+                                    {'node_id': True, 'task_id': True})
+        }
+
+        futures = {}
+        for stored in db.nodes.find({'reserved.0': {'$exists': True}}):
+            node = schema(Node).load(stored)
+            for task in node.tasks:
+                owner = node.reserved_by.get(str(task._id))
+                if task._id not in node.reserved or owner in workers or \
+                        (node._id, task._id) in jobs:
+                    continue
+
+                # Another process may be releasing it too
+                if NodeService._unreserve(
+                        node, task, {f'reserved_by.{task._id}': owner}):
+                    futures[f'{node.name}/{task.name}'] = fanout.submit(
+                        node, remove_task, task.name, node)
+
+        fanout.collect(futures, key='task')
+        return len(futures)
+
+    @ staticmethod
+    def _unreserve(node: Node, task: Task, query: dict) -> bool:
+        update = pull_task(task, node)
+        update['$pull']['reserved'] = task._id
+        update['$unset'] = {f'reserved_by.{task._id}': True}
+        result = db.nodes.update_one(
+            {'_id': node._id, 'tasks._id': task._id, **query}, update)
+        bump(db.nodes, node._id)
+        return result.modified_count > 0
+
+    @ staticmethod
+    def _reserve(node: Node, task: Task) -> Optional[dict]:
+        # Returns the cores the node's tasks had before adding the task, or
+        # None if the node changed since it was read
+        task.scaled_runtime = scaled_runtime(task, node)
+        if node.scheduling == PARTITIONED and node.tasks:
+            # The admission may have moved tasks to other cores
+            update = set_tasks(node.tasks + [task], node)
+        else:
+            update = push_task(task, node)
+        update.setdefault('$push', {})['reserved'] = task._id
+        update.setdefault('$set', {})[f'reserved_by.{task._id}'] = WORKER
+
+        reserved = db.nodes.find_one_and_update(
+            {
+                '_id': node._id,
+                'version': node.version,
+                'tasks._id': {'$ne': task._id}
+            },
+            update,
+            {'version': True, 'tasks._id': True, 'tasks.core': True},
+            return_document=ReturnDocument.BEFORE
+        )
+        if reserved is not None:
+            bump(db.nodes, node._id)
+            node.version = reserved['version'] + 1
+            return {t['_id']: t.get('core') for t in reserved['tasks']}
+
+        if db.nodes.count_documents({'_id': node._id, 'tasks._id': task._id}):
+            raise AlreadyPresent('The task is already deployed in the node')
+        return None
+
+    @ staticmethod
+    def _repin(node: Node, cores: dict):
+        moved = [task for task in node.tasks
+                 if task._id in cores and task.core != cores[task._id]]
+
+        pinned = []
+        try:
+            for task in moved:
+                pin_task(task.name, node, task.core)
+                pinned.append(task)
+        except Exception:
+            for task in pinned:
+                try:
+                    pin_task(task.name, node, cores[task._id])
+                except Exception:
+                    pass
+            for task in moved:
+                # Unless someone else moved it again
+                old = dataclasses.replace(task, core=cores[task._id])
+                db.nodes.update_one(
+                    {
+                        '_id': node._id,
+                        'tasks': {'$elemMatch': {'_id': task._id,
+                                                 'core': task.core}}
+                    },
+                    repin_task(old, task.core, node)
+                )
+            bump(db.nodes, node._id)
+            raise
 
     @ staticmethod
     def remove_task(node_id: str, task_id: str) -> Node:
@@ -189,21 +563,91 @@ class NodeService():
         `NotFound` exception.
         """
 
-        node = db.nodes.find_one({'_id': ObjectId(node_id)})
+        node = db.nodes.find_one({'_id': ObjectId(node_id)},
+                                 with_task(ObjectId(task_id)))
         if node is None:
             raise NotFound('No node found with the given ID')
-        node = Node.Schema().load(node)
+        node = schema(Node).load(node)
 
-        task = db.tasks.find_one({'_id': ObjectId(task_id)})
+        task = db.tasks.find_one({'_id': ObjectId(task_id)}, {'name': True})
         if task is None:
             raise NotFound('No task found with the given ID')
-        task = Task.Schema().load(task)
 
-        remove_task(task.name, node)
+        remove_task(task['name'], node)
 
-        updated_node = db.nodes.find_one_and_update({'_id': ObjectId(node_id)},
-                                                    {'$pull': {
-                                                        'tasks': {'_id': ObjectId(task_id)}
-                                                    }},
+        if not node.tasks:
+            return NodeService.get_by_id(node_id)
+
+        updated_node = db.nodes.find_one_and_update({'_id': node._id, 'tasks._id': task['_id']},
+                                                    pull_task(node.tasks[0], node),
                                                     return_document=ReturnDocument.AFTER)
-        return Node.Schema().load(updated_node)
+        bump(db.nodes, node._id)
+        if updated_node is None:
+            return NodeService.get_by_id(node_id)
+        return schema(Node).load(updated_node)
+
+    @ staticmethod
+    def rebalance(task_id: str = None, execute: bool = False, budget: float = None) -> dict:
+        """
+        Plans moving tasks between nodes to make room for the task with the
+        given ID or, if no ID is given, to leave as many nodes empty as
+        possible, moving the fewest tasks.
+
+        Returns the planned moves along with the node that can host the task or
+        the nodes that are freed. If `execute` is set, the moves are carried out
+        one by one, deploying each task to its new node before removing it from
+        the old one, and the result of each move is included.
+
+        If no task is found with the given ID, raises a `NotFound` error. If no
+        plan makes room for the task, raises a `NotFeasible` error. If the
+        budget is negative, raises a `ValidationError`.
+        """
+
+        budget = BUDGET if budget is None else budget
+        if budget < 0:
+            raise ValidationError('The time budget can\'t be negative.')
+
+        task = None
+        if task_id is not None:
+            task = db.tasks.find_one({'_id': ObjectId(task_id)})
+            if task is None:
+                raise NotFound('No task found with the given ID')
+            task = schema(Task).load(task)
+
+        nodes = schema(Node).load(db.nodes.find(), many=True)
+        plan = plan_rebalance(nodes, task, budget)
+        if plan is None:
+            raise NotFeasible('No rebalance can make room for the task')
+
+        moves = [
+            {
+                'task': move.task.name,
+                'from': move.source.name,
+                'to': move.target.name,
+                'core': move.task.core
+            }
+            for move in plan.moves
+        ]
+        if execute:
+            for report, result in zip(moves, NodeService._move_tasks(plan.moves)):
+                report.update(result)
+
+        if task is not None:
+            return {'moves': moves, 'host': plan.host.name}
+        return {'moves': moves, 'freed': [node.name for node in plan.freed]}
+
+    @ staticmethod
+    def _move_tasks(moves: List[Move]) -> List[dict]:
+        results = []
+        for move in moves:
+            if results and results[-1]['status'] != SUCCEEDED:
+                results.append({'status': SKIPPED})
+                continue
+
+            try:
+                NodeService.deploy(move.target, move.task)
+                NodeService.remove_task(move.source._id, move.task._id)
+                results.append({'status': SUCCEEDED})
+            except Exception as e:
+                results.append({'status': FAILED, 'error': str(e)})
+        return results
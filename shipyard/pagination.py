@@ -0,0 +1,63 @@
+"""
+Keyset pagination of collection listings.
+"""
+
+from typing import List, Optional, Tuple
+
+from bson.objectid import ObjectId
+from marshmallow import ValidationError
+from pymongo import ASCENDING
+from pymongo.collection import Collection
+from pymongo.cursor import Cursor
+
+BATCH_SIZE = 100
+
+
+def paginate(collection: Collection, query: dict, fields: List[str],
+             limit: int = None, after: str = None) -> Tuple[List[dict], Optional[str]]:
+    """
+    Fetches a page of the documents matching the query, in ID order and with
+    only the given fields.
+
+    The page starts after the document whose ID is `after`, if given, and has
+    at most `limit` documents. Returns the documents along with the ID to pass
+    as `after` to get the next page, or `None` if this is the last one.
+
+    If the limit isn't positive, raises a `ValidationError`. If `after` isn't
+    a valid ID, raises an `InvalidId` error.
+    """
+
+    if limit is None:
+        return list(find_page(collection, query, fields, None, after)), None
+    if limit <= 0:
+        raise ValidationError('The limit must be positive.')
+
+    documents = list(find_page(collection, query, fields, limit + 1, after))
+    if len(documents) <= limit:
+        return documents, None
+    return documents[:limit], str(documents[limit - 1]['_id'])
+
+
+def find_page(collection: Collection, query: dict, fields: List[str],
+              limit: int = None, after: str = None) -> Cursor:
+    """
+    Returns a cursor over a page of the documents matching the query, like
+    `paginate` but without looking ahead for the next page. Documents are
+    fetched from the database in batches of `BATCH_SIZE` as the cursor is
+    iterated.
+
+    The limit and the ID are checked right away, raising the same errors as
+    `paginate`.
+    """
+
+    if limit is not None and limit <= 0:
+        raise ValidationError('The limit must be positive.')
+
+    if after is not None:
+        query = {**query, '_id': {'$gt': ObjectId(after)}}
+
+    cursor = collection.find(query, {field: True for field in fields}) \
+        .sort('_id', ASCENDING).batch_size(BATCH_SIZE)
+    if limit is not None:
+        cursor = cursor.limit(limit)
+    return cursor
@@ -0,0 +1,53 @@
+"""
+API controllers for rollout related operations.
+"""
+
+import hug
+from bson.objectid import InvalidId
+from shipyard.errors import NotFound
+from shipyard.rollout.model import Rollout
+from shipyard.rollout.service import RolloutService
+from shipyard.serialization import schema
+
+
+@hug.get('/')
+def get_rollout_list(response, task_id: str = None):
+    """
+    Retrieve the full list of rollouts or the rollouts of a given task.
+
+    If the given task ID is invalid, returns a 400 response.
+    """
+
+    try:
+        results = RolloutService.get_all(task_id)
+        return schema(Rollout, exclude=['targets']).dump(results, many=True)
+    except InvalidId as e:
+        response.status = hug.HTTP_BAD_REQUEST
+        return {'error': str(e)}
+    except Exception:
+        response.status = hug.HTTP_INTERNAL_SERVER_ERROR
+        return {'error': 'Unable to fetch rollout list.'}
+
+
+@hug.get('/{rollout_id}')
+def get_rollout(rollout_id: str, response):
+    """
+    Retrieve the rollout with the given ID, including the status of each of
+    its target nodes.
+
+    If no rollout is found, returns a 404 response. If the given ID is invalid,
+    returns a 400 response.
+    """
+
+    try:
+        result = RolloutService.get_by_id(rollout_id)
+        return schema(Rollout).dump(result)
+    except InvalidId as e:
+        response.status = hug.HTTP_BAD_REQUEST
+        return {'error': str(e)}
+    except NotFound as e:
+        response.status = hug.HTTP_NOT_FOUND
+        return {'error': str(e)}
+    except Exception:
+        response.status = hug.HTTP_INTERNAL_SERVER_ERROR
+        return {'error': 'Unable to fetch rollout.'}
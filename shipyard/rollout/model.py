@@ -0,0 +1,67 @@
+"""
+The rollout model.
+"""
+
+from dataclasses import field
+from typing import ClassVar, List, Optional, Type
+
+from marshmallow import Schema
+from marshmallow_dataclass import NewType, dataclass
+from shipyard.fields import ObjectId
+
+objectid = NewType('objectid', str, ObjectId)
+
+DISTRIBUTING = 'distributing'
+PENDING = 'pending'
+UPDATING = 'updating'
+UPDATED = 'updated'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+
+RUNNING = 'running'
+COMPLETED = 'completed'
+HALTED = 'halted'
+
+
+@dataclass
+class Target:
+    """A node whose copy of a task is replaced during a rollout."""
+
+    node_id: objectid
+    status: str = PENDING
+    error: Optional[str] = field(default=None, metadata={'required': False})
+
+
+@dataclass
+class Rollout:
+    """
+    A rolling redeployment of an updated task to the nodes running it, run by
+    the server process with the ID given by `worker`.
+    """
+
+    _id: Optional[objectid] = field(metadata={'required': False})
+    task_id: objectid
+    task_name: str
+    wave_size: int
+    max_unavailable: int
+    status: str = RUNNING
+    old_digest: Optional[str] = field(default=None, metadata={
+        'required': False
+    })
+    distribute: bool = False
+    worker: Optional[str] = field(default=None, metadata={'required': False})
+    targets: List[Target] = field(default_factory=lambda: [], metadata={
+        'required': False
+    })
+    distribution: List[Target] = field(default_factory=lambda: [], metadata={
+        'required': False
+    })
+    started: Optional[float] = field(default=None, metadata={
+        'required': False
+    })
+    finished: Optional[float] = field(default=None, metadata={
+        'required': False
+    })
+    error: Optional[str] = field(default=None, metadata={'required': False})
+
+    Schema: ClassVar[Type[Schema]] = Schema
@@ -0,0 +1,369 @@
+"""
+Business logic for rollout related operations.
+"""
+
+import dataclasses
+import threading
+import time
+from typing import List, Tuple
+
+import gridfs
+from bson.objectid import ObjectId
+from marshmallow import ValidationError
+from shipyard.crane import fanout
+from shipyard.crane.deploy import build_image, pin_task, swap_task
+from shipyard.crane.distribute import distribute_image
+from shipyard.crane.partition import check_placement
+from shipyard.crane.remove import drop_cached_image
+from shipyard.crane.speed import scaled_runtime
+from shipyard.db import db
+from shipyard.errors import Conflict, MissingDevices, NotFeasible, NotFound
+from shipyard.leases import WORKER, live
+from shipyard.node.load import set_tasks
+from shipyard.node.model import Node
+from shipyard.node.service import ADMISSION_RETRIES
+from shipyard.rollout.model import (COMPLETED, DISTRIBUTING, FAILED, HALTED,
+                                    PENDING, RUNNING, SKIPPED, UPDATED,
+                                    UPDATING, Rollout, Target)
+from shipyard.serialization import schema
+from shipyard.task.model import Task
+from shipyard.versions import bump
+
+fs = gridfs.GridFS(db)
+
+
+class RolloutService():
+    """Rollout business logic."""
+
+    @staticmethod
+    def get_all(task_id: str = None) -> List[Rollout]:
+        """Fetch all rollouts from the database, optionally of a single task."""
+
+        query = {} if task_id is None else {'task_id': ObjectId(task_id)}
+        return schema(Rollout).load(db.rollouts.find(query), many=True)
+
+    @staticmethod
+    def get_by_id(rollout_id: str) -> Rollout:
+        """
+        Fetch a rollout from the database by its ID.
+
+        Raises a `NotFound` error if no rollout is found with the given ID.
+        """
+
+        result = db.rollouts.find_one({'_id': ObjectId(rollout_id)})
+        if result is None:
+            raise NotFound('No rollout found with the given ID.')
+        return schema(Rollout).load(result)
+
+    @staticmethod
+    def check_options(wave_size: int, max_unavailable: int):
+        """
+        Raises a `ValidationError` if the wave size or the maximum number of
+        unavailable nodes of a rollout aren't positive.
+        """
+
+        if wave_size < 1 or max_unavailable < 1:
+            raise ValidationError(
+                'The wave size and maximum unavailable nodes must be positive.')
+
+    @staticmethod
+    def create(task_id: ObjectId, task_name: str, wave_size: int, max_unavailable: int, old_digest: str = None, distribute: bool = False) -> str:
+        """
+        Starts a rolling redeployment of a task.
+
+        Every node running the task named `task_name` gets its container
+        replaced by one built from the task's current specification and file.
+        If the file has been replaced, `old_digest` is the content hash of the
+        previous one, whose cached images are dropped from the nodes. If
+        `distribute` is set, the new image is built once per CPU architecture
+        and copied to the nodes before replacing any container. The rollout
+        runs in the background and its new ID is returned.
+
+        Raises a `ValidationError` if the wave size or the maximum number of
+        unavailable nodes aren't positive.
+        """
+
+        RolloutService.check_options(wave_size, max_unavailable)
+
+        nodes = db.nodes.find({'tasks._id': task_id}, {'_id': True})
+        rollout = Rollout(
+            _id=None,
+            task_id=task_id,
+            task_name=task_name,
+            wave_size=wave_size,
+            max_unavailable=max_unavailable,
+            old_digest=old_digest,
+            distribute=distribute,
+            targets=[Target(node_id=node['_id']) for node in nodes],
+            worker=WORKER,
+            started=time.time()
+        )
+
+        rollout_id = db.rollouts.insert_one({
+            **schema(Rollout, exclude=['_id']).dump(rollout),
+            'task_id': task_id,
+            'targets': [
+                {'node_id': target.node_id, 'status': target.status}
+                for target in rollout.targets
+            ]
+        }).inserted_id
+
+        RolloutService._start(rollout_id)
+        return str(rollout_id)
+
+    @staticmethod
+    def resume() -> int:
+        """
+        Starts again the unfinished rollouts of the server processes that
+        stopped, returning how many there are.
+
+        Only the rollouts of processes whose lease expired are taken over, so
+        rollouts still running in other processes are left alone. Nodes that
+        were being updated are updated again from the start.
+        """
+
+        rollouts = list(db.rollouts.find(
+            {
+                'status': {'$in': [RUNNING, DISTRIBUTING]},
+                'worker': {'$nin': live()}
+            },
+            {'targets': True, 'worker': True}
+        ))
+
+        resumed = 0
+        for rollout in rollouts:
+            # Another process may be taking it over too
+            taken = db.rollouts.update_one(
+                {'_id': rollout['_id'], 'worker': rollout.get('worker')},
+                {'$set': {'worker': WORKER}}
+            )
+            if not taken.modified_count:
+                continue
+
+            for target in rollout['targets']:
+                if target['status'] == UPDATING:
+                    RolloutService._set_target(
+                        rollout['_id'], target['node_id'], PENDING)
+            RolloutService._start(rollout['_id'])
+            resumed += 1
+        return resumed
+
+    @staticmethod
+    def run(rollout_id: ObjectId):
+        """
+        Executes a rollout.
+
+        If the rollout distributes its image, it's first copied to all the
+        pending nodes. Then, pending nodes are updated in waves of `wave_size`
+        nodes, of which no more than `max_unavailable` are updated at the same
+        time: a node of the wave starts as soon as another one finishes. Every
+        node of a wave is updated, and if any of them fails, the rollout is
+        halted once the wave is over and the remaining nodes keep running the
+        previous version of the task.
+
+        If the rollout can't go on, for example because the task has been
+        deleted, it's halted with the cause as its `error`.
+        """
+
+        try:
+            status = COMPLETED
+            if not RolloutService._run_waves(rollout_id):
+                status = HALTED
+            values = {'status': status, 'finished': time.time()}
+        except Exception as e:
+            values = {'status': HALTED, 'finished': time.time(),
+                      'error': str(e)}
+        db.rollouts.update_one({'_id': rollout_id}, {'$set': values})
+
+    @staticmethod
+    def _start(rollout_id: ObjectId):
+        threading.Thread(
+            target=RolloutService.run, args=(rollout_id,), daemon=True
+        ).start()
+
+    @staticmethod
+    def _run_waves(rollout_id: ObjectId) -> bool:
+        rollout = schema(Rollout).load(
+            db.rollouts.find_one({'_id': rollout_id}))
+        task = db.tasks.find_one({'_id': rollout.task_id})
+        if task is None:
+            raise NotFound('The task has been deleted.')
+        task = schema(Task).load(task)
+
+        pending = [t.node_id for t in rollout.targets if t.status == PENDING]
+        if rollout.distribute:
+            RolloutService._distribute(rollout_id, pending, task)
+
+        waves = [pending[i:i + rollout.wave_size]
+                 for i in range(0, len(pending), rollout.wave_size)]
+
+        for wave in waves:
+            if not RolloutService._run_wave(rollout_id, wave, rollout, task):
+                return False
+        return True
+
+    @staticmethod
+    def _distribute(rollout_id: ObjectId, node_ids: List[ObjectId], task: Task):
+        db.rollouts.update_one(
+            {'_id': rollout_id}, {'$set': {'status': DISTRIBUTING}})
+
+        nodes = schema(Node).load(db.nodes.find(
+            {'_id': {'$in': node_ids}}, {'tasks': False}), many=True)
+        builders = schema(Node).load(
+            db.nodes.find({'builder': True}, {'tasks': False}), many=True)
+        with fs.get(task.file_id) as task_file:
+            report = distribute_image(task_file, task, nodes, builders)
+
+        db.rollouts.update_one(
+            {'_id': rollout_id},
+            {'$set': {
+                'status': RUNNING,
+                'distribution': [
+                    {
+                        'node_id': ObjectId(result['node']),
+                        'status': result['status'],
+                        'error': result.get('error')
+                    }
+                    for result in report
+                ]
+            }}
+        )
+
+    @staticmethod
+    def _run_wave(rollout_id: ObjectId, node_ids: List[ObjectId], rollout: Rollout, task: Task) -> bool:
+        # Nodes that are gone or don't run the task anymore are skipped
+        nodes = schema(Node).load(db.nodes.find(
+            {'_id': {'$in': node_ids}, 'tasks._id': task._id}), many=True)
+
+        for node_id in set(node_ids) - {node._id for node in nodes}:
+            RolloutService._set_target(rollout_id, node_id, SKIPPED)
+
+        # Every node takes a slot until its update finishes, so no more than
+        # `max_unavailable` nodes are down at once
+        slots = threading.BoundedSemaphore(rollout.max_unavailable)
+        futures = {}
+        for node in nodes:
+            if not slots.acquire(timeout=fanout.TIMEOUT):
+                break
+            RolloutService._set_target(rollout_id, node._id, UPDATING)
+            future = fanout.submit(
+                node, RolloutService._update_node, node, rollout, task)
+            future.add_done_callback(lambda _: slots.release())
+            futures[str(node._id)] = future
+        report = fanout.collect(futures, key='node')
+
+        for result in report:
+            RolloutService._set_target(
+                rollout_id,
+                ObjectId(result['node']),
+                UPDATED if result['status'] == fanout.SUCCEEDED else FAILED,
+                result.get('error', result['status'])
+            )
+        # Nodes left waiting for a slot that never freed are still pending
+        return len(report) == len(nodes) and \
+            all(r['status'] == fanout.SUCCEEDED for r in report)
+
+    @staticmethod
+    def _update_node(node: Node, rollout: Rollout, task: Task):
+        if not set(task.devices).issubset(set(node.devices)):
+            raise MissingDevices(
+                'The target node doesn\'t have the needed devices for the task'
+            )
+
+        # The new image is built while the old container keeps running
+        with fs.get(task.file_id) as task_file:
+            build_image(task_file, task, node)
+
+        node, current, task, cores = RolloutService._replace(node, task)
+        moved = [t for t in node.tasks
+                 if t._id in cores and t.core != cores[t._id]]
+        try:
+            for other in moved:
+                pin_task(other.name, node, other.core)
+            swap_task(task, node)
+        except Exception:
+            RolloutService._restore(node, current, task, cores)
+            for other in moved:
+                try:
+                    pin_task(other.name, node, cores[other._id])
+                except Exception:
+                    pass
+            raise
+
+        # The old image is only dropped once the new one runs
+        if rollout.old_digest is not None:
+            drop_cached_image(rollout.old_digest, node)
+
+    @staticmethod
+    def _replace(node: Node, task: Task) -> Tuple[Node, Task, Task, dict]:
+        # Replaces the task in the node's taskset if the node hasn't changed
+        # since it was read, checking the new taskset again otherwise. Returns
+        # the node as written, the old and new versions of the task and the
+        # previous cores of the other tasks
+        for attempt in range(ADMISSION_RETRIES + 1):
+            if attempt:
+                stored = db.nodes.find_one(
+                    {'_id': node._id, 'tasks._id': task._id})
+                if stored is None:
+                    raise NotFound('The task isn\'t in the node anymore.')
+                node = schema(Node).load(stored)
+
+            current = next(t for t in node.tasks if t._id == task._id)
+            others = [t for t in node.tasks if t._id != task._id]
+            cores = {t._id: t.core for t in others}
+
+            # The updated task keeps its core if it still fits there
+            new = dataclasses.replace(
+                task, core=current.core,
+                scaled_runtime=scaled_runtime(task, node))
+            verdict = check_placement(others + [new], node)
+            if not verdict:
+                raise NotFeasible(
+                    f'The new taskset isn\'t feasible ({verdict.test} test)')
+
+            tasks = [new if t._id == task._id else t for t in node.tasks]
+            if db.nodes.update_one(
+                    {'_id': node._id, 'version': node.version},
+                    set_tasks(tasks, node)).modified_count:
+                bump(db.nodes, node._id)
+                node.tasks = tasks
+                node.version += 1
+                return node, current, new, cores
+
+        raise Conflict('The node changed too many times while updating it.')
+
+    @staticmethod
+    def _restore(node: Node, current: Task, new: Task, cores: dict):
+        # Puts the old version of the task back, and the other tasks that
+        # were moved for it in their previous cores, unless they have been
+        # moved again since
+        for _ in range(ADMISSION_RETRIES + 1):
+            stored = db.nodes.find_one({'_id': node._id, 'tasks._id': new._id})
+            if stored is None:
+                return
+            stored = schema(Node).load(stored)
+
+            moved = {t._id: t.core for t in node.tasks if t._id in cores}
+            tasks = []
+            for task in stored.tasks:
+                if task._id == new._id:
+                    task = current
+                elif task._id in cores and task.core == moved.get(task._id):
+                    task.core = cores[task._id]
+                tasks.append(task)
+
+            if db.nodes.update_one(
+                    {'_id': stored._id, 'version': stored.version},
+                    set_tasks(tasks, stored)).modified_count:
+                bump(db.nodes, stored._id)
+                return
+
+    @staticmethod
+    def _set_target(rollout_id: ObjectId, node_id: ObjectId, status: str, error: str = None):
+        values = {'targets.$.status': status}
+        if status == FAILED:
+            values['targets.$.error'] = error
+        db.rollouts.update_one(
+            {'_id': rollout_id, 'targets.node_id': node_id},
+            {'$set': values}
+        )
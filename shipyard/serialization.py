@@ -0,0 +1,51 @@
+"""
+Serialization of the models.
+
+Building a marshmallow schema is costly, specially for nested models like a
+node's tasks, so the schemas are built once per model and combination of
+`only` and `exclude` fields and reused afterwards.
+
+Documents read from the database were already validated when stored, so they
+can be sent in responses with `dump_trusted`, which only turns their object
+IDs into strings, instead of going through a schema.
+"""
+
+from functools import lru_cache
+from typing import Iterable, Optional, Tuple, Type
+
+from bson.objectid import ObjectId
+from marshmallow import Schema
+
+
+def schema(model: Type, only: Iterable[str] = None,
+           exclude: Iterable[str] = ()) -> Schema:
+    """
+    Returns the schema of a model, with only the given fields or without the
+    excluded ones. The schema is shared between calls, so it must not be
+    changed.
+    """
+
+    return _schema(model, None if only is None else tuple(sorted(only)),
+                   tuple(sorted(exclude)))
+
+
+@lru_cache(maxsize=None)
+def _schema(model: Type, only: Optional[Tuple[str, ...]],
+            exclude: Tuple[str, ...]) -> Schema:
+    return model.Schema(only=only, exclude=exclude)
+
+
+def dump_trusted(document):
+    """
+    Converts a document read from the database to its response form without
+    validating it. Only the fields present in the document are kept, so it
+    must be read with the same projection that the schema would apply.
+    """
+
+    if isinstance(document, dict):
+        return {key: dump_trusted(value) for key, value in document.items()}
+    if isinstance(document, list):
+        return [dump_trusted(value) for value in document]
+    if isinstance(document, ObjectId):
+        return str(document)
+    return document
@@ -0,0 +1,73 @@
+"""
+Streaming of list responses.
+
+Instead of building the whole list and serializing it at once, documents are
+read from the database cursor and serialized one at a time as the response is
+sent, so memory use doesn't grow with the size of the list.
+
+Lists are streamed as a JSON array or, if the client accepts `NDJSON`, as one
+JSON document per line.
+"""
+
+import json
+from typing import Callable, Iterable, Iterator
+
+from shipyard.serialization import dump_trusted
+
+JSON = 'application/json'
+NDJSON = 'application/x-ndjson'
+
+
+class Stream():
+    """A file-like object that reads the chunks produced by an iterator."""
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = chunks
+        self._buffer = b''
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def close(self):
+        close = getattr(self._chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def accepts_ndjson(request) -> bool:
+    """Checks if the request asks for NDJSON in its `Accept` header."""
+
+    return NDJSON in (request.accept or '')
+
+
+def stream(documents: Iterable[dict], ndjson: bool = False,
+           dump: Callable[[dict], dict] = dump_trusted) -> Stream:
+    """
+    Returns a stream of the given documents converted with `dump`, as a JSON
+    array or as NDJSON. By default, the documents are taken as read from the
+    database.
+    """
+
+    return Stream(_ndjson(documents, dump) if ndjson
+                  else _array(documents, dump))
+
+
+def _array(documents: Iterable[dict], dump: Callable) -> Iterator[bytes]:
+    yield b'['
+    for i, document in enumerate(documents):
+        yield (b',' if i else b'') + json.dumps(dump(document)).encode()
+    yield b']'
+
+
+def _ndjson(documents: Iterable[dict], dump: Callable) -> Iterator[bytes]:
+    for document in documents:
+        yield json.dumps(dump(document)).encode() + b'\n'
@@ -0,0 +1,200 @@
+"""
+Task artifact storage.
+
+Task files are stored in GridFS by content: identical files are kept once and
+their `refs` field counts the tasks using them. A file is only removed when
+its last reference is released.
+"""
+
+import hashlib
+from datetime import datetime, timedelta
+from typing import BinaryIO, Optional, Tuple, Union
+
+import gridfs
+from bson.objectid import ObjectId
+from shipyard.db import db
+
+fs = gridfs.GridFS(db)
+
+CHUNK_SIZE = 255 * 1024
+
+# Seconds after which a stored file nothing uses is considered abandoned
+ORPHAN_AGE = 3600
+
+
+class Upload():
+    """
+    A task file written to GridFS as it's received.
+
+    The file is hashed with SHA-256 and measured while it's being written.
+    Its hex digest is saved in the file's metadata when it's closed.
+    """
+
+    def __init__(self, file_name: str):
+        self._digest = hashlib.sha256()
+        self._grid_in = fs.new_file(filename=file_name)
+        self.size = 0
+
+    @property
+    def file_id(self) -> ObjectId:
+        return self._grid_in._id
+
+    @property
+    def digest(self) -> str:
+        return self._digest.hexdigest()
+
+    def write(self, chunk: bytes):
+        self._digest.update(chunk)
+        self._grid_in.write(chunk)
+        self.size += len(chunk)
+
+    def close(self):
+        self._grid_in.digest = self.digest
+        self._grid_in.close()
+
+    def abort(self):
+        """Removes everything written so far."""
+
+        self._grid_in.abort()
+
+
+def put(file_body: Union[BinaryIO, Upload],
+        file_name: str) -> Tuple[ObjectId, str]:
+    """
+    Takes a reference to a task file, storing it in GridFS if no identical
+    file is stored yet.
+
+    The file is hashed with SHA-256 and its hex digest is saved in the file's
+    metadata. Returns the ID of the stored file and its digest. Files already
+    stored with an `Upload` aren't copied again, and seekable files are hashed
+    before being written, so identical ones aren't written at all.
+    """
+
+    if isinstance(file_body, Upload):
+        return _share_new(file_body.file_id, file_body.digest), \
+            file_body.digest
+
+    if file_body.seekable():
+        hashed = hashlib.sha256()
+        for chunk in iter(lambda: file_body.read(CHUNK_SIZE), b''):
+            hashed.update(chunk)
+        file_id = _reference(hashed.hexdigest())
+        if file_id is not None:
+            return file_id, hashed.hexdigest()
+        file_body.seek(0)
+
+    upload = Upload(file_name)
+    for chunk in iter(lambda: file_body.read(CHUNK_SIZE), b''):
+        upload.write(chunk)
+    upload.close()
+    return _share_new(upload.file_id, upload.digest), upload.digest
+
+
+def share(file_id: ObjectId, digest: str) -> ObjectId:
+    """
+    Takes the first reference to a newly stored file with the given digest.
+
+    If an identical file is already stored, a reference to it is taken
+    instead and the new file is left unshared, for its owner to remove.
+    Returns the ID of the referenced file.
+    """
+
+    existing_id = _reference(digest)
+    if existing_id is not None:
+        return existing_id
+
+    db.fs.files.update_one({'_id': file_id}, {'$set': {'refs': 1}})
+    return file_id
+
+
+def unshare(file_id: ObjectId, shared_id: ObjectId):
+    """
+    Undoes `share` for a task that couldn't be written, releasing the
+    reference it took. The new file is left unshared again unless something
+    else referenced it meanwhile.
+    """
+
+    if shared_id == file_id and db.fs.files.update_one(
+            {'_id': file_id, 'refs': 1},
+            {'$unset': {'refs': True}}).modified_count:
+        return
+    delete(shared_id)
+
+
+def discard(file_body: Union[BinaryIO, Upload]):
+    """
+    Removes a file stored with an `Upload` that won't be used, such as the
+    one of a request that fails.
+    """
+
+    if isinstance(file_body, Upload):
+        _remove_unshared(file_body.file_id)
+
+
+def delete(file_id: Union[ObjectId, str]):
+    """
+    Releases a reference to a task file, which is removed from GridFS once no
+    task references it. Files stored before they were reference counted have
+    a single reference.
+    """
+
+    # Tasks keep the ID of their file as a string
+    file_id = ObjectId(file_id)
+    db.fs.files.update_one({'_id': file_id}, {'$inc': {'refs': -1}})
+    result = db.fs.files.delete_one({'_id': file_id, 'refs': {'$lte': 0}})
+    if result.deleted_count:
+        db.fs.chunks.delete_many({'files_id': file_id})
+
+
+def sweep(now: Optional[datetime] = None) -> int:
+    """
+    Removes the files stored more than `ORPHAN_AGE` seconds ago that no task
+    or upload uses and that were never shared, such as the ones left behind
+    by requests that were interrupted. Returns the number of removed files.
+
+    Files stored before they were reference counted are kept as long as a
+    task uses them.
+    """
+
+    limit = (datetime.utcnow() if now is None else now) - \
+        timedelta(seconds=ORPHAN_AGE)
+    used = {
+        ObjectId(task['file_id'])
+        for task in db.tasks.find({}, {'file_id': True})
+        if task.get('file_id')
+    }
+    used.update(upload['file_id'] for upload in db.uploads.find(
+        {}, {'file_id': True}))
+
+    removed = 0
+    for file in db.fs.files.find(
+            {'refs': {'$exists': False}, 'uploadDate': {'$lt': limit}},
+            {'_id': True}):
+        if file['_id'] not in used and _remove_unshared(file['_id']):
+            removed += 1
+    return removed
+
+
+def _share_new(file_id: ObjectId, digest: str) -> ObjectId:
+    shared_id = share(file_id, digest)
+    if shared_id != file_id:
+        _remove_unshared(file_id)
+    return shared_id
+
+
+def _reference(digest: str) -> Optional[ObjectId]:
+    # Files whose references have been released are never referenced again,
+    # so a file being removed can't be shared
+    result = db.fs.files.find_one_and_update(
+        {'digest': digest, 'refs': {'$gt': 0}},
+        {'$inc': {'refs': 1}}, {'_id': True})
+    return None if result is None else result['_id']
+
+
+def _remove_unshared(file_id: ObjectId) -> bool:
+    # Shared files are only removed by releasing their references
+    result = db.fs.files.delete_one(
+        {'_id': file_id, 'refs': {'$exists': False}})
+    if result.deleted_count:
+        db.fs.chunks.delete_many({'files_id': file_id})
+    return bool(result.deleted_count)
@@ -10,31 +10,78 @@ import tarfile
 import hug
 from bson.objectid import InvalidId
 from marshmallow import ValidationError
-from shipyard.errors import AlreadyPresent, NotFound
+from shipyard.errors import AlreadyPresent, Conflict, NotFeasible, NotFound
+from shipyard.etags import etag, not_modified
+from shipyard.input_formats import multipart
+from shipyard.node.model import Node
+from shipyard.serialization import dump_trusted, schema
+from shipyard.streaming import JSON, NDJSON, accepts_ndjson
+from shipyard.streaming import stream as stream_documents
+from shipyard.task import artifacts
 from shipyard.task.model import Task
 from shipyard.task.service import TaskService
 
 
 @hug.get('/')
-def get_task_list(response, name: str = None):
+def get_task_list(request, response, name: str = None,
+                  limit: hug.types.number = None, after: str = None,
+                  device: str = None, stream: hug.types.smart_boolean = False):
     """
-    Retrieve the full list of tasks or a task with a given name.
+    Retrieve the list of tasks or a task with a given name.
 
     If the `name` parameter is specified in the request, this function attempts
     to return the task with that name. If it is not found, returns a 404
     response.
 
-    If no name is given, the function returns the full list of tasks present in
-    the system.
+    If no name is given, the function returns the list of tasks present in the
+    system, optionally only those that need the given `device`.
+
+    If `limit` is given, at most that many tasks are returned and the
+    `X-Next-Cursor` header holds the value to pass as `after` to get the next
+    ones, unless there are no more. If the limit or the cursor are invalid,
+    returns a 400 response.
+
+    If the `stream` parameter is set, or the request accepts NDJSON, the tasks
+    are sent as they are read from the database, as a JSON array or as NDJSON.
+    Streamed lists have no `X-Next-Cursor` header, and the ID of the last task
+    is used as `after` instead.
+
+    The response has an `ETag` header that changes whenever any task changes.
+    If the request's `If-None-Match` header has the same tag, returns an empty
+    304 response.
     """
 
     try:
         if name is not None:
             result = TaskService.get_by_name(name)
-            return Task.Schema().dump(result)
+            if not_modified(request, response, etag(result._id, result.version)):
+                return None
+            return schema(Task).dump(result)
+
+        fields = ['_id', 'name', 'runtime', 'deadline', 'period']
+
+        ndjson = accepts_ndjson(request)
+        response.set_header('Vary', 'Accept')
+        tag = etag('tasks', TaskService.get_version(),
+                   NDJSON if ndjson else JSON)
+        if not_modified(request, response, tag):
+            return None
 
-        results = TaskService.get_all()
-        return Task.Schema(only=['_id', 'name', 'runtime', 'deadline', 'period']).dump(results, many=True)
+        if stream or ndjson:
+            results = TaskService.iterate(fields, limit, after, device)
+            response.content_type = NDJSON if ndjson else JSON
+            return stream_documents(results, ndjson)
+
+        results, cursor = TaskService.get_page(fields, limit, after, device)
+        if cursor is not None:
+            response.set_header('X-Next-Cursor', cursor)
+        return dump_trusted(results)
+    except ValidationError as e:
+        response.status = hug.HTTP_BAD_REQUEST
+        return {'error': e.messages}
+    except InvalidId as e:
+        response.status = hug.HTTP_BAD_REQUEST
+        return {'error': str(e)}
     except NotFound as e:
         response.status = hug.HTTP_NOT_FOUND
         return {'error': str(e)}
@@ -43,7 +90,16 @@ def get_task_list(response, name: str = None):
         return {'error': 'Unable to fetch task list.'}
 
 
-@hug.post('/')
+def _discard_files(body):
+    # The files used by a task have been shared with it by then, so only the
+    # ones left unused by a failed or malformed request are removed
+    if isinstance(body, dict):
+        for value in body.values():
+            if isinstance(value, tuple):
+                artifacts.discard(value[1])
+
+
+@hug.post('/', inputs={'multipart/form-data': multipart})
 def post_task(body, response):
     """
     Create a new task resource.
@@ -52,20 +108,25 @@ def post_task(body, response):
     the request in the form of a tar file. This tar file contains an
     `specs.json` file with the task's specification. The rest of the files of
     contained in the tarball are the source code of the task and its Dockerfile
-    for deployment.
+    for deployment. Instead of the file, the form can have an `upload` field
+    with the ID of a finished upload from `/uploads`.
 
     If the operation is succesful, the new task's ID is returned. If the name
     for the new task is already in use, returns a 409 response. If the new
-    task's specification data isn't correct, returns a 400 response.
+    task's specification data or the upload's ID aren't correct, returns a 400
+    response. If the upload isn't found, returns a 404 response.
     """
 
     try:
-        file_name = body['file'][0]
-        file_body = body['file'][1]
+        file_name = file_body = None
+        if 'upload' not in body:
+            file_name = body['file'][0]
+            file_body = body['file'][1]
         specs = json.loads(body['specs'])
 
-        new_task = Task.Schema().load(specs)
-        new_id = TaskService.create(new_task, file_name, file_body)
+        new_task = schema(Task).load(specs)
+        new_id = TaskService.create(
+            new_task, file_name, file_body, body.get('upload'))
         return {'_id': new_id}
     except json.JSONDecodeError as e:
         response.status = hug.HTTP_BAD_REQUEST
@@ -73,26 +134,40 @@ def post_task(body, response):
     except ValidationError as e:
         response.status = hug.HTTP_BAD_REQUEST
         return {'error': e.messages}
+    except InvalidId as e:
+        response.status = hug.HTTP_BAD_REQUEST
+        return {'error': str(e)}
+    except NotFound as e:
+        response.status = hug.HTTP_NOT_FOUND
+        return {'error': str(e)}
     except AlreadyPresent as e:
         response.status = hug.HTTP_CONFLICT
         return {'error': str(e)}
     except Exception:
         response.status = hug.HTTP_INTERNAL_SERVER_ERROR
         return {'error': 'Unable to create task.'}
+    finally:
+        _discard_files(body)
 
 
 @hug.get('/{task_id}')
-def get_task(task_id: str, response):
+def get_task(task_id: str, request, response):
     """
     Retrieve the task with the given ID.
 
     If no task is found, returns a 404 response. If the given ID is invalid,
     returns a 400 response.
+
+    The response has an `ETag` header that changes whenever the task changes.
+    If the request's `If-None-Match` header has the same tag, returns an empty
+    304 response.
     """
 
     try:
         result = TaskService.get_by_id(task_id)
-        return Task.Schema().dump(result)
+        if not_modified(request, response, etag(result._id, result.version)):
+            return None
+        return schema(Task).dump(result)
     except InvalidId as e:
         response.status = hug.HTTP_BAD_REQUEST
         return {'error': str(e)}
@@ -104,37 +179,148 @@ def get_task(task_id: str, response):
         return {'error': 'Unable to fetch task.'}
 
 
-@hug.put('/{task_id}')
-def put_task(task_id: str, body, response):
+@hug.put('/{task_id}', inputs={'multipart/form-data': multipart})
+def put_task(task_id: str, body, response,
+             rolling: hug.types.smart_boolean = False,
+             wave_size: hug.types.number = 1,
+             max_unavailable: hug.types.number = 1,
+             distribute: hug.types.smart_boolean = False):
     """
     Put the values given in the body in a task resource.
 
-    Returns the updated task resource in the response.
+    Returns the updated task resource in the response, along with the result of
+    its removal from every node where it was deployed.
 
-    If no task is found, returns a 404 response. If the given ID is invalid,
-    returns a 400 response.
+    If the `rolling` parameter is set, the task is redeployed to its nodes
+    instead of being removed from them. The nodes are updated in waves of
+    `wave_size` nodes, with at most `max_unavailable` nodes being updated at the
+    same time, and the response contains the ID of the rollout so its progress
+    can be followed through `/rollouts/{rollout_id}`. If `distribute` is also
+    set, the task's image is built once per CPU architecture and copied to the
+    nodes instead of being built on each one of them.
+
+    A new file for the task can be given in the `file` field, or as the ID of
+    a finished upload in the `upload` field.
+
+    If no task is found, returns a 404 response. If the given ID or rollout
+    parameters are invalid, returns a 400 response. If the new name is already
+    in use, returns a 409 response.
     """
 
     try:
-        specs = json.loads(body['specs'])
         file_name = file_body = None
         if 'file' in body:
             file_name = body['file'][0]
             file_body = body['file'][1]
-        result = TaskService.update(task_id, specs, file_name, file_body)
-        return Task.Schema().dump(result)
+        specs = json.loads(body['specs'])
+        rollout = None
+        if rolling:
+            rollout = {'wave_size': wave_size,
+                       'max_unavailable': max_unavailable,
+                       'distribute': distribute}
+        result, report = TaskService.update(
+            task_id, specs, file_name, file_body, rollout, body.get('upload'))
+        return {**schema(Task).dump(result), **report}
     except json.JSONDecodeError as e:
         response.status = hug.HTTP_BAD_REQUEST
         return {'error': e.msg}
+    except ValidationError as e:
+        response.status = hug.HTTP_BAD_REQUEST
+        return {'error': e.messages}
     except InvalidId as e:
         response.status = hug.HTTP_BAD_REQUEST
         return {'error': str(e)}
     except NotFound as e:
         response.status = hug.HTTP_NOT_FOUND
         return {'error': str(e)}
+    except AlreadyPresent as e:
+        response.status = hug.HTTP_CONFLICT
+        return {'error': str(e)}
     except Exception:
         response.status = hug.HTTP_INTERNAL_SERVER_ERROR
         return {'error': 'Unable to update task.'}
+    finally:
+        _discard_files(body)
+
+
+@hug.post('/placements')
+def post_task_placements(body, response,
+                         budget: hug.types.float_number = None,
+                         improve: hug.types.smart_boolean = True):
+    """
+    Deploy several tasks at once, placing them jointly on the nodes.
+
+    The body must contain the IDs of the tasks in a `tasks` list. The plan is
+    computed within `budget` seconds, or the default budget, and is improved
+    with a search over the assignments unless `improve` is unset.
+
+    Returns the plan, the result of the deployment on every node and the time
+    spent computing the plan in the response.
+
+    If any task is not found, returns a 404 response. If any ID or parameter is
+    invalid, returns a 400 response. If some task can't be placed, nothing is
+    deployed and a 500 response is returned.
+    """
+
+    if not isinstance(body, dict) or not isinstance(body.get('tasks'), list):
+        response.status = hug.HTTP_BAD_REQUEST
+        return {'error': 'No list of task IDs was specified in the request'}
+
+    try:
+        return TaskService.place_batch(body['tasks'], budget, improve)
+    except ValidationError as e:
+        response.status = hug.HTTP_BAD_REQUEST
+        return {'error': e.messages}
+    except (InvalidId, TypeError) as e:
+        response.status = hug.HTTP_BAD_REQUEST
+        return {'error': str(e)}
+    except NotFound as e:
+        response.status = hug.HTTP_NOT_FOUND
+        return {'error': str(e)}
+    except NotFeasible as e:
+        response.status = hug.HTTP_INTERNAL_SERVER_ERROR
+        return {'error': str(e)}
+    except Exception:
+        response.status = hug.HTTP_INTERNAL_SERVER_ERROR
+        return {'error': 'Unable to place tasks.'}
+
+
+@hug.post('/{task_id}/placements')
+def post_task_placement(task_id: str, response, scoring: str = None):
+    """
+    Deploy the task with the given ID to the node that fits it best.
+
+    Returns the updated node's data in the response, along with the name of the
+    feasibility test that accepted the new taskset in `feasibility`. The nodes
+    are ranked with the given `scoring` function, or the default one.
+
+    If no task is found, returns a 404 response. If the given ID or scoring
+    function are invalid, returns a 400 response. If the chosen node keeps
+    changing while the task is deployed, returns a 409 response. If no node
+    can run the task, returns a 500 response.
+    """
+
+    try:
+        result, verdict = TaskService.place(task_id, scoring)
+        return {**schema(Node).dump(result), 'feasibility': verdict.test}
+    except ValidationError as e:
+        response.status = hug.HTTP_BAD_REQUEST
+        return {'error': e.messages}
+    except InvalidId as e:
+        response.status = hug.HTTP_BAD_REQUEST
+        return {'error': str(e)}
+    except NotFound as e:
+        response.status = hug.HTTP_NOT_FOUND
+        return {'error': str(e)}
+    except Conflict as e:
+        response.status = hug.HTTP_CONFLICT
+        return {'error': str(e)}
+    except NotFeasible as e:
+        response.status = hug.HTTP_INTERNAL_SERVER_ERROR
+        return {'error': str(e)}
+    except Exception:
+        response.status = hug.HTTP_INTERNAL_SERVER_ERROR
+        return {'error': 'Unable to place task.'}
 
 
 @hug.delete('/{task_id}')
@@ -142,15 +328,19 @@ def delete_task(task_id: str, response):
     """
     Delete the task with the given ID.
 
-    Returns the deleted task's data in the response.
+    Returns the deleted task's data in the response, along with the result of
+    its removal from every node where it was deployed.
 
     If no task is found, returns a 404 response. If the given ID is invalid,
     returns a 400 response.
     """
 
     try:
-        result = TaskService.delete(task_id)
-        return Task.Schema(exclude=['_id', 'file_id']).dump(result)
+        result, removals = TaskService.delete(task_id)
+        return {
+            **schema(Task, exclude=['_id', 'file_id']).dump(result),
+            'removals': removals
+        }
     except InvalidId as e:
         response.status = hug.HTTP_BAD_REQUEST
         return {'error': str(e)}
@@ -15,10 +15,15 @@ objectid = NewType('objectid', str, ObjectId)
 
 @dataclass(order=True)
 class Task:
-    """A real-time task that can be deployed as a container to a node."""
+    """
+    A real-time task that can be deployed as a container to a node.
+
+    The version is increased on every update to the task.
+    """
 
     _id: Optional[objectid] = field(metadata={'required': False})
     file_id: Optional[objectid] = field(metadata={'required': False})
+    digest: Optional[str] = field(metadata={'required': False})
     name: str
     runtime: int
     deadline: int
@@ -30,5 +35,13 @@ class Task:
     capabilities: List[str] = field(default_factory=lambda: [], metadata={
         'required': False
     })
+    ref_freq: Optional[int] = field(default=None, metadata={
+        'required': False
+    })
+    scaled_runtime: Optional[int] = field(default=None, metadata={
+        'required': False
+    })
+    core: Optional[int] = field(default=None, metadata={'required': False})
+    version: int = field(default=0, metadata={'required': False})
 
     Schema: ClassVar[Type[Schema]] = Schema
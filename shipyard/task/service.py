@@ -2,19 +2,35 @@
 Business logic for task related operations.
 """
 
+import dataclasses
+import time
 from io import BytesIO
-from typing import List
+from typing import Iterable, List, Optional, Tuple
 
-import gridfs
 from bson.objectid import ObjectId
-from pymongo import ReturnDocument
-from shipyard.crane.remove import remove_task
+from marshmallow import ValidationError
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from shipyard.cache.documents import task_cache
+from shipyard.crane import fanout
+from shipyard.crane.fanout import SUCCEEDED
+from shipyard.crane.feasibility import Verdict
+from shipyard.crane.placement import (BUDGET, SCORING, SCORINGS, Assignment,
+                                      plan_batch, rank_nodes)
+from shipyard.crane.remove import drop_from_nodes, remove_from_nodes
 from shipyard.db import db
-from shipyard.errors import AlreadyPresent, NotFound
-from shipyard.node.model import Node
+from shipyard.errors import (AlreadyPresent, Conflict, MissingDevices,
+                             NotFeasible, NotFound)
+from shipyard.node.load import check_load, pull_task
+from shipyard.node.model import Node, with_task
+from shipyard.node.service import NodeService
+from shipyard.pagination import find_page, paginate
+from shipyard.rollout.service import RolloutService
+from shipyard.serialization import schema
+from shipyard.task import artifacts
 from shipyard.task.model import Task
-
-fs = gridfs.GridFS(db)
+from shipyard.upload.service import UploadService
+from shipyard.versions import bump, version
 
 
 class TaskService():
@@ -24,119 +40,386 @@ class TaskService():
     def get_all() -> List[Task]:
         """Fetch all tasks from the database."""
 
-        return Task.Schema().load(db.tasks.find(), many=True)
+        return schema(Task).load(db.tasks.find(), many=True)
+
+    @staticmethod
+    def get_page(fields: List[str], limit: int = None, after: str = None,
+                 device: str = None) -> Tuple[List[dict], Optional[str]]:
+        """
+        Fetch a page of tasks from the database, with only the given fields.
+
+        Tasks can be filtered by a device they need. Returns the task documents
+        and the cursor of the next page, as described in `paginate`.
+        """
+
+        query = {} if device is None else {'devices': device}
+        return paginate(db.tasks, query, fields, limit, after)
+
+    @staticmethod
+    def iterate(fields: List[str], limit: int = None, after: str = None,
+                device: str = None) -> Iterable[dict]:
+        """
+        Returns a cursor over the tasks that `get_page` would fetch, reading
+        them from the database as it is iterated.
+        """
+
+        query = {} if device is None else {'devices': device}
+        return find_page(db.tasks, query, fields, limit, after)
+
+    @staticmethod
+    def get_version() -> int:
+        """
+        Returns the version of the tasks, which increases whenever any
+        task changes.
+        """
+
+        return version(db.tasks)
 
     @staticmethod
     def get_by_id(task_id: str) -> Task:
         """
-        Fetch a task from the database by its ID.
+        Fetch a task by its ID, from the cache if possible.
 
         Raises a `NotFound` error if no task is found with the given ID.
         """
 
-        result = db.tasks.find_one({'_id': ObjectId(task_id)})
+        task_id = ObjectId(task_id)
+        result = task_cache.get(
+            task_id, lambda: db.tasks.find_one({'_id': task_id}))
         if result is None:
             raise NotFound('No task found with the given ID.')
-        return Task.Schema().load(result)
+        return result
 
     @staticmethod
     def get_by_name(task_name: str) -> Task:
         """
-        Fetch a task from the database by its name.
+        Fetch a task by its name, from the cache if possible.
 
         Raises a `NotFound` error if no task is found with the given name.
         """
 
-        result = db.tasks.find_one({'name': task_name})
+        result = task_cache.get_by_name(
+            task_name, lambda: db.tasks.find_one({'name': task_name}))
         if result is None:
             raise NotFound('No task found with the given name.')
-        return Task.Schema().load(result)
+        return result
 
     @staticmethod
-    def create(new_task: Task, file_name: str, file_body: BytesIO) -> str:
+    def create(new_task: Task, file_name: str, file_body: BytesIO,
+               upload_id: str = None) -> str:
         """
         Insert a new task into the database.
 
+        The task's file is stored along with its content hash, which lets the
+        nodes reuse images built from identical files. If `upload_id` is
+        given, the file of that finished upload is used instead.
+
         If the name of the new task is already in use, this method raises an
-        `AlreadyPresent` error. If not, the new task is inserted and its new ID
-        is returned.
+        `AlreadyPresent` error. If the upload isn't found or isn't finished,
+        raises a `NotFound` or a `ValidationError`. If not, the new task is
+        inserted and its new ID is returned.
         """
 
-        result = db.tasks.find_one({'name': new_task.name})
+        result = db.tasks.find_one({'name': new_task.name}, {'_id': True})
         if result is not None:
             raise AlreadyPresent('A task already exists with the given name.')
 
-        file_id = fs.put(file_body, filename=file_name)
-        new_task.file_id = file_id
+        # The scaled runtime and the core only exist on the nodes' tasksets,
+        # and new tasks always start from the first version
+        new_task.scaled_runtime = new_task.core = None
+        new_task.version = 0
+
+        if upload_id is not None:
+            _, file_id, new_task.digest = UploadService.get_file(upload_id)
+            new_task.file_id = artifacts.share(file_id, new_task.digest)
+        else:
+            new_task.file_id, new_task.digest = artifacts.put(
+                file_body, file_name)
+
+        try:
+            new_id = db.tasks.insert_one(schema(Task,
+                exclude=['_id']).dump(new_task)).inserted_id
+        except DuplicateKeyError:
+            if upload_id is not None:
+                artifacts.unshare(file_id, new_task.file_id)
+            else:
+                artifacts.delete(new_task.file_id)
+            raise AlreadyPresent('A task already exists with the given name.')
+        bump(db.tasks)
 
-        new_id = db.tasks.insert_one(Task.Schema(
-            exclude=['_id']).dump(new_task)).inserted_id
+        # The upload is only removed once its file is used, so a failed
+        # request can be sent again with it
+        if upload_id is not None:
+            UploadService.claim(upload_id)
         return str(new_id)
 
     @staticmethod
-    def update(task_id: str, new_values: dict, file_name: str, file_body: BytesIO) -> Task:
+    def update(task_id: str, new_values: dict, file_name: str, file_body: BytesIO, rolling: dict = None, upload_id: str = None) -> Tuple[Task, dict]:
         """
         Updates an existing task.
 
         The task is retrieved using the given ID and updated with the values
-        specified in the given dictionary. If a new file is also given, it
-        replaces the old one. Returns the updated task.
+        specified in the given dictionary. If a new file or the ID of a
+        finished upload is also given, its file replaces the old one, and the
+        image built from the old file is dropped from every node's cache if no
+        other task uses it. Returns the updated task and a report of what
+        happened to the nodes where it was deployed.
+
+        By default, the task is removed from all of its nodes concurrently and
+        the report contains the result of every removal under `removals`.
+        Nodes where the removal fails keep the task in their taskset.
+
+        If `rolling` is given, the task is instead redeployed to its nodes by a
+        rollout created with the `wave_size`, `max_unavailable` and
+        `distribute` values it contains, and the report contains the rollout's
+        ID under `rollout`.
 
         If no task is found with the given ID, raises a `NotFound` exception.
+        If the new values include the task's version, scaled runtime or core,
+        raises a `ValidationError`. The upload, if given, is used like in
+        `create`. If the new name is already in use, raises an `AlreadyPresent`
+        error.
         """
 
+        if rolling is not None:
+            RolloutService.check_options(
+                rolling['wave_size'], rolling['max_unavailable'])
+
         task = db.tasks.find_one({'_id': ObjectId(task_id)})
         if task is None:
             raise NotFound('No task found with the given ID.')
+        for key in ('version', 'scaled_runtime', 'core'):
+            if key in new_values:
+                raise ValidationError(f'The {key} of a task can\'t be set.')
 
-        if file_body:
+        old_digest = None
+        replaced = upload_id is not None or bool(file_body)
+        if replaced:
             old_file_id = task['file_id']
-            new_file_id = fs.put(file_body, filename=file_name)
-            new_values = {**new_values, 'file_id': new_file_id}
+            if upload_id is not None:
+                _, file_id, new_digest = UploadService.get_file(upload_id)
+                new_file_id = artifacts.share(file_id, new_digest)
+            else:
+                new_file_id, new_digest = artifacts.put(file_body, file_name)
+            if task.get('digest') != new_digest:
+                old_digest = task.get('digest')
+            new_values = {
+                **new_values,
+                'file_id': new_file_id,
+                'digest': new_digest
+            }
+
+        try:
+            updated_task = db.tasks.find_one_and_update(
+                {'_id': task['_id']},
+                {'$set': new_values, '$inc': {'version': 1}},
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            if upload_id is not None:
+                artifacts.unshare(file_id, new_file_id)
+            elif replaced:
+                artifacts.delete(new_file_id)
+            raise AlreadyPresent('A task already exists with the given name.')
+        bump(db.tasks, task['_id'])
+
+        if upload_id is not None:
+            UploadService.claim(upload_id)
+
+        if replaced:
+            artifacts.delete(old_file_id)
+        old_digest = TaskService._retire(task['_id'], old_digest)
+
+        if rolling is not None:
+            rollout_id = RolloutService.create(
+                task['_id'],
+                task['name'],
+                rolling['wave_size'],
+                rolling['max_unavailable'],
+                old_digest,
+                rolling.get('distribute', False)
+            )
+            return schema(Task).load(updated_task), {'rollout': rollout_id}
+
+        nodes = schema(Node).load(db.nodes.find(
+            {'tasks._id': task['_id']}, with_task(task['_id'])), many=True)
+        removals = remove_from_nodes(task['name'], nodes, old_digest)
+        removed = {r['node'] for r in removals if r['status'] == SUCCEEDED}
+        TaskService._pull(task['_id'],
+                          [node for node in nodes if str(node._id) in removed])
+
+        return schema(Task).load(updated_task), {'removals': removals}
 
-        updated_task = db.tasks.find_one_and_update(
-            {'_id': task['_id']},
-            {'$set': new_values},
-            return_document=ReturnDocument.AFTER
-        )
+    @staticmethod
+    def delete(task_id: str) -> Tuple[Task, List[dict]]:
+        """
+        Removes the task with the given ID from the database.
 
-        if file_body:
-            fs.delete(old_file_id)
+        The task is removed concurrently from all the nodes where it was
+        deployed. If no other task uses its file, the image built from it is
+        dropped from every node's cache. Returns the task that has been
+        deleted and the report of its removal from every node. If no task is
+        found with the given ID, this method raises a `NotFound` error.
+        """
+
+        task = db.tasks.find_one({'_id': ObjectId(task_id)})
+        if task is None:
+            raise NotFound('No task found with the given ID.')
+
+        db.tasks.delete_one({'_id': task['_id']})
+        bump(db.tasks, task['_id'])
+        artifacts.delete(task['file_id'])
+        digest = TaskService._retire(task['_id'], task.get('digest'))
 
-        nodes = db.nodes.find({'tasks._id': task['_id']})
-        if nodes:
-            for node in nodes:
-                remove_task(task['name'], Node.Schema().load(node))
-                db.nodes.update_one(
-                    {'_id': node['_id']},
-                    {'$pull': {'tasks': {'_id': task['_id']}}}
-                )
+        nodes = schema(Node).load(db.nodes.find(
+            {'tasks._id': task['_id']}, with_task(task['_id'])), many=True)
+        removals = remove_from_nodes(task['name'], nodes, digest)
+        TaskService._pull(task['_id'], nodes)
 
-        return Task.Schema().load(updated_task)
+        return schema(Task).load(task), removals
 
     @staticmethod
-    def delete(task_id: str) -> Task:
+    def place(task_id: str, scoring: str = None) -> Tuple[Node, Verdict]:
         """
-        Removes the task with the given ID from the database.
-
-        Returns the task that has been deleted. If no task is found with the
-        given ID, this method raises a `NotFound` error.
+        Deploys the task with the given ID to the best node that can run it.
+
+        The nodes' load summaries are read first, and only the tasksets of the
+        nodes with the task's devices and room for it are loaded. These nodes
+        are ranked with the given scoring function, or the default one. If the
+        best node changes and can't take the task anymore, the next one is
+        tried. Returns the updated node along with the verdict of the
+        feasibility check that accepted the task.
+
+        If no task is found with the given ID, raises a `NotFound` error. If no
+        node can run the task, raises a `NotFeasible` error. If the scoring
+        function doesn't exist, raises a `ValidationError`.
         """
 
+        scoring = scoring or SCORING
+        if scoring not in SCORINGS:
+            raise ValidationError(
+                f'Unknown scoring, must be one of: {", ".join(SCORINGS)}.')
+
         task = db.tasks.find_one({'_id': ObjectId(task_id)})
         if task is None:
             raise NotFound('No task found with the given ID.')
+        task = schema(Task).load(task)
+
+        candidates = rank_nodes(task, TaskService._hosts(task), scoring)
+        for candidate in candidates:
+            try:
+                return NodeService.deploy(candidate.node, candidate.task), \
+                    candidate.verdict
+            except (Conflict, MissingDevices, NotFeasible, NotFound):
+                # Another request took the room left in the node
+                continue
+        raise NotFeasible('No node can run the task.')
 
-        db.tasks.delete_one({'_id': task['_id']})
-        fs.delete(task['file_id'])
-
-        nodes = db.nodes.find({'tasks._id': task['_id']})
-        if nodes:
-            for node in nodes:
-                remove_task(task['name'], Node.Schema().load(node))
-                db.nodes.find_one_and_update(
-                    {'_id': node['_id']},
-                    {'$pull': {'tasks': {'_id': task['_id']}}}
-                )
-
-        return Task.Schema().load(task)
+    @staticmethod
+    def _hosts(task: Task) -> List[Node]:
+        # Nodes that may run the task, with their tasksets
+        query = {'tasks._id': {'$ne': task._id}}
+        if task.devices:
+            query['devices'] = {'$all': task.devices}
+        nodes = []
+        for node in schema(Node).load(db.nodes.find(query, {'tasks': False}),
+                                      many=True):
+            verdict = check_load(dataclasses.replace(task), node)
+            if verdict is None or verdict:
+                nodes.append(node)
+
+        tasks = {
+            stored['_id']: stored['tasks']
+            for stored in db.nodes.find(
+                {'_id': {'$in': [node._id for node in nodes]}},
+                {'tasks': True})
+        }
+        # Nodes deleted in the meantime are left out
+        nodes = [node for node in nodes if node._id in tasks]
+        for node in nodes:
+            node.tasks = schema(Task).load(tasks[node._id], many=True)
+        return nodes
+
+    @staticmethod
+    def place_batch(task_ids: List[str], budget: float = None, improve: bool = True) -> dict:
+        """
+        Deploys several tasks at once, planning where each of them goes
+        jointly.
+
+        The assignment is computed by `plan_batch` within `budget` seconds, or
+        the default budget, and then deployed concurrently to every node.
+        Returns the plan, the report of the deployment on every node and the
+        time spent by the solver.
+
+        If any task can't be found, raises a `NotFound` error. If some task
+        can't be placed, nothing is deployed and a `NotFeasible` error is
+        raised. If the budget is negative, raises a `ValidationError`.
+        """
+
+        budget = BUDGET if budget is None else budget
+        if budget < 0:
+            raise ValidationError('The time budget can\'t be negative.')
+
+        ids = list(dict.fromkeys(ObjectId(task_id) for task_id in task_ids))
+        tasks = schema(Task).load(
+            db.tasks.find({'_id': {'$in': ids}}), many=True)
+        if len(tasks) != len(ids):
+            raise NotFound('No task found with some of the given IDs.')
+
+        nodes = schema(Node).load(db.nodes.find(), many=True)
+        started = time.monotonic()
+        assignments, unplaced = plan_batch(tasks, nodes, budget, improve)
+        solver_time = time.monotonic() - started
+
+        if unplaced:
+            raise NotFeasible('No node can run the tasks: ' +
+                              ', '.join(t.name for t in unplaced))
+
+        futures = {
+            a.node.name: fanout.submit(a.node, TaskService._deploy, a)
+            for a in assignments
+        }
+
+        return {
+            'plan': [
+                {
+                    'task': task.name,
+                    'node': assignment.node.name,
+                    'core': task.core
+                }
+                for assignment in assignments for task in assignment.tasks
+            ],
+            'deployments': fanout.collect(futures, key='node'),
+            'solver_time': solver_time
+        }
+
+    @staticmethod
+    def _deploy(assignment: Assignment):
+        for task in assignment.tasks:
+            NodeService.deploy(assignment.node, task)
+
+    @staticmethod
+    def _retire(task_id: ObjectId, digest: Optional[str]) -> Optional[str]:
+        # Returns the digest if no task uses its file anymore, once its cached
+        # image is dropped from the nodes the task isn't on, which it may have
+        # been removed from before. Otherwise, the nodes keep the image.
+        if digest is None or db.tasks.find_one(
+                {'digest': digest}, {'_id': True}) is not None:
+            return None
+
+        nodes = schema(Node).load(db.nodes.find(
+            {'tasks._id': {'$ne': task_id}}, with_task(task_id)), many=True)
+        drop_from_nodes(digest, nodes)
+        return digest
+
+    @staticmethod
+    def _pull(task_id: ObjectId, nodes: List[Node]):
+        # The load to subtract depends on each node, so the updates differ
+        if not nodes:
+            return
+        db.nodes.bulk_write([
+            UpdateOne({'_id': node._id, 'tasks._id': task_id},
+                      pull_task(node.tasks[0], node))
+            for node in nodes
+        ], ordered=False)
+        bump(db.nodes, *(node._id for node in nodes))
@@ -0,0 +1,157 @@
+"""
+API controllers for resumable upload related operations.
+"""
+
+import re
+
+import hug
+from bson.objectid import InvalidId
+from marshmallow import ValidationError
+from shipyard.errors import Conflict, NotFound
+from shipyard.serialization import schema
+from shipyard.upload.model import Upload
+from shipyard.upload.service import CHUNK_SIZE, UploadService
+
+CONTENT_RANGE = re.compile(r'bytes (\d+)-(\d+)/(\d+)$')
+
+
+@hug.post('/')
+def post_upload(body, response):
+    """
+    Start a resumable upload of a task file.
+
+    The body contains the file's `file_name` and its `size` in bytes. Returns
+    the new upload's ID along with the size of its chunks. If the data isn't
+    correct, returns a 400 response.
+    """
+
+    try:
+        new_upload = schema(Upload).load(body)
+        upload_id = UploadService.create(new_upload)
+        return {'_id': upload_id, 'chunk_size': CHUNK_SIZE}
+    except ValidationError as e:
+        response.status = hug.HTTP_BAD_REQUEST
+        return {'error': e.messages}
+    except Exception:
+        response.status = hug.HTTP_INTERNAL_SERVER_ERROR
+        return {'error': 'Unable to create upload.'}
+
+
+@hug.get('/{upload_id}')
+def get_upload(upload_id: str, response):
+    """
+    Retrieve the upload with the given ID, whose `offset` is where the upload
+    must be resumed.
+
+    If no upload is found, returns a 404 response. If the given ID is invalid,
+    returns a 400 response.
+    """
+
+    try:
+        result = UploadService.get_by_id(upload_id)
+        return schema(Upload).dump(result)
+    except InvalidId as e:
+        response.status = hug.HTTP_BAD_REQUEST
+        return {'error': str(e)}
+    except NotFound as e:
+        response.status = hug.HTTP_NOT_FOUND
+        return {'error': str(e)}
+    except Exception:
+        response.status = hug.HTTP_INTERNAL_SERVER_ERROR
+        return {'error': 'Unable to fetch upload.'}
+
+
+@hug.patch('/{upload_id}')
+def patch_upload(upload_id: str, body, request, response):
+    """
+    Write a byte range of the file of the upload with the given ID.
+
+    The range is given in the `Content-Range` header, such as
+    `bytes 0-262143/1048576`, and the SHA-256 hex digest of the body in the
+    `X-Content-SHA256` header. The range must start at the upload's offset and
+    end at the end of a chunk or of the file. Returns the updated upload.
+
+    If no upload is found, returns a 404 response. If the range doesn't start
+    at the upload's offset, returns a 409 response. If the given ID, the
+    headers or the body aren't valid, returns a 400 response, and the range
+    can be sent again.
+    """
+
+    try:
+        match = CONTENT_RANGE.match(request.get_header('Content-Range') or '')
+        digest = request.get_header('X-Content-SHA256')
+        if match is None or digest is None:
+            raise ValidationError('A Content-Range and an X-Content-SHA256 '
+                                  'header are needed.')
+
+        start, end, size = (int(value) for value in match.groups())
+        result = UploadService.write(
+            upload_id, start, end, size, body, digest.lower())
+        return schema(Upload).dump(result)
+    except ValidationError as e:
+        response.status = hug.HTTP_BAD_REQUEST
+        return {'error': e.messages}
+    except InvalidId as e:
+        response.status = hug.HTTP_BAD_REQUEST
+        return {'error': str(e)}
+    except NotFound as e:
+        response.status = hug.HTTP_NOT_FOUND
+        return {'error': str(e)}
+    except Conflict as e:
+        response.status = hug.HTTP_CONFLICT
+        return {'error': str(e)}
+    except Exception:
+        response.status = hug.HTTP_INTERNAL_SERVER_ERROR
+        return {'error': 'Unable to write upload.'}
+
+
+@hug.post('/{upload_id}/finish')
+def post_upload_finish(upload_id: str, response, digest: str = None):
+    """
+    Finish the upload with the given ID once all of its bytes have been
+    written. If `digest` is given, the file's SHA-256 hex digest must match
+    it. Returns the finished upload, whose ID can then be given as `upload`
+    instead of a file when creating or updating a task.
+
+    If no upload is found, returns a 404 response. If the given ID is invalid,
+    bytes are missing or the digest doesn't match, returns a 400 response.
+    """
+
+    try:
+        result = UploadService.finish(upload_id, digest)
+        return schema(Upload).dump(result)
+    except ValidationError as e:
+        response.status = hug.HTTP_BAD_REQUEST
+        return {'error': e.messages}
+    except InvalidId as e:
+        response.status = hug.HTTP_BAD_REQUEST
+        return {'error': str(e)}
+    except NotFound as e:
+        response.status = hug.HTTP_NOT_FOUND
+        return {'error': str(e)}
+    except Exception:
+        response.status = hug.HTTP_INTERNAL_SERVER_ERROR
+        return {'error': 'Unable to finish upload.'}
+
+
+@hug.delete('/{upload_id}')
+def delete_upload(upload_id: str, response):
+    """
+    Cancel the upload with the given ID, removing everything written for it.
+
+    If no upload is found, returns a 404 response. If the given ID is invalid,
+    returns a 400 response.
+    """
+
+    try:
+        result = UploadService.delete(upload_id)
+        return schema(Upload).dump(result)
+    except InvalidId as e:
+        response.status = hug.HTTP_BAD_REQUEST
+        return {'error': str(e)}
+    except NotFound as e:
+        response.status = hug.HTTP_NOT_FOUND
+        return {'error': str(e)}
+    except Exception:
+        response.status = hug.HTTP_INTERNAL_SERVER_ERROR
+        return {'error': 'Unable to delete upload.'}
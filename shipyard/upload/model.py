@@ -0,0 +1,48 @@
+"""
+The resumable upload model.
+"""
+
+from dataclasses import field
+from typing import ClassVar, Optional, Type
+
+from marshmallow import Schema, validate
+from marshmallow_dataclass import NewType, dataclass
+from shipyard.fields import ObjectId
+
+objectid = NewType('objectid', str, ObjectId)
+
+OPEN = 'open'
+FINISHED = 'finished'
+
+
+@dataclass
+class Upload:
+    """
+    A task file uploaded in byte ranges, which can be resumed after a failure.
+
+    Every range is written as GridFS chunks of the file with ID `file_id` as
+    it arrives. `offset` is the number of bytes received so far, where the
+    next range must start. Once finished, the file's digest is known and the
+    upload can be used to create or update a task.
+    """
+
+    _id: Optional[objectid] = field(metadata={'required': False})
+    file_name: str
+    size: int = field(metadata={'validate': validate.Range(min=0)})
+    offset: int = field(default=0, metadata={'required': False})
+    chunk_size: Optional[int] = field(default=None, metadata={
+        'required': False
+    })
+    file_id: Optional[objectid] = field(default=None, metadata={
+        'required': False
+    })
+    digest: Optional[str] = field(default=None, metadata={'required': False})
+    status: str = OPEN
+    created: Optional[float] = field(default=None, metadata={
+        'required': False
+    })
+    updated: Optional[float] = field(default=None, metadata={
+        'required': False
+    })
+
+    Schema: ClassVar[Type[Schema]] = Schema
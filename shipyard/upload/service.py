@@ -0,0 +1,242 @@
+"""
+Business logic for resumable uploads.
+"""
+
+import hashlib
+import math
+import os
+import time
+from datetime import datetime
+from typing import BinaryIO, Optional, Tuple
+
+from bson.binary import Binary
+from bson.objectid import ObjectId
+from marshmallow import ValidationError
+from pymongo import ASCENDING, ReturnDocument
+from shipyard.db import db
+from shipyard.errors import Conflict, NotFound
+from shipyard.serialization import schema
+from shipyard.task.artifacts import CHUNK_SIZE
+from shipyard.upload.model import FINISHED, OPEN, Upload
+
+SESSION_TTL = float(os.getenv('UPLOAD_SESSION_TTL', default='86400'))
+
+
+class UploadService():
+    """Resumable upload business logic."""
+
+    @staticmethod
+    def get_by_id(upload_id: str) -> Upload:
+        """
+        Fetch an upload from the database by its ID.
+
+        Raises a `NotFound` error if no upload is found with the given ID.
+        """
+
+        result = db.uploads.find_one({'_id': ObjectId(upload_id)})
+        if result is None:
+            raise NotFound('No upload found with the given ID.')
+        return schema(Upload).load(result)
+
+    @staticmethod
+    def create(new_upload: Upload) -> str:
+        """
+        Starts the upload of a file with the given name and size, and returns
+        the new upload's ID. Expired uploads are removed first.
+        """
+
+        UploadService.expire()
+        now = time.time()
+        return str(db.uploads.insert_one({
+            'file_name': new_upload.file_name,
+            'size': new_upload.size,
+            'offset': 0,
+            'chunk_size': CHUNK_SIZE,
+            'file_id': ObjectId(),
+            'status': OPEN,
+            'created': now,
+            'updated': now
+        }).inserted_id)
+
+    @staticmethod
+    def write(upload_id: str, start: int, end: int, size: int,
+              body: BinaryIO, digest: str) -> Upload:
+        """
+        Writes the bytes from `start` to `end`, both included, of a file of
+        the given size, read from the body, and returns the updated upload.
+
+        The range must start at the upload's offset and end at the end of a
+        chunk or of the file. Its chunks are written to GridFS as they are
+        read, and the offset only moves past them once their SHA-256 hex
+        digest matches the given one. A range that fails can be sent again.
+
+        Raises a `NotFound` error if there is no such upload, a `Conflict`
+        error if the range doesn't start at the offset and a `ValidationError`
+        if the range is invalid, the body doesn't match it or the upload is
+        finished.
+        """
+
+        upload = UploadService.get_by_id(upload_id)
+        if upload.status != OPEN:
+            raise ValidationError('The upload is already finished.')
+        if size != upload.size or not 0 <= start <= end < size:
+            raise ValidationError('The range is outside of the file.')
+        if start != upload.offset:
+            raise Conflict(f'The upload continues at byte {upload.offset}.')
+        if (end + 1) % upload.chunk_size and end + 1 != size:
+            raise ValidationError('Ranges must end at the end of a chunk or '
+                                  'of the file.')
+
+        hashed = hashlib.sha256()
+        length = end - start + 1
+        received = 0
+        n = start // upload.chunk_size
+        while received < length:
+            chunk = _read(body, min(upload.chunk_size, length - received))
+            if not chunk:
+                break
+            hashed.update(chunk)
+            db.fs.chunks.replace_one(
+                {'files_id': upload.file_id, 'n': n},
+                {'files_id': upload.file_id, 'n': n, 'data': Binary(chunk)},
+                upsert=True
+            )
+            received += len(chunk)
+            n += 1
+
+        if received != length or body.read(1):
+            raise ValidationError('The body doesn\'t match the range.')
+        if hashed.hexdigest() != digest:
+            raise ValidationError('The body doesn\'t match its digest.')
+
+        updated = db.uploads.find_one_and_update(
+            {'_id': upload._id, 'offset': start, 'status': OPEN},
+            {'$set': {'offset': end + 1, 'updated': time.time()}},
+            return_document=ReturnDocument.AFTER
+        )
+        if updated is None:
+            raise Conflict('The upload changed while writing the range.')
+        return schema(Upload).load(updated)
+
+    @staticmethod
+    def finish(upload_id: str, digest: str = None) -> Upload:
+        """
+        Finishes an upload once all of its bytes have been written, storing
+        the file in GridFS along with its SHA-256 hex digest. Returns the
+        finished upload.
+
+        Raises a `NotFound` error if there is no such upload, and a
+        `ValidationError` if bytes are missing or the file doesn't match the
+        given digest.
+        """
+
+        upload = UploadService.get_by_id(upload_id)
+        if upload.status == FINISHED:
+            return upload
+        if upload.offset != upload.size:
+            raise ValidationError(
+                f'The upload is missing bytes from {upload.offset}.')
+
+        chunks = math.ceil(upload.size / upload.chunk_size)
+        db.fs.chunks.delete_many(
+            {'files_id': upload.file_id, 'n': {'$gte': chunks}})
+
+        hashed = hashlib.sha256()
+        for chunk in db.fs.chunks.find({'files_id': upload.file_id}) \
+                .sort('n', ASCENDING):
+            hashed.update(chunk['data'])
+        if digest is not None and hashed.hexdigest() != digest:
+            raise ValidationError('The file doesn\'t match the digest.')
+
+        db.fs.files.replace_one({'_id': upload.file_id}, {
+            '_id': upload.file_id,
+            'filename': upload.file_name,
+            'length': upload.size,
+            'chunkSize': upload.chunk_size,
+            'uploadDate': datetime.utcnow(),
+            'digest': hashed.hexdigest()
+        }, upsert=True)
+
+        finished = db.uploads.find_one_and_update(
+            {'_id': upload._id},
+            {'$set': {
+                'status': FINISHED,
+                'digest': hashed.hexdigest(),
+                'updated': time.time()
+            }},
+            return_document=ReturnDocument.AFTER
+        )
+        return schema(Upload).load(finished)
+
+    @staticmethod
+    def get_file(upload_id: str) -> Tuple[str, ObjectId, str]:
+        """
+        Returns the name, ID and digest of the file of a finished upload.
+
+        Raises a `NotFound` error if there is no such upload and a
+        `ValidationError` if it isn't finished.
+        """
+
+        upload = UploadService.get_by_id(upload_id)
+        if upload.status != FINISHED:
+            raise ValidationError('The upload isn\'t finished.')
+        return upload.file_name, upload.file_id, upload.digest
+
+    @staticmethod
+    def claim(upload_id: str):
+        """
+        Removes a finished upload once a task has been written with its file.
+        The file is kept if the task shares it, and removed if the task uses
+        an identical one instead.
+        """
+
+        result = db.uploads.find_one_and_delete(
+            {'_id': ObjectId(upload_id), 'status': FINISHED})
+        if result is not None:
+            UploadService._discard(result['file_id'])
+
+    @staticmethod
+    def delete(upload_id: str) -> Upload:
+        """
+        Removes an upload along with everything written for it, and returns
+        it. If no upload is found with the given ID, raises a `NotFound`
+        error.
+        """
+
+        result = db.uploads.find_one_and_delete({'_id': ObjectId(upload_id)})
+        if result is None:
+            raise NotFound('No upload found with the given ID.')
+        UploadService._discard(result['file_id'])
+        return schema(Upload).load(result)
+
+    @staticmethod
+    def expire(now: Optional[float] = None):
+        """
+        Removes the uploads that haven't changed in `SESSION_TTL` seconds,
+        finished or not, along with their files.
+        """
+
+        limit = (time.time() if now is None else now) - SESSION_TTL
+        for upload in db.uploads.find({'updated': {'$lt': limit}}):
+            if db.uploads.delete_one({'_id': upload['_id']}).deleted_count:
+                UploadService._discard(upload['file_id'])
+
+    @staticmethod
+    def _discard(file_id: ObjectId):
+        # Files shared by tasks are only removed by releasing their references
+        if db.fs.files.count_documents(
+                {'_id': file_id, 'refs': {'$exists': True}}):
+            return
+        db.fs.chunks.delete_many({'files_id': file_id})
+        db.fs.files.delete_one({'_id': file_id})
+
+
+def _read(body: BinaryIO, size: int) -> bytes:
+    # Streams may return fewer bytes than asked for before they end
+    data = b''
+    while len(data) < size:
+        chunk = body.read(size - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return data
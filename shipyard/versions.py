@@ -0,0 +1,32 @@
+"""
+Versions of the node and task collections.
+
+Every write path of the services calls `bump`, which increases the version of
+the collection, stored in the `versions` collection, and drops the changed
+document from the cache. Listings compare the version to tell if anything
+changed without reading the documents.
+"""
+
+from pymongo.collection import Collection
+from shipyard.cache.documents import node_cache, task_cache
+
+CACHES = {'nodes': node_cache, 'tasks': task_cache}
+
+
+def bump(collection: Collection, *document_ids):
+    """
+    Increases the version of the collection and invalidates the cached
+    documents with the given IDs, if any.
+    """
+
+    collection.database.versions.update_one(
+        {'_id': collection.name}, {'$inc': {'version': 1}}, upsert=True)
+    for document_id in document_ids:
+        CACHES[collection.name].invalidate(document_id)
+
+
+def version(collection: Collection) -> int:
+    """Returns the version of the collection."""
+
+    result = collection.database.versions.find_one({'_id': collection.name})
+    return 0 if result is None else result['version']
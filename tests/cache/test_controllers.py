@@ -0,0 +1,14 @@
+import unittest
+
+import hug
+
+from shipyard.cache import controllers
+
+
+class TestControllers(unittest.TestCase):
+
+    def test_get_cache_stats(self):
+        response = hug.test.call('GET', controllers, '')
+        self.assertEqual(response.status, hug.HTTP_OK)
+        self.assertIn('hits', response.data['nodes'])
+        self.assertIn('evictions', response.data['tasks'])
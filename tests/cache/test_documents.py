@@ -0,0 +1,139 @@
+import unittest
+
+from unittest import mock
+
+from bson.objectid import ObjectId
+
+from shipyard.cache.documents import DocumentCache
+from shipyard.task.model import Task
+
+
+def make_document(name: str = 'Test') -> dict:
+    return {
+        '_id': ObjectId(),
+        'name': name,
+        'runtime': 1000,
+        'deadline': 1000,
+        'period': 1000
+    }
+
+
+class TestDocumentCache(unittest.TestCase):
+
+    def test_get(self):
+        cache = DocumentCache(Task)
+        document = make_document()
+        find = mock.Mock(return_value=document)
+
+        result = cache.get(document['_id'], find)
+        self.assertEqual(result.name, 'Test')
+        self.assertEqual(cache.get(str(document['_id']), find), result)
+        find.assert_called_once()
+
+        # Returned objects are copies
+        result.name = 'Changed'
+        self.assertEqual(cache.get(document['_id'], find).name, 'Test')
+
+        self.assertIsNone(cache.get(ObjectId(), lambda: None))
+
+        stats = cache.stats()
+        self.assertEqual(stats['entries'], 1)
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 2)
+
+    def test_get_by_name(self):
+        cache = DocumentCache(Task)
+        document = make_document()
+        find = mock.Mock(return_value=document)
+
+        self.assertEqual(cache.get_by_name('Test', find)._id, document['_id'])
+        self.assertEqual(cache.get_by_name('Test', find)._id, document['_id'])
+        cache.get(document['_id'], find)
+        find.assert_called_once()
+
+        cache.invalidate(document['_id'])
+        cache.get_by_name('Test', find)
+        self.assertEqual(find.call_count, 2)
+
+    def test_invalidate(self):
+        cache = DocumentCache(Task)
+        document = make_document()
+
+        cache.get(document['_id'], lambda: document)
+        cache.invalidate(document['_id'])
+        self.assertEqual(cache.stats()['entries'], 0)
+
+        # A document changed while it is read isn't cached
+        def find():
+            cache.invalidate(document['_id'])
+            return document
+
+        cache.get(document['_id'], find)
+        self.assertEqual(cache.stats()['entries'], 0)
+        cache.get_by_name('Test', find)
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_versions(self):
+        cache = DocumentCache(Task)
+        documents = [make_document(f'Test{i}') for i in range(3)]
+
+        # Versions are only kept while the documents are read
+        for document in documents:
+            cache.invalidate(document['_id'])
+            cache.get(document['_id'], lambda: document)
+            cache.invalidate(document['_id'])
+        self.assertEqual(cache._versions, {})
+
+        def find():
+            raise RuntimeError
+
+        with self.assertRaises(RuntimeError):
+            cache.get(documents[0]['_id'], find)
+        self.assertEqual(cache._versions, {})
+
+        # and are shared by concurrent reads of the same document
+        def find():
+            self.assertIsNotNone(cache.get(documents[0]['_id'], find_inner))
+            self.assertEqual(cache._readers, {str(documents[0]['_id']): 1})
+            return documents[0]
+
+        def find_inner():
+            self.assertEqual(cache._readers, {str(documents[0]['_id']): 2})
+            cache.invalidate(documents[0]['_id'])
+            return documents[0]
+
+        cache.clear()
+        cache.get(documents[0]['_id'], find)
+        self.assertEqual(cache.stats()['entries'], 0)
+        self.assertEqual(cache._versions, {})
+
+    def test_evict(self):
+        cache = DocumentCache(Task, size=2)
+        documents = [make_document(f'Test{i}') for i in range(3)]
+
+        for document in documents[:2]:
+            cache.get(document['_id'], lambda: document)
+        cache.get(documents[0]['_id'], lambda: None)
+        cache.get(documents[2]['_id'], lambda: documents[2])
+
+        stats = cache.stats()
+        self.assertEqual(stats['entries'], 2)
+        self.assertEqual(stats['evictions'], 1)
+        self.assertIsNone(cache.get(documents[1]['_id'], lambda: None))
+        self.assertIsNotNone(cache.get(documents[0]['_id'], lambda: None))
+
+        cache = DocumentCache(Task, size=0)
+        cache.get(documents[0]['_id'], lambda: documents[0])
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_expire(self):
+        cache = DocumentCache(Task, ttl=10)
+        document = make_document()
+
+        with mock.patch('shipyard.cache.documents.time.monotonic',
+                        return_value=0):
+            cache.get(document['_id'], lambda: document)
+        with mock.patch('shipyard.cache.documents.time.monotonic',
+                        return_value=10):
+            self.assertIsNone(cache.get(document['_id'], lambda: None))
+        self.assertEqual(cache.stats()['expirations'], 1)
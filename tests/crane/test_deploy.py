@@ -0,0 +1,123 @@
+import unittest
+
+from contextlib import contextmanager
+from io import BytesIO
+from unittest import mock
+
+import docker
+
+from shipyard.crane.deploy import deploy_task, swap_task
+from shipyard.node.model import Node
+from shipyard.task.model import Task
+
+
+test_node = Node.Schema().load({
+    'name': 'Test1',
+    'ip': '1.1.1.1',
+    'ssh_user': 'Test1',
+    'cpu_cores': 4
+})
+test_task = Task.Schema().load({
+    'name': 'Test1',
+    'digest': 'abc',
+    'runtime': 1000,
+    'deadline': 1000,
+    'period': 1000
+})
+
+
+class MockPool():
+
+    def __init__(self):
+        self.docker = mock.MagicMock()
+        self.docker.api.build.return_value = iter([{'stream': 'Test'}])
+
+    @contextmanager
+    def client(self, node: Node):
+        yield self.docker
+
+
+class TestDeploy(unittest.TestCase):
+
+    def test_build(self):
+        pool = MockPool()
+        pool.docker.images.list.return_value = []
+
+        phases = []
+
+        with mock.patch('shipyard.crane.deploy.pool', pool):
+            deploy_task(BytesIO(), test_task, test_node, phases.append)
+
+        pool.docker.images.list.assert_called_once_with(
+            filters={'label': 'shipyard.digest=abc'})
+        build_args = pool.docker.api.build.call_args[1]
+        self.assertEqual(build_args['labels'], {'shipyard.digest': 'abc'})
+        pool.docker.images.get.assert_called_once_with('Test1')
+        image = pool.docker.images.get.return_value
+        image.tag.assert_called_once_with('shipyard/cache', tag='abc')
+        pool.docker.containers.run.assert_called_once()
+        self.assertEqual(phases, ['upload', 'build', 'run'])
+
+    def test_build_error(self):
+        pool = MockPool()
+        pool.docker.images.list.return_value = []
+        pool.docker.api.build.return_value = iter([{'error': 'Test'}])
+
+        with mock.patch('shipyard.crane.deploy.pool', pool):
+            with self.assertRaises(docker.errors.BuildError):
+                deploy_task(BytesIO(), test_task, test_node)
+
+        pool.docker.containers.run.assert_not_called()
+
+    def test_cached_image(self):
+        pool = MockPool()
+        image = mock.MagicMock()
+        pool.docker.images.list.return_value = [image]
+
+        with mock.patch('shipyard.crane.deploy.pool', pool):
+            deploy_task(BytesIO(), test_task, test_node)
+
+        pool.docker.api.build.assert_not_called()
+        image.tag.assert_called_once_with('Test1')
+        pool.docker.containers.run.assert_called_once()
+
+    def test_swap(self):
+        pool = MockPool()
+        old = mock.MagicMock()
+        pool.docker.containers.get.side_effect = [
+            old, docker.errors.NotFound('Test')]
+
+        with mock.patch('shipyard.crane.deploy.pool', pool):
+            swap_task(test_task, test_node)
+
+        old.stop.assert_called_once()
+        old.rename.assert_called_once_with('Test1-previous')
+        pool.docker.containers.run.assert_called_once()
+        old.remove.assert_called_once_with(force=True)
+        pool.docker.images.remove.assert_called_once_with(image=old.image.id)
+
+    def test_swap_error(self):
+        pool = MockPool()
+        old = mock.MagicMock()
+        new = mock.MagicMock()
+        pool.docker.containers.get.side_effect = [
+            old, docker.errors.NotFound('Test'), new]
+        pool.docker.containers.run.side_effect = docker.errors.APIError('Test')
+
+        # The old container runs again if the new one can't
+        with mock.patch('shipyard.crane.deploy.pool', pool):
+            with self.assertRaises(docker.errors.APIError):
+                swap_task(test_task, test_node)
+
+        new.remove.assert_called_once_with(force=True)
+        old.rename.assert_called_with('Test1')
+        old.start.assert_called_once()
+        old.remove.assert_not_called()
+
+        # and it isn't touched if the new image is missing
+        pool = MockPool()
+        pool.docker.images.get.side_effect = docker.errors.ImageNotFound('Test')
+        with mock.patch('shipyard.crane.deploy.pool', pool):
+            with self.assertRaises(docker.errors.ImageNotFound):
+                swap_task(test_task, test_node)
+        pool.docker.containers.get.assert_not_called()
@@ -0,0 +1,137 @@
+import time
+import unittest
+
+from contextlib import contextmanager
+from io import BytesIO
+from unittest import mock
+
+from bson.objectid import ObjectId
+
+from shipyard.crane import fanout
+from shipyard.crane.distribute import distribute_image
+from shipyard.node.model import Node
+from shipyard.task.model import Task
+
+
+test_nodes = Node.Schema().load([
+    {
+        '_id': str(ObjectId()),
+        'name': f'Test{i}',
+        'ip': f'1.1.1.{i}',
+        'ssh_user': 'Test',
+        'cpu_arch': 'arm64' if i < 4 else None,
+        'cpu_cores': 1
+    }
+    for i in range(5)
+], many=True)
+test_task = Task.Schema().load({
+    'name': 'Test1',
+    'digest': 'abc',
+    'runtime': 1000,
+    'deadline': 1000,
+    'period': 1000
+})
+test_chunks = [b'a' * 10, b'b' * 10, b'c' * 10]
+
+
+class MockPool():
+
+    def __init__(self, cached=()):
+        self.clients = {}
+        self.loaded = {}
+        for node in test_nodes:
+            client = mock.MagicMock()
+            client.images.list.return_value = [] if node.name not in cached else [
+                mock.MagicMock()]
+            client.images.get.return_value.save.return_value = iter(
+                test_chunks)
+            client.images.load.side_effect = self.load(node.name)
+            self.clients[node.ip] = client
+
+    def load(self, name):
+        def side_effect(data):
+            self.loaded[name] = b''.join(data)
+        return side_effect
+
+    @contextmanager
+    def client(self, node: Node):
+        yield self.clients[node.ip]
+
+
+@mock.patch('shipyard.crane.distribute.build_image')
+class TestDistribute(unittest.TestCase):
+
+    def test_distribute_image(self, mock_build):
+        pool = MockPool(cached=['Test3'])
+
+        with mock.patch('shipyard.crane.distribute.pool', pool):
+            report = distribute_image(
+                BytesIO(), test_task, test_nodes[1:], [test_nodes[0]])
+
+        mock_build.assert_called_once()
+        self.assertIs(mock_build.call_args[0][2], test_nodes[0])
+        self.assertEqual(pool.loaded, {
+            'Test1': b''.join(test_chunks),
+            'Test2': b''.join(test_chunks)
+        })
+        self.assertEqual(len(report), 3)
+        self.assertTrue(all(r['status'] == 'succeeded' for r in report))
+
+    def test_interrupted_stream(self, mock_build):
+        pool = MockPool()
+        builder = pool.clients[test_nodes[1].ip]
+        builder.images.get.return_value.save.side_effect = IOError
+
+        with mock.patch('shipyard.crane.distribute.pool', pool):
+            report = distribute_image(
+                BytesIO(), test_task, test_nodes[1:3], [])
+
+        statuses = {r['node']: r['status'] for r in report}
+        self.assertEqual(statuses[str(test_nodes[1]._id)], 'succeeded')
+        self.assertEqual(statuses[str(test_nodes[2]._id)], 'failed')
+
+    def test_failed_build(self, mock_build):
+        mock_build.side_effect = RuntimeError('Test')
+
+        with mock.patch('shipyard.crane.distribute.pool', MockPool()):
+            report = distribute_image(
+                BytesIO(), test_task, test_nodes[1:3], [])
+
+        self.assertEqual(len(report), 2)
+        self.assertTrue(all(r['status'] == 'failed' for r in report))
+
+    def test_timeout(self, mock_build):
+        def slow_save(**kwargs):
+            for chunk in test_chunks:
+                time.sleep(0.05)
+                yield chunk
+
+        # Copies don't wait on the timeout of other node operations
+        pool = MockPool()
+        builder = pool.clients[test_nodes[1].ip]
+        builder.images.get.return_value.save.side_effect = slow_save
+
+        with mock.patch('shipyard.crane.distribute.pool', pool), \
+                mock.patch('shipyard.crane.distribute.TIMEOUT', 3600), \
+                mock.patch('shipyard.crane.fanout.collect',
+                           wraps=fanout.collect) as collect:
+            report = distribute_image(
+                BytesIO(), test_task, test_nodes[1:3], [])
+
+        statuses = {r['node']: r['status'] for r in report}
+        self.assertEqual(statuses[str(test_nodes[2]._id)], 'succeeded')
+        self.assertGreater(collect.call_args[1]['timeout'], fanout.TIMEOUT)
+
+        # but on their own
+        pool = MockPool()
+        builder = pool.clients[test_nodes[1].ip]
+        builder.images.get.return_value.save.side_effect = slow_save
+
+        with mock.patch('shipyard.crane.distribute.pool', pool), \
+                mock.patch('shipyard.crane.distribute.TIMEOUT', 0.01):
+            report = distribute_image(
+                BytesIO(), test_task, test_nodes[1:3], [])
+
+        statuses = {r['node']: r['status'] for r in report}
+        self.assertNotEqual(statuses[str(test_nodes[2]._id)], 'succeeded')
+        self.assertNotIn('Test2', pool.loaded)
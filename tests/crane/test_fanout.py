@@ -0,0 +1,62 @@
+import threading
+import unittest
+
+from shipyard.crane import fanout
+from shipyard.node.model import Node
+
+
+test_node = Node.Schema().load({
+    'name': 'Test1',
+    'ip': '1.1.1.1',
+    'ssh_user': 'Test1',
+    'cpu_cores': 4
+})
+
+
+def succeed():
+    return
+
+
+def fail():
+    raise RuntimeError('Test')
+
+
+class TestFanout(unittest.TestCase):
+
+    def test_collect(self):
+        release = threading.Event()
+        futures = {
+            'Test1': fanout.submit(test_node, succeed),
+            'Test2': fanout.submit(test_node, fail),
+            'Test3': fanout.submit(test_node, release.wait)
+        }
+
+        report = fanout.collect(futures, key='task', timeout=0.5)
+        release.set()
+
+        self.assertEqual(report, [
+            {'task': 'Test1', 'status': fanout.SUCCEEDED},
+            {'task': 'Test2', 'status': fanout.FAILED, 'error': 'Test'},
+            {'task': 'Test3', 'status': fanout.TIMED_OUT}
+        ])
+
+    def test_key_concurrency(self):
+        executor = fanout.KeyedExecutor(4, 2, 'test')
+        lock = threading.Lock()
+        release = threading.Event()
+        running = []
+
+        def block(key):
+            with lock:
+                running.append(key)
+            release.wait()
+
+        futures = {
+            str(i): executor.submit('Test1', block, 'Test1') for i in range(4)
+        }
+        futures['4'] = executor.submit('Test2', block, 'Test2')
+        fanout.collect(futures, key='task', timeout=0.5)
+        self.assertEqual(running.count('Test1'), 2)
+        self.assertEqual(running.count('Test2'), 1)
+
+        release.set()
@@ -0,0 +1,109 @@
+import random
+import unittest
+
+from math import gcd
+from typing import List
+
+from shipyard.crane.feasibility import (bak_test, bcl_test, check_feasibility,
+                                       gfb_test, qpa_test)
+from shipyard.task.model import Task
+from tests.helpers import make_tasks
+
+
+def brute_force(tasks: List[Task]) -> bool:
+    if sum(t.runtime / t.period for t in tasks) > 1:
+        return False
+
+    hyperperiod = 1
+    for task in tasks:
+        hyperperiod = hyperperiod * task.period // gcd(hyperperiod, task.period)
+    horizon = hyperperiod + max(t.deadline for t in tasks)
+
+    for t in range(1, horizon + 1):
+        demand = sum(((t - task.deadline) // task.period + 1) * task.runtime
+                     for task in tasks if t >= task.deadline)
+        if demand > t:
+            return False
+    return True
+
+
+class TestFeasibility(unittest.TestCase):
+
+    def test_density(self):
+        verdict = check_feasibility(make_tasks([(1, 4, 4), (1, 2, 2)]), 1)
+        self.assertTrue(verdict)
+        self.assertEqual(verdict.test, 'density')
+
+    def test_utilization(self):
+        verdict = check_feasibility(make_tasks([(3, 4, 4), (1, 2, 2)]), 1)
+        self.assertFalse(verdict)
+        self.assertEqual(verdict.test, 'utilization')
+
+    def test_qpa(self):
+        # Density is above one, but the taskset is schedulable
+        verdict = check_feasibility(make_tasks([(2, 3, 10), (2, 4, 10)]), 1)
+        self.assertTrue(verdict)
+        self.assertEqual(verdict.test, 'qpa')
+
+        # Both tasks need to run before instant 3
+        verdict = check_feasibility(make_tasks([(2, 3, 10), (2, 3, 10)]), 1)
+        self.assertFalse(verdict)
+        self.assertEqual(verdict.test, 'qpa')
+
+    def test_qpa_large_periods(self):
+        tasks = make_tasks([
+            (10000, 40000, 1000003),
+            (20000, 30000, 999983),
+            (500000, 900000, 1000000)
+        ])
+        self.assertTrue(qpa_test(tasks, 1))
+
+    def test_qpa_exact(self):
+        generator = random.Random(42)
+        for _ in range(300):
+            params = []
+            for _ in range(generator.randint(1, 4)):
+                period = generator.randint(2, 12)
+                runtime = generator.randint(1, period)
+                deadline = generator.randint(runtime, 2 * period)
+                params.append((runtime, deadline, period))
+            tasks = make_tasks(params)
+            self.assertEqual(bool(qpa_test(tasks, 1)), brute_force(tasks),
+                             params)
+
+    def test_multiple_cores(self):
+        tasks = make_tasks([(1, 4, 4)] * 4)
+        verdict = check_feasibility(tasks, 2)
+        self.assertTrue(verdict)
+        self.assertEqual(verdict.test, 'gfb')
+
+        # A single task using a whole core
+        verdict = check_feasibility(make_tasks([(10, 10, 10)]), 4)
+        self.assertTrue(verdict)
+
+        verdict = check_feasibility(make_tasks([(5, 4, 4)] * 2), 2)
+        self.assertFalse(verdict)
+        self.assertEqual(verdict.test, 'utilization')
+
+    def test_bcl(self):
+        # Too heavy for GFB and BAK, but schedulable
+        tasks = make_tasks([(7, 10, 10), (7, 10, 10), (2, 10, 10)])
+        self.assertIsNone(gfb_test(tasks, 2))
+        self.assertIsNone(bak_test(tasks, 2))
+        self.assertTrue(bcl_test(tasks, 2))
+
+        verdict = check_feasibility(tasks, 2)
+        self.assertTrue(verdict)
+        self.assertEqual(verdict.test, 'bcl')
+
+    def test_dhall_effect(self):
+        # Utilization is far from the number of cores, but the heavy task
+        # misses its deadline when the light ones are released with it
+        tasks = make_tasks([(2, 20, 20), (2, 20, 20), (20, 21, 21)])
+        self.assertIsNone(gfb_test(tasks, 2))
+        self.assertIsNone(bak_test(tasks, 2))
+        self.assertIsNone(bcl_test(tasks, 2))
+
+        verdict = check_feasibility(tasks, 2)
+        self.assertFalse(verdict)
+        self.assertEqual(verdict.test, 'bak')
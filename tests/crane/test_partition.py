@@ -0,0 +1,41 @@
+import unittest
+
+from shipyard.crane.partition import (BEST_FIT, FIRST_FIT, WORST_FIT,
+                                      check_placement, partition)
+from tests.helpers import make_node, make_tasks
+
+
+class TestPartition(unittest.TestCase):
+
+    def test_heuristics(self):
+        tasks = make_tasks([(5, 10, 10), (2, 10, 10), (3, 10, 10)])
+        self.assertEqual(partition(tasks, 2, FIRST_FIT), [0, 0, 0])
+        self.assertEqual(partition(tasks, 2, BEST_FIT), [0, 0, 0])
+        self.assertEqual(partition(tasks, 2, WORST_FIT), [0, 1, 1])
+
+    def test_keep_cores(self):
+        tasks = make_tasks([(5, 10, 10), (5, 10, 10), (3, 10, 10)])
+        tasks[0].core = 1
+        self.assertEqual(partition(tasks, 2, FIRST_FIT), [1, 0, 0])
+
+    def test_repartition(self):
+        # The new task only fits if the existing ones share a core
+        tasks = make_tasks([(3, 10, 10), (3, 10, 10), (8, 10, 10)])
+        tasks[0].core = 0
+        tasks[1].core = 1
+        self.assertEqual(partition(tasks, 2, FIRST_FIT), [1, 1, 0])
+
+        tasks = make_tasks([(6, 10, 10), (6, 10, 10), (6, 10, 10)])
+        self.assertIsNone(partition(tasks, 2, FIRST_FIT))
+
+    def test_check_placement(self):
+        # Schedulable when partitioned, but not proven so under global EDF
+        tasks = make_tasks([(2, 20, 20), (2, 20, 20), (20, 21, 21)])
+
+        verdict = check_placement(tasks, make_node(2, 'global'))
+        self.assertFalse(verdict)
+        self.assertIsNone(tasks[2].core)
+
+        verdict = check_placement(tasks, make_node(2, 'partitioned'))
+        self.assertTrue(verdict)
+        self.assertEqual([task.core for task in tasks], [1, 1, 0])
@@ -0,0 +1,84 @@
+import unittest
+
+from shipyard.crane.placement import plan_batch, rank_nodes
+from tests.helpers import make_nodes, make_task
+
+
+class TestPlacement(unittest.TestCase):
+
+    def test_scorings(self):
+        nodes = make_nodes([('Test1', [5]), ('Test2', [1, 1, 1]),
+                            ('Test3', [9])])
+        task = make_task('Test', 2)
+
+        ranking = rank_nodes(task, nodes, 'spread')
+        self.assertEqual([c.node.name for c in ranking], ['Test2', 'Test1'])
+
+        ranking = rank_nodes(task, nodes, 'pack')
+        self.assertEqual([c.node.name for c in ranking], ['Test1', 'Test2'])
+
+        ranking = rank_nodes(task, nodes, 'fewest-tasks')
+        self.assertEqual([c.node.name for c in ranking], ['Test1', 'Test2'])
+
+    def test_filters(self):
+        nodes = make_nodes([('Test1', []), ('Device', [])])
+        nodes[1].devices = ['/dev/test']
+
+        task = make_task('Test', 2, ['/dev/test'])
+        ranking = rank_nodes(task, nodes)
+        self.assertEqual([c.node.name for c in ranking], ['Device'])
+        self.assertIsNot(ranking[0].task, task)
+
+        task = make_task('Test', 2)
+        nodes[0].tasks.append(task)
+        ranking = rank_nodes(task, nodes)
+        self.assertEqual([c.node.name for c in ranking], ['Device'])
+
+    def test_plan_batch(self):
+        nodes = make_nodes([('Test1', [2]), ('Test2', [])])
+        tasks = [make_task(f'Test{i}', runtime)
+                 for i, runtime in enumerate([4, 6, 3, 3, 2])]
+
+        assignments, unplaced = plan_batch(tasks, nodes, 1)
+        self.assertEqual(unplaced, [])
+        self.assertEqual(
+            sorted(t.name for a in assignments for t in a.tasks),
+            sorted(t.name for t in tasks))
+        for assignment in assignments:
+            self.assertLessEqual(
+                sum(t.runtime for t in assignment.node.tasks + assignment.tasks),
+                10)
+        self.assertEqual(len(nodes[0].tasks), 1)
+
+    def test_plan_batch_improve(self):
+        # Best fit puts both heavy tasks on the same node, which leaves
+        # no room for one of the light ones
+        nodes = make_nodes([('Test1', [3]), ('Test2', [3])])
+        tasks = [make_task(f'Test{i}', runtime)
+                 for i, runtime in enumerate([3, 3, 2, 2, 2, 2])]
+
+        _, unplaced = plan_batch(tasks, nodes, 1, improve=False)
+        self.assertEqual(len(unplaced), 1)
+
+        assignments, unplaced = plan_batch(tasks, nodes, 1)
+        self.assertEqual(unplaced, [])
+        self.assertEqual(len(assignments), 2)
+
+        _, unplaced = plan_batch(tasks, nodes, 0)
+        self.assertEqual(len(unplaced), 1)
+
+    def test_plan_batch_pack(self):
+        # Best fit places every task, but needs a third node for the last one
+        nodes = make_nodes([('Test1', []), ('Test2', []), ('Test3', [])])
+        tasks = [make_task(f'Test{i}', runtime)
+                 for i, runtime in enumerate([4, 4, 3, 3, 3, 3])]
+
+        assignments, unplaced = plan_batch(tasks, nodes, 1, improve=False)
+        self.assertEqual(unplaced, [])
+        self.assertEqual(len(assignments), 3)
+
+        assignments, unplaced = plan_batch(tasks, nodes, 1)
+        self.assertEqual(unplaced, [])
+        self.assertEqual(len(assignments), 2)
+        for assignment in assignments:
+            self.assertEqual(sum(t.runtime for t in assignment.tasks), 10)
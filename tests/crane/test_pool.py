@@ -0,0 +1,84 @@
+import unittest
+
+from unittest import mock
+
+import docker
+
+from shipyard.crane.pool import ClientPool
+from shipyard.node.model import Node
+
+
+test_node = Node.Schema().load({
+    'name': 'Test1',
+    'ip': '1.1.1.1',
+    'ssh_user': 'Test1',
+    'cpu_cores': 4
+})
+
+
+@mock.patch('shipyard.crane.pool.docker.DockerClient')
+class TestClientPool(unittest.TestCase):
+
+    def test_reuse(self, mock_client):
+        pool = ClientPool()
+
+        with pool.client(test_node) as client:
+            first = client
+        with pool.client(test_node) as client:
+            self.assertIs(client, first)
+
+        mock_client.assert_called_once_with(base_url='ssh://Test1@1.1.1.1')
+
+    def test_broken_connection(self, mock_client):
+        pool = ClientPool()
+
+        with self.assertRaises(ConnectionError):
+            with pool.client(test_node) as client:
+                raise ConnectionError
+        client.close.assert_called_once()
+
+        with pool.client(test_node):
+            pass
+        self.assertEqual(mock_client.call_count, 2)
+
+    def test_api_error(self, mock_client):
+        pool = ClientPool()
+
+        with self.assertRaises(docker.errors.NotFound):
+            with pool.client(test_node) as client:
+                raise docker.errors.NotFound('Test')
+        client.close.assert_not_called()
+
+        with pool.client(test_node):
+            pass
+        mock_client.assert_called_once()
+
+    def test_health_check(self, mock_client):
+        pool = ClientPool(check_interval=0)
+
+        with pool.client(test_node) as client:
+            client.ping.side_effect = ConnectionError
+        with pool.client(test_node) as client:
+            pass
+
+        self.assertEqual(mock_client.call_count, 2)
+
+    def test_idle_eviction(self, mock_client):
+        pool = ClientPool(idle_timeout=0)
+
+        with pool.client(test_node) as client:
+            pass
+        pool.evict_idle()
+        client.close.assert_called_once()
+
+    def test_discard(self, mock_client):
+        pool = ClientPool()
+
+        with pool.client(test_node) as client:
+            pass
+        pool.discard(test_node)
+        client.close.assert_called_once()
+
+        with pool.client(test_node):
+            pass
+        self.assertEqual(mock_client.call_count, 2)
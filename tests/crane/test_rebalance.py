@@ -0,0 +1,40 @@
+import unittest
+
+from shipyard.crane.rebalance import plan_rebalance
+from tests.helpers import make_nodes, make_task
+
+
+class TestRebalance(unittest.TestCase):
+
+    def test_make_room(self):
+        nodes = make_nodes([('Test1', [3, 3]), ('Test2', [2, 5]),
+                            ('Test3', [6])])
+
+        # Already fits in some node
+        plan = plan_rebalance(nodes, make_task('Test', 4), 1)
+        self.assertEqual(plan.moves, [])
+        self.assertEqual(plan.host.name, 'Test1')
+
+        # Moving a single task is enough
+        plan = plan_rebalance(nodes, make_task('Test', 6), 1)
+        self.assertEqual(len(plan.moves), 1)
+        move = plan.moves[0]
+        self.assertEqual(move.source.name, plan.host.name)
+        self.assertNotEqual(move.target.name, plan.host.name)
+
+        # Doesn't fit anywhere even after moving tasks
+        self.assertIsNone(plan_rebalance(nodes, make_task('Test', 11), 1))
+
+    def test_drain(self):
+        nodes = make_nodes([('Test1', [6]), ('Test2', [1, 1]),
+                            ('Test3', [2]), ('Test4', [])])
+
+        plan = plan_rebalance(nodes, budget=1)
+        self.assertEqual(sorted(node.name for node in plan.freed),
+                         ['Test2', 'Test3'])
+        self.assertEqual(len(plan.moves), 3)
+        for move in plan.moves:
+            self.assertEqual(move.target.name, 'Test1')
+
+        # Nodes are not modified
+        self.assertEqual(len(nodes[0].tasks), 1)
@@ -0,0 +1,66 @@
+import unittest
+
+from contextlib import contextmanager
+from unittest import mock
+
+import docker
+
+from bson.objectid import ObjectId
+
+from shipyard.crane.remove import drop_from_nodes, remove_task
+from shipyard.node.model import Node
+
+
+test_nodes = Node.Schema().load([
+    {
+        '_id': str(ObjectId()),
+        'name': name,
+        'ip': '1.1.1.1',
+        'ssh_user': name,
+        'cpu_cores': 4
+    }
+    for name in ('Test1', 'Test2')
+], many=True)
+
+
+class MockPool():
+
+    def __init__(self):
+        self.docker = mock.MagicMock()
+
+    @contextmanager
+    def client(self, node: Node):
+        yield self.docker
+
+
+class TestRemove(unittest.TestCase):
+
+    def test_remove_task(self):
+        pool = MockPool()
+
+        with mock.patch('shipyard.crane.remove.pool', pool):
+            remove_task('Test1', test_nodes[0])
+        pool.docker.images.remove.assert_called_once_with(image='Test1')
+
+        pool.docker.images.remove.reset_mock()
+        with mock.patch('shipyard.crane.remove.pool', pool):
+            remove_task('Test1', test_nodes[0], 'abc')
+        pool.docker.images.remove.assert_has_calls([
+            mock.call(image='Test1'),
+            mock.call(image='shipyard/cache:abc')
+        ])
+
+    def test_drop_from_nodes(self):
+        pool = MockPool()
+        pool.docker.images.remove.side_effect = [
+            None, docker.errors.ImageNotFound('abc')]
+
+        with mock.patch('shipyard.crane.remove.pool', pool):
+            report = drop_from_nodes('abc', test_nodes)
+
+        # Nodes without the image have nothing to drop
+        self.assertEqual([r['status'] for r in report],
+                         ['succeeded', 'succeeded'])
+        pool.docker.images.remove.assert_called_with(
+            image='shipyard/cache:abc')
+        pool.docker.containers.get.assert_not_called()
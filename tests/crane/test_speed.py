@@ -0,0 +1,35 @@
+import unittest
+
+from shipyard.crane.partition import check_placement
+from shipyard.crane.speed import scale, scaled_runtime
+from tests.helpers import make_node, make_task
+
+
+class TestSpeed(unittest.TestCase):
+
+    def test_scaled_runtime(self):
+        # Half as fast needs twice the time, rounded up
+        task = make_task('Test1', 3, ref_freq=2000)
+        self.assertEqual(scaled_runtime(task, make_node(cpu_freq=1000)), 6)
+        task = make_task('Test1', 3, ref_freq=1000)
+        self.assertEqual(scaled_runtime(task, make_node(cpu_freq=2000)), 2)
+
+        # Unknown frequencies keep the runtime
+        task = make_task('Test1', 3)
+        self.assertEqual(scaled_runtime(task, make_node(cpu_freq=1000)), 3)
+        task = make_task('Test1', 3, ref_freq=1000)
+        self.assertEqual(scaled_runtime(task, make_node()), 3)
+
+    def test_scale(self):
+        task = make_task('Test1', 3, ref_freq=2000)
+        stored = make_task('Test1', 3, ref_freq=2000)
+        stored.scaled_runtime = 4
+
+        scaled = scale([task, stored], make_node(cpu_freq=1000))
+        self.assertEqual([t.runtime for t in scaled], [6, 4])
+        self.assertEqual(task.runtime, 3)
+
+    def test_check_placement(self):
+        tasks = [make_task(f'Test{i}', 4, ref_freq=2000) for i in range(2)]
+        self.assertTrue(check_placement(tasks, make_node(cpu_freq=2000)))
+        self.assertFalse(check_placement(tasks, make_node(cpu_freq=1000)))
@@ -0,0 +1,59 @@
+"""
+Tasks and nodes built in memory for the tests of the scheduling code.
+"""
+
+from typing import List, Tuple
+
+from bson.objectid import ObjectId
+
+from shipyard.node.model import GLOBAL, Node
+from shipyard.task.model import Task
+
+
+def make_tasks(params: List[Tuple[int, int, int]],
+               devices: List[str] = None) -> List[Task]:
+    """Returns tasks with the given runtimes, deadlines and periods."""
+
+    return [
+        Task(_id=None, file_id=None, digest=None, name=f'Test{i}',
+             runtime=c, deadline=d, period=t, devices=list(devices or []))
+        for i, (c, d, t) in enumerate(params)
+    ]
+
+
+def make_task(name: str, runtime: int, devices: List[str] = None,
+              ref_freq: int = None) -> Task:
+    """Returns a task with its own ID, released every 10 time units."""
+
+    return Task(_id=ObjectId(), file_id=None, digest=None, name=name,
+                runtime=runtime, deadline=10, period=10,
+                devices=list(devices or []), ref_freq=ref_freq)
+
+
+def make_node(cpu_cores: int = 1, scheduling: str = GLOBAL,
+              name: str = 'Test1', cpu_freq: int = None) -> Node:
+    """Returns a node with its own ID and no tasks."""
+
+    return Node.Schema().load({
+        '_id': str(ObjectId()),
+        'name': name,
+        'ip': '1.1.1.1',
+        'cpu_cores': cpu_cores,
+        'cpu_freq': cpu_freq,
+        'scheduling': scheduling
+    })
+
+
+def make_nodes(params: List[Tuple[str, List[int]]]) -> List[Node]:
+    """
+    Returns single-core nodes with the given names, each running tasks with
+    the given runtimes.
+    """
+
+    nodes = []
+    for name, runtimes in params:
+        node = make_node(name=name)
+        node.tasks = [make_task(f'{name}-{i}', runtime)
+                      for i, runtime in enumerate(runtimes)]
+        nodes.append(node)
+    return nodes
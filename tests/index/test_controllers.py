@@ -0,0 +1,29 @@
+import unittest
+
+import hug
+
+from unittest import mock
+
+from shipyard.index import controllers
+
+
+test_report = {
+    'collections': {'nodes': {'indexes': ['_id_', 'name'], 'missing': []}},
+    'lookups': []
+}
+
+
+class MockService():
+
+    @staticmethod
+    def report() -> dict:
+        return test_report
+
+
+@mock.patch('shipyard.index.controllers.IndexService', MockService)
+class TestControllers(unittest.TestCase):
+
+    def test_get_index_report(self):
+        response = hug.test.call('GET', controllers, '')
+        self.assertEqual(response.status, hug.HTTP_OK)
+        self.assertEqual(response.data, test_report)
@@ -0,0 +1,56 @@
+import unittest
+
+import mongomock
+
+from unittest import mock
+
+from shipyard.index.service import IndexService
+
+
+mockdb = mongomock.MongoClient().shipyard
+test_plan = {
+    'queryPlanner': {
+        'winningPlan': {
+            'stage': 'FETCH',
+            'inputStage': {'stage': 'IXSCAN', 'indexName': 'name'}
+        }
+    }
+}
+
+
+@mock.patch('shipyard.index.service.db', mockdb)
+@mock.patch.object(mongomock.collection.Cursor, 'explain',
+                   lambda self: test_plan, create=True)
+class TestService(unittest.TestCase):
+
+    def tearDown(self):
+        mockdb.nodes.drop()
+        mockdb.tasks.drop()
+
+    def test_ensure(self):
+        self.assertEqual(IndexService.ensure(), [])
+        self.assertTrue(mockdb.nodes.index_information()['name']['unique'])
+        self.assertIn('tasks._id', mockdb.nodes.index_information())
+        self.assertTrue(mockdb.tasks.index_information()['name']['unique'])
+
+        # Creating them again changes nothing
+        self.assertEqual(IndexService.ensure(), [])
+
+    def test_ensure_duplicates(self):
+        mockdb.tasks.insert_many([{'name': 'Test1'}, {'name': 'Test1'}])
+        self.assertEqual(IndexService.ensure(), ['tasks.name'])
+
+    def test_report(self):
+        report = IndexService.report()
+        self.assertEqual(report['collections']['nodes']['missing'],
+                         ['name', 'tasks._id'])
+
+        IndexService.ensure()
+        report = IndexService.report()
+        self.assertEqual(report['collections']['nodes']['missing'], [])
+        self.assertEqual(report['lookups'][0], {
+            'name': 'node by name',
+            'collection': 'nodes',
+            'stages': ['FETCH', 'IXSCAN'],
+            'indexes': ['name']
+        })
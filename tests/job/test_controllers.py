@@ -0,0 +1,72 @@
+import unittest
+
+import hug
+
+from typing import List
+from unittest import mock
+
+from bson.objectid import ObjectId
+
+from shipyard.errors import NotFound
+from shipyard.job import controllers
+from shipyard.job.model import Job
+
+
+test_jobs = Job.Schema().load([
+    {
+        '_id': str(ObjectId()),
+        'node_id': str(ObjectId()),
+        'task_id': str(ObjectId()),
+        'status': 'succeeded',
+        'phases': [
+            {'name': 'upload', 'started': 1.0, 'finished': 2.0},
+            {'name': 'build', 'started': 2.0, 'finished': 3.0}
+        ]
+    }
+], many=True)
+
+
+class MockService():
+
+    @staticmethod
+    def get_all(node_id: str = None, status: str = None) -> List[Job]:
+        if node_id is not None:
+            ObjectId(node_id)
+        return test_jobs
+
+    @staticmethod
+    def get_by_id(job_id: str) -> Job:
+        for job in test_jobs:
+            if ObjectId(job_id) == job._id:
+                return job
+
+        raise NotFound
+
+
+@mock.patch('shipyard.job.controllers.JobService', MockService)
+class TestControllers(unittest.TestCase):
+
+    def test_get_job_list(self):
+        response = hug.test.call('GET', controllers, '')
+        self.assertEqual(response.status, hug.HTTP_OK)
+        self.assertEqual(len(response.data), 1)
+        self.assertNotIn('phases', response.data[0])
+
+        response = hug.test.call('GET', controllers, '', params={
+            'node_id': 'error'
+        })
+        self.assertEqual(response.status, hug.HTTP_BAD_REQUEST)
+        self.assertIsInstance(response.data['error'], str)
+
+    def test_get_job(self):
+        response = hug.test.call('GET', controllers, f'{test_jobs[0]._id}')
+        self.assertEqual(response.status, hug.HTTP_OK)
+        self.assertEqual(len(response.data['phases']), 2)
+
+        response = hug.test.call('GET', controllers, f'{ObjectId()}')
+        self.assertEqual(response.status, hug.HTTP_NOT_FOUND)
+        self.assertIsInstance(response.data['error'], str)
+
+        response = hug.test.call('GET', controllers, 'error')
+        self.assertEqual(response.status, hug.HTTP_BAD_REQUEST)
+        self.assertIsInstance(response.data['error'], str)
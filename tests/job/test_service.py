@@ -0,0 +1,199 @@
+import unittest
+
+import mongomock
+
+from unittest import mock
+from typing import Callable, Tuple
+
+from bson.objectid import ObjectId
+
+from shipyard.crane.feasibility import Verdict
+from shipyard.errors import NotFeasible, NotFound
+from shipyard.job.service import JobService
+from shipyard.leases import WORKER
+from shipyard.node.model import Node
+from shipyard.task.model import Task
+
+
+mockdb = mongomock.MongoClient().shipyard
+test_node = Node.Schema().load({
+    '_id': str(ObjectId()),
+    'name': 'Test1',
+    'ip': '1.1.1.1',
+    'ssh_user': 'Test1',
+    'cpu_cores': 4
+})
+test_task = Task.Schema().load({
+    '_id': str(ObjectId()),
+    'name': 'Test1',
+    'runtime': 1000,
+    'deadline': 1000,
+    'period': 1000
+})
+
+
+class MockNodeService():
+
+    @staticmethod
+    def admit(node_id: str, task_id: str) -> Tuple[Node, Task, Verdict]:
+        if ObjectId(task_id) != test_task._id:
+            raise NotFeasible
+        return test_node, test_task, Verdict(True, 'test')
+
+    @staticmethod
+    def deploy(node: Node, task: Task, progress: Callable[[str], None] = None) -> Node:
+        progress('upload')
+        progress('build')
+        if node.name == 'Failed':
+            raise RuntimeError('Test')
+        progress('run')
+        return node
+
+    @staticmethod
+    def release(node: Node, task: Task):
+        mockdb.nodes.update_one({'_id': node._id}, {
+            '$pull': {'tasks': {'_id': task._id}, 'reserved': task._id}
+        })
+
+
+class MockExecutor():
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, key: str, fn, *args):
+        self.submitted.append((key, args))
+
+
+def mock_remove_task(task_name: str, node: Node, digest: str = None):
+    return
+
+
+@mock.patch('shipyard.job.service.db', mockdb)
+@mock.patch('shipyard.leases.db', mockdb)
+@mock.patch('shipyard.job.service.NodeService', MockNodeService)
+@mock.patch('shipyard.job.service.remove_task', mock_remove_task)
+class TestService(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = MockExecutor()
+        self.patcher = mock.patch(
+            'shipyard.job.service.executor', self.executor)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        test_node.name = 'Test1'
+        mockdb.jobs.delete_many({})
+        mockdb.nodes.delete_many({})
+        mockdb.workers.delete_many({})
+
+    def test_create(self):
+        job_id = JobService.create(str(test_node._id), str(test_task._id))
+        self.assertEqual(self.executor.submitted,
+                         [(str(test_node._id), (ObjectId(job_id),))])
+
+        job = JobService.get_by_id(job_id)
+        self.assertEqual(job.status, 'queued')
+        self.assertEqual(job.worker, WORKER)
+
+        with self.assertRaises(NotFeasible):
+            JobService.create(str(test_node._id), str(ObjectId()))
+        self.assertEqual(mockdb.jobs.count_documents({}), 1)
+
+    def test_run(self):
+        job_id = JobService.create(str(test_node._id), str(test_task._id))
+        JobService.run(ObjectId(job_id))
+
+        job = JobService.get_by_id(job_id)
+        self.assertEqual(job.status, 'succeeded')
+        self.assertEqual([phase.name for phase in job.phases],
+                         ['upload', 'build', 'run'])
+        self.assertTrue(all(phase.finished is not None
+                            for phase in job.phases))
+        self.assertIsNotNone(job.finished)
+
+        # Finished jobs are not run again
+        JobService.run(ObjectId(job_id))
+        self.assertEqual(JobService.get_by_id(job_id).phases, job.phases)
+
+    def test_run_failed(self):
+        test_node.name = 'Failed'
+        job_id = JobService.create(str(test_node._id), str(test_task._id))
+        JobService.run(ObjectId(job_id))
+
+        job = JobService.get_by_id(job_id)
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.error, 'Test')
+        self.assertEqual([phase.name for phase in job.phases],
+                         ['upload', 'build'])
+
+    def test_resume(self):
+        queued = JobService.create(str(test_node._id), str(test_task._id))
+        running = JobService.create(str(test_node._id), str(test_task._id))
+        mockdb.jobs.update_one({'_id': ObjectId(running)},
+                               {'$set': {'status': 'running'}})
+        mockdb.nodes.insert_one({'_id': test_node._id,
+                                 'tasks': [{'_id': test_task._id}]})
+
+        # Jobs of this process are still being run
+        self.executor.submitted = []
+        self.assertEqual(JobService.resume(), 0)
+
+        # The process running them stops
+        mockdb.jobs.update_many({}, {'$set': {'worker': 'stopped'}})
+        mockdb.workers.insert_one({'_id': 'stopped', 'expires': 0})
+        self.assertEqual(JobService.resume(), 2)
+        self.assertEqual(len(self.executor.submitted), 2)
+
+        # The interrupted job had already deployed the task
+        JobService.run(ObjectId(running))
+        job = JobService.get_by_id(running)
+        self.assertTrue(job.resumed)
+        self.assertEqual(job.worker, WORKER)
+        self.assertEqual(job.status, 'succeeded')
+        self.assertEqual(job.phases, [])
+
+        self.assertFalse(JobService.get_by_id(queued).resumed)
+
+    def test_resume_live(self):
+        running = JobService.create(str(test_node._id), str(test_task._id))
+        mockdb.jobs.update_one({'_id': ObjectId(running)},
+                               {'$set': {'status': 'running',
+                                         'worker': 'running'}})
+        mockdb.workers.insert_one({'_id': 'running', 'expires': 1e12})
+
+        # Another process is still running the job
+        self.assertEqual(JobService.resume(), 0)
+        self.assertEqual(JobService.get_by_id(running).status, 'running')
+
+    def test_resume_reserved(self):
+        running = JobService.create(str(test_node._id), str(test_task._id))
+        mockdb.jobs.update_one({'_id': ObjectId(running)},
+                               {'$set': {'status': 'running',
+                                         'worker': 'stopped'}})
+        mockdb.nodes.insert_one({
+            **Node.Schema().dump(test_node),
+            '_id': test_node._id,
+            'tasks': [{**Task.Schema().dump(test_task), '_id': test_task._id}],
+            'reserved': [test_task._id]
+        })
+        JobService.resume()
+
+        # The interrupted deployment didn't finish, so it's run again
+        JobService.run(ObjectId(running))
+        job = JobService.get_by_id(running)
+        self.assertEqual(job.status, 'succeeded')
+        self.assertEqual([phase.name for phase in job.phases],
+                         ['upload', 'build', 'run'])
+        self.assertEqual(mockdb.nodes.find_one()['reserved'], [])
+
+    def test_get_all(self):
+        JobService.create(str(test_node._id), str(test_task._id))
+        self.assertEqual(len(JobService.get_all()), 1)
+        self.assertEqual(len(JobService.get_all(str(test_node._id))), 1)
+        self.assertEqual(len(JobService.get_all(str(ObjectId()))), 0)
+        self.assertEqual(len(JobService.get_all(status='failed')), 0)
+
+        with self.assertRaises(NotFound):
+            JobService.get_by_id(str(ObjectId()))
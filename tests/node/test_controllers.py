@@ -3,11 +3,13 @@ import base64
 
 import hug
 
-from typing import List
+from typing import Iterable, List, Optional, Tuple
 from unittest import mock
 
 from bson.objectid import ObjectId
+from marshmallow import ValidationError
 
+from shipyard.crane.feasibility import Verdict
 from shipyard.errors import NotFound, NotFeasible, MissingDevices, AlreadyPresent
 from shipyard.node import controllers
 from shipyard.node.model import Node
@@ -30,6 +32,16 @@ test_nodes = Node.Schema().load([
     }
 ], many=True)
 
+# The nodes as read from the database
+test_documents = [{**Node.Schema().dump(item), '_id': item._id}
+                  for item in test_nodes]
+
+
+def project(documents: List[dict], fields: List[str]) -> List[dict]:
+    keys = {field.split('.')[0] for field in fields}
+    return [{k: v for k, v in document.items() if k in keys}
+            for document in documents]
+
 
 class MockService():
 
@@ -37,6 +49,31 @@ class MockService():
     def get_all() -> List[Node]:
         return test_nodes
 
+    @staticmethod
+    def get_page(fields: List[str], limit: int = None, after: str = None,
+                 cpu_arch: str = None, device: str = None,
+                 min_free: float = None) -> Tuple[List[dict], Optional[str]]:
+        if limit is not None and limit <= 0:
+            raise ValidationError('Test')
+        if after is not None:
+            ObjectId(after)
+        if limit is not None and limit < len(test_nodes):
+            return (project(test_documents[:limit], fields),
+                    str(test_nodes[limit - 1]._id))
+        return project(test_documents, fields), None
+
+    @staticmethod
+    def iterate(fields: List[str], limit: int = None, after: str = None,
+                cpu_arch: str = None, device: str = None,
+                min_free: float = None) -> Iterable[dict]:
+        if limit is not None and limit <= 0:
+            raise ValidationError('Test')
+        return iter(project(test_documents[:limit], fields))
+
+    @staticmethod
+    def get_version() -> int:
+        return 1
+
     @staticmethod
     def get_by_id(node_id: str) -> Node:
         for node in test_nodes:
@@ -62,23 +99,23 @@ class MockService():
         return str(ObjectId())
 
     @staticmethod
-    def update(node_id: str, new_values: dict) -> Node:
+    def update(node_id: str, new_values: dict) -> Tuple[Node, List[dict]]:
         for node in test_nodes:
             if ObjectId(node_id) == node._id:
-                return node
+                return node, []
 
         raise NotFound
 
     @staticmethod
-    def delete(node_id: str) -> Node:
+    def delete(node_id: str) -> Tuple[Node, List[dict]]:
         for node in test_nodes:
             if ObjectId(node_id) == node._id:
-                return node
+                return node, [{'task': 'Test', 'status': 'succeeded'}]
 
         raise NotFound
 
     @staticmethod
-    def add_task(node_id: str, task_id: str) -> Node:
+    def add_task(node_id: str, task_id: str) -> Tuple[Node, Verdict]:
         for node in test_nodes:
             if ObjectId(node_id) == node._id:
                 if task_id == 'NotFeasible':
@@ -87,7 +124,7 @@ class MockService():
                 if task_id == 'MissingDevices':
                     raise MissingDevices
 
-                return test_nodes[0]
+                return test_nodes[0], Verdict(True, 'qpa')
 
         raise NotFound
 
@@ -99,8 +136,33 @@ class MockService():
 
         raise NotFound
 
+    @staticmethod
+    def rebalance(task_id: str = None, execute: bool = False, budget: float = None) -> dict:
+        if budget is not None and budget < 0:
+            raise ValidationError('Test')
+
+        move = {'task': 'Test', 'from': 'Test1', 'to': 'Test2', 'core': None}
+        if execute:
+            move['status'] = 'succeeded'
+        if task_id is None:
+            return {'moves': [move], 'freed': ['Test1']}
+
+        ObjectId(task_id)
+        if task_id == str(test_nodes[0]._id):
+            raise NotFeasible
+        return {'moves': [move], 'host': 'Test1'}
+
+
+class MockJobService():
+
+    @staticmethod
+    def create(node_id: str, task_id: str) -> str:
+        MockService.add_task(node_id, task_id)
+        return str(ObjectId())
+
 
 @mock.patch('shipyard.node.controllers.NodeService', MockService)
+@mock.patch('shipyard.node.controllers.JobService', MockJobService)
 class TestControllers(unittest.TestCase):
 
     def test_get_node_list(self):
@@ -108,6 +170,55 @@ class TestControllers(unittest.TestCase):
         self.assertEqual(response.status, hug.HTTP_OK)
         self.assertIsNotNone(response.data)
         self.assertEqual(len(response.data), 2)
+        self.assertIn('load', response.data[0])
+
+        response = hug.test.call('GET', controllers, '', params={
+            'summary': True
+        })
+        self.assertEqual(response.status, hug.HTTP_OK)
+        self.assertIn('load', response.data[0])
+        self.assertNotIn('tasks', response.data[0])
+
+        response = hug.test.call('GET', controllers, '', params={'limit': 1})
+        self.assertEqual(response.status, hug.HTTP_OK)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.headers_dict['X-Next-Cursor'],
+                         str(test_nodes[0]._id))
+
+        response = hug.test.call('GET', controllers, '', params={'limit': -1})
+        self.assertEqual(response.status, hug.HTTP_BAD_REQUEST)
+
+        response = hug.test.call('GET', controllers, '', params={'limit': 1})
+        tag = response.headers_dict['ETag']
+        response = hug.test.call('GET', controllers, '', params={'limit': 1},
+                                 headers={'If-None-Match': tag})
+        self.assertEqual(response.status, hug.HTTP_NOT_MODIFIED)
+
+        # Streamed lists in other formats have other tags
+        response = hug.test.call('GET', controllers, '',
+                                 headers={'If-None-Match': tag,
+                                          'Accept': 'application/x-ndjson'})
+        self.assertEqual(response.status, hug.HTTP_OK)
+
+        response = hug.test.call('GET', controllers, '', params={
+            'stream': True
+        })
+        self.assertEqual(response.status, hug.HTTP_OK)
+        self.assertEqual(len(response.data), 2)
+        self.assertIn('load', response.data[0])
+
+        response = hug.test.call('GET', controllers, '', params={'limit': 1},
+                                 headers={'Accept': 'application/x-ndjson'})
+        self.assertEqual(response.status, hug.HTTP_OK)
+        self.assertEqual(response.content_type, 'application/x-ndjson')
+        self.assertEqual(len(response.data.splitlines()), 1)
+        self.assertNotIn('X-Next-Cursor', response.headers_dict)
+
+        response = hug.test.call('GET', controllers, '', params={
+            'stream': True,
+            'limit': -1
+        })
+        self.assertEqual(response.status, hug.HTTP_BAD_REQUEST)
 
         response = hug.test.call('GET', controllers, '', params={
             'name': test_nodes[0].name
@@ -173,6 +284,23 @@ class TestControllers(unittest.TestCase):
         self.assertEqual(response.status, hug.HTTP_OK)
         self.assertIsNotNone(response.data)
 
+        tag = response.headers_dict['ETag']
+        response = hug.test.call(
+            'GET', controllers, f'{str(test_nodes[0]._id)}',
+            headers={'If-None-Match': tag})
+        self.assertEqual(response.status, hug.HTTP_NOT_MODIFIED)
+
+        response = hug.test.call(
+            'GET', controllers, f'{str(test_nodes[0]._id)}',
+            headers={'If-None-Match': 'W/"other"'})
+        self.assertEqual(response.status, hug.HTTP_OK)
+
+        # Other nodes with the same version don't share the tag
+        response = hug.test.call(
+            'GET', controllers, f'{str(test_nodes[1]._id)}',
+            headers={'If-None-Match': tag})
+        self.assertEqual(response.status, hug.HTTP_OK)
+
         response = hug.test.call('GET', controllers, f'{ObjectId()}')
         self.assertEqual(response.status, hug.HTTP_NOT_FOUND)
         self.assertIsNotNone(response.data)
@@ -190,6 +318,7 @@ class TestControllers(unittest.TestCase):
                                  body={'name': 'Updated'})
         self.assertEqual(response.status, hug.HTTP_OK)
         self.assertIsNotNone(response.data)
+        self.assertEqual(response.data['removals'], [])
 
         response = hug.test.call('PUT',
                                  controllers,
@@ -212,6 +341,7 @@ class TestControllers(unittest.TestCase):
             'DELETE', controllers, f'{str(test_nodes[0]._id)}')
         self.assertEqual(response.status, hug.HTTP_OK)
         self.assertIsNotNone(response.data)
+        self.assertEqual(len(response.data['removals']), 1)
 
         response = hug.test.call('DELETE', controllers, f'{ObjectId()}')
         self.assertEqual(response.status, hug.HTTP_NOT_FOUND)
@@ -229,6 +359,7 @@ class TestControllers(unittest.TestCase):
         })
         self.assertEqual(response.status, hug.HTTP_OK)
         self.assertIsNotNone(response.data)
+        self.assertEqual(response.data['feasibility'], 'qpa')
 
         response = hug.test.call('POST', controllers, f'{ObjectId()}/tasks', params={
             'task_id': 'Test'
@@ -264,6 +395,21 @@ class TestControllers(unittest.TestCase):
         self.assertIsNotNone(response.data)
         self.assertIsInstance(response.data['error'], str)
 
+    def test_post_node_tasks_background(self):
+        response = hug.test.call('POST', controllers, f'{test_nodes[0]._id}/tasks', params={
+            'task_id': 'Test',
+            'background': 'true'
+        })
+        self.assertEqual(response.status, hug.HTTP_ACCEPTED)
+        self.assertIsInstance(response.data['_id'], str)
+
+        response = hug.test.call('POST', controllers, f'{test_nodes[0]._id}/tasks', params={
+            'task_id': 'NotFeasible',
+            'background': 'true'
+        })
+        self.assertEqual(response.status, hug.HTTP_INTERNAL_SERVER_ERROR)
+        self.assertIsInstance(response.data['error'], str)
+
     def test_delete_node_tasks(self):
         response = hug.test.call(
             'DELETE', controllers, f'{test_nodes[0]._id}/tasks/{ObjectId()}')
@@ -281,3 +427,33 @@ class TestControllers(unittest.TestCase):
         self.assertEqual(response.status, hug.HTTP_NOT_FOUND)
         self.assertIsNotNone(response.data)
         self.assertIsInstance(response.data['error'], str)
+
+    def test_post_rebalance(self):
+        response = hug.test.call('POST', controllers, 'rebalance')
+        self.assertEqual(response.status, hug.HTTP_OK)
+        self.assertEqual(response.data['freed'], ['Test1'])
+        self.assertNotIn('status', response.data['moves'][0])
+
+        response = hug.test.call('POST', controllers, 'rebalance', params={
+            'task_id': str(ObjectId()),
+            'execute': 'true'
+        })
+        self.assertEqual(response.status, hug.HTTP_OK)
+        self.assertEqual(response.data['host'], 'Test1')
+        self.assertEqual(response.data['moves'][0]['status'], 'succeeded')
+
+        response = hug.test.call('POST', controllers, 'rebalance', params={
+            'task_id': str(test_nodes[0]._id)
+        })
+        self.assertEqual(response.status, hug.HTTP_INTERNAL_SERVER_ERROR)
+        self.assertIsInstance(response.data['error'], str)
+
+        response = hug.test.call('POST', controllers, 'rebalance', params={
+            'task_id': 'error'
+        })
+        self.assertEqual(response.status, hug.HTTP_BAD_REQUEST)
+
+        response = hug.test.call('POST', controllers, 'rebalance', params={
+            'budget': '-1'
+        })
+        self.assertEqual(response.status, hug.HTTP_BAD_REQUEST)
@@ -0,0 +1,67 @@
+import unittest
+
+from shipyard.node.load import (check_load, pull_task, push_task, repin_task,
+                                summarize)
+from shipyard.node.model import DOT, PARTITIONED
+from tests.helpers import make_node, make_tasks
+
+DEVICES = ['/dev/test.1']
+
+
+class TestLoad(unittest.TestCase):
+
+    def test_summarize(self):
+        node = make_node(2, PARTITIONED)
+        tasks = make_tasks([(2, 5, 10), (3, 10, 10)], DEVICES)
+        tasks[0].core = 1
+
+        load = summarize(tasks, node)
+        self.assertEqual(load.tasks, 2)
+        self.assertAlmostEqual(load.utilization, 0.5)
+        self.assertAlmostEqual(load.density, 0.7)
+        self.assertAlmostEqual(load.free, 1.5)
+        self.assertEqual(load.cores, {'1': 0.4})
+        self.assertEqual(load.devices, {f'/dev/test{DOT}1': 2})
+
+    def test_updates(self):
+        node = make_node(2, PARTITIONED)
+        task = make_tasks([(2, 5, 10)], DEVICES)[0]
+        task.core = 0
+
+        self.assertEqual(push_task(task, node)['$inc'], {
+            'load.tasks': 1,
+            'load.utilization': 0.2,
+            'load.density': 0.4,
+            'load.free': -0.2,
+            'load.cores.0': 0.4,
+            f'load.devices./dev/test{DOT}1': 1,
+            'version': 1
+        })
+        self.assertEqual(pull_task(task, node)['$inc']['load.tasks'], -1)
+
+        task.core = 1
+        self.assertEqual(repin_task(task, 0, node), {
+            '$set': {'tasks.$.core': 1},
+            '$inc': {'load.cores.0': -0.4, 'load.cores.1': 0.4, 'version': 1}
+        })
+
+    def test_check_load(self):
+        task = make_tasks([(5, 10, 10)], DEVICES)[0]
+
+        node = make_node(1)
+        node.load = summarize(make_tasks([(4, 10, 10)], DEVICES), node)
+        self.assertEqual(check_load(task, node).test, 'density')
+
+        node.load = summarize(make_tasks([(6, 10, 10)], DEVICES), node)
+        self.assertFalse(check_load(task, node))
+
+        # Undecided by the summary
+        node.load = summarize(make_tasks([(5, 10, 10)], DEVICES), node)
+        self.assertIsNone(check_load(task, node))
+
+        node = make_node(2, PARTITIONED)
+        tasks = make_tasks([(6, 10, 10)], DEVICES)
+        tasks[0].core = 0
+        node.load = summarize(tasks, node)
+        self.assertTrue(check_load(task, node))
+        self.assertEqual(task.core, 1)
@@ -7,10 +7,15 @@ from unittest import mock
 from typing import List
 
 from bson.objectid import ObjectId
+from marshmallow import ValidationError
 from mongomock.gridfs import enable_gridfs_integration
 
-from shipyard.errors import NotFound, NotFeasible, MissingDevices, AlreadyPresent
-from shipyard.node.model import Node
+from shipyard.cache.documents import node_cache, task_cache
+from shipyard.crane.feasibility import Verdict
+from shipyard.errors import (AlreadyPresent, Conflict, MissingDevices,
+                             NotFeasible, NotFound)
+from shipyard.node.load import push_task, summarize
+from shipyard.node.model import PARTITIONED, Load, Node
 from shipyard.node.service import NodeService
 from shipyard.task.model import Task
 
@@ -69,17 +74,20 @@ test_tasks = Task.Schema().load([
 ], many=True)
 
 
-def mock_check_feasibility(tasks: List[Task], cpu_cores: int) -> bool:
-    if tasks[-1].name == 'Test1':
-        return True
-    return False
+def mock_check_placement(tasks: List[Task], node: Node) -> Verdict:
+    return Verdict(tasks[-1].name == 'Test1', 'test')
 
 
 def mock_set_up_node(address: str, ssh_user: str, ssh_pass: str):
     return
 
 
-def mock_deploy_task(task_file, task: Task, node: Node):
+def mock_deploy_task(task_file, task: Task, node: Node, progress=None):
+    if progress is not None:
+        progress('run')
+
+
+def mock_pin_task(task_name: str, node: Node, core: int):
     return
 
 
@@ -87,18 +95,32 @@ def mock_remove_task(task_name: str, node: Node):
     return
 
 
+def mock_remove_tasks(task_names: List[str], node: Node) -> List[dict]:
+    return [{'task': name, 'status': 'succeeded'} for name in task_names]
+
+
 @mock.patch('shipyard.node.service.db', mockdb)
+@mock.patch('shipyard.leases.db', mockdb)
 @mock.patch('shipyard.node.service.fs', mockfs)
-@mock.patch('shipyard.node.service.check_feasibility', mock_check_feasibility)
+@mock.patch('shipyard.node.service.check_placement', mock_check_placement)
+@mock.patch('shipyard.node.service.pin_task', mock_pin_task)
 @mock.patch('shipyard.node.service.set_up_node', mock_set_up_node)
 @mock.patch('shipyard.node.service.deploy_task', mock_deploy_task)
 @mock.patch('shipyard.node.service.remove_task', mock_remove_task)
+@mock.patch('shipyard.node.service.remove_tasks', mock_remove_tasks)
 class TestService(unittest.TestCase):
 
     def setUp(self):
-        inserted_ids = mockdb.nodes.insert_many(
-            Node.Schema(exclude=['_id']).dump(test_nodes, many=True)
-        ).inserted_ids
+        node_cache.clear()
+        task_cache.clear()
+
+        inserted_ids = mockdb.nodes.insert_many([
+            {
+                **Node.Schema(exclude=['_id']).dump(node),
+                'load': Load.Schema().dump(summarize(node.tasks, node))
+            }
+            for node in test_nodes
+        ]).inserted_ids
 
         for i in range(len(test_nodes)):
             test_nodes[i]._id = inserted_ids[i]
@@ -115,9 +137,14 @@ class TestService(unittest.TestCase):
             test_tasks[i]._id = inserted_ids[i]
 
         test_nodes[1].tasks.append(test_tasks[0])
+        mockdb.nodes.update_one(
+            {'_id': test_nodes[1]._id},
+            push_task(test_tasks[0], test_nodes[1])
+        )
 
     def tearDown(self):
         mockdb.nodes.delete_many({})
+        test_nodes[1].tasks.clear()
 
         for task in test_tasks:
             mockfs.delete(task.file_id)
@@ -127,6 +154,43 @@ class TestService(unittest.TestCase):
         results = NodeService.get_all()
         self.assertEqual(len(results), len(test_nodes))
 
+
+    def test_get_page(self):
+        results, cursor = NodeService.get_page(['name', 'load'], limit=1)
+        self.assertEqual(len(results), 1)
+        self.assertEqual(cursor, str(test_nodes[0]._id))
+        self.assertNotIn('tasks', results[0])
+
+        results, cursor = NodeService.get_page(['name'], limit=1, after=cursor)
+        self.assertEqual(results[0]['name'], test_nodes[1].name)
+        self.assertIsNone(cursor)
+
+        results, _ = NodeService.get_page(['name'], device='/dev/test2')
+        self.assertEqual([r['name'] for r in results], [test_nodes[0].name])
+
+        # The second node's only core is in use
+        results, _ = NodeService.get_page(['name'], min_free=0.5)
+        self.assertEqual([r['name'] for r in results], [test_nodes[0].name])
+
+        with self.assertRaises(ValidationError):
+            NodeService.get_page(['name'], limit=0)
+
+    def test_iterate(self):
+        results = list(NodeService.iterate(['name'], after=str(test_nodes[0]._id)))
+        self.assertEqual([r['name'] for r in results], [test_nodes[1].name])
+
+        with self.assertRaises(ValidationError):
+            NodeService.iterate(['name'], limit=0)
+
+    def test_summarize(self):
+        mockdb.nodes.update_many({}, {'$unset': {'load': ''}})
+        NodeService.summarize()
+
+        node = NodeService.get_by_id(test_nodes[1]._id)
+        self.assertEqual(node.load.tasks, 1)
+        self.assertEqual(node.load.utilization, 1)
+        self.assertEqual(node.load.devices, {'/dev/test1': 1})
+
     def test_get_by_id(self):
         result = NodeService.get_by_id(test_nodes[0]._id)
         self.assertEqual(result.name, test_nodes[0].name)
@@ -145,6 +209,32 @@ class TestService(unittest.TestCase):
         with self.assertRaises(NotFound):
             result = NodeService.get_by_name('error')
 
+    def test_get_cached(self):
+        NodeService.get_by_id(test_nodes[0]._id)
+        with mock.patch('shipyard.node.service.db') as db:
+            result = NodeService.get_by_name(test_nodes[0].name)
+            db.nodes.find_one.assert_not_called()
+        self.assertEqual(result._id, test_nodes[0]._id)
+
+        # Writes invalidate the cached node
+        NodeService.update(test_nodes[0]._id, {'name': 'Updated'})
+        self.assertEqual(NodeService.get_by_id(test_nodes[0]._id).name,
+                         'Updated')
+        with self.assertRaises(NotFound):
+            NodeService.get_by_name(test_nodes[0].name)
+
+        NodeService.add_task(test_nodes[0]._id, test_tasks[0]._id)
+        self.assertEqual(
+            len(NodeService.get_by_id(test_nodes[0]._id).tasks), 1)
+
+    def test_get_version(self):
+        version = NodeService.get_version()
+        NodeService.update(test_nodes[0]._id, {'name': 'Updated'})
+        self.assertEqual(NodeService.get_version(), version + 1)
+
+        NodeService.add_task(test_nodes[0]._id, test_tasks[0]._id)
+        self.assertGreater(NodeService.get_version(), version + 1)
+
     def test_create(self):
         new_node = Node.Schema().load({
             'name': 'Test3',
@@ -165,31 +255,108 @@ class TestService(unittest.TestCase):
         self.assertEqual(mockdb.nodes.count_documents({}), len(test_nodes)+1)
 
     def test_update(self):
-        result = NodeService.update(test_nodes[0]._id, {'name': 'Updated'})
+        result, removals = NodeService.update(
+            test_nodes[0]._id, {'name': 'Updated'})
         self.assertNotEqual(result.name, test_nodes[0].name)
         self.assertEqual(result.name, 'Updated')
         self.assertEqual(result.ip, test_nodes[0].ip)
         self.assertEqual(result.ssh_user, test_nodes[0].ssh_user)
         self.assertEqual(result.devices, test_nodes[0].devices)
+        self.assertEqual(removals, [])
+
+        result, _ = NodeService.update(test_nodes[0]._id, {'cpu_cores': 8})
+        self.assertEqual(result.load.free, 8)
+
+        result, removals = NodeService.update(
+            test_nodes[1]._id, {'cpu_freq': 500})
+        self.assertEqual(result.cpu_freq, 500)
+        self.assertEqual(len(result.tasks), 1)
+        self.assertEqual(result.tasks[0].scaled_runtime, 1000)
+        self.assertEqual(removals, [])
+
+        result, removals = NodeService.update(
+            test_nodes[1]._id, {'ip': '3.3.3.3'})
+        self.assertEqual(result.ip, '3.3.3.3')
+        self.assertEqual(result.tasks, [])
+        self.assertEqual(len(removals), 1)
+        self.assertEqual(removals[0]['task'], test_tasks[0].name)
 
         with self.assertRaises(NotFound):
             NodeService.update(str(ObjectId()), {})
 
+        mockdb.nodes.create_index('name', unique=True)
+        with self.assertRaises(AlreadyPresent):
+            NodeService.update(test_nodes[0]._id, {'name': 'Test2'})
+        mockdb.nodes.drop_indexes()
+
+    def test_update_concurrent(self):
+        task = Task.Schema().load({
+            '_id': str(ObjectId()),
+            'name': 'Reserved',
+            'runtime': 100,
+            'deadline': 1000,
+            'period': 1000
+        })
+        names = []
+
+        # A task is reserved while the node's tasks are being removed
+        def reserve_removing(task_names: List[str], node: Node):
+            if not names:
+                mockdb.nodes.update_one({'_id': node._id}, {
+                    **push_task(task, node),
+                    '$push': {'tasks': Task.Schema().dump(task),
+                              'reserved': task._id}
+                })
+            names.extend(task_names)
+            return mock_remove_tasks(task_names, node)
+
+        with mock.patch('shipyard.node.service.remove_tasks',
+                        reserve_removing):
+            result, removals = NodeService.update(
+                test_nodes[1]._id, {'ip': '3.3.3.3'})
+        self.assertEqual(result.tasks, [])
+        self.assertEqual(names, [test_tasks[0].name, 'Reserved'])
+        self.assertEqual(len(removals), 2)
+
+        # The frequency isn't applied to a taskset that changed meanwhile
+        changes = NodeService._changes
+
+        def change(node: Node, new_values: dict, reset: bool):
+            mockdb.nodes.update_one({'_id': node._id},
+                                    {'$inc': {'version': 1}})
+            return changes(node, new_values, reset)
+
+        with mock.patch.object(NodeService, '_changes', change):
+            with mock.patch('shipyard.node.service.ADMISSION_RETRIES', 1):
+                with self.assertRaises(Conflict):
+                    NodeService.update(test_nodes[0]._id, {'cpu_freq': 500})
+        self.assertIsNone(mockdb.nodes.find_one(
+            {'_id': test_nodes[0]._id}).get('cpu_freq'))
+
     def test_delete(self):
-        result = NodeService.delete(test_nodes[0]._id)
+        result, removals = NodeService.delete(test_nodes[0]._id)
         self.assertEqual(result.name, test_nodes[0].name)
         self.assertEqual(result.ip, test_nodes[0].ip)
         self.assertEqual(result.ssh_user, test_nodes[0].ssh_user)
+        self.assertEqual(removals, [])
         self.assertEqual(mockdb.nodes.count_documents({}), len(test_nodes)-1)
 
+        result, removals = NodeService.delete(test_nodes[1]._id)
+        self.assertEqual(len(removals), 1)
+        self.assertEqual(removals[0]['status'], 'succeeded')
+
         with self.assertRaises(NotFound):
             result = NodeService.delete(str(ObjectId()))
-        self.assertEqual(mockdb.nodes.count_documents({}), len(test_nodes)-1)
+        self.assertEqual(mockdb.nodes.count_documents({}), len(test_nodes)-2)
 
     def test_add_task(self):
         try:
-            result = NodeService.add_task(test_nodes[0]._id, test_tasks[0]._id)
+            result, verdict = NodeService.add_task(
+                test_nodes[0]._id, test_tasks[0]._id)
             self.assertEqual(len(result.tasks), len(test_nodes[0].tasks)+1)
+            self.assertEqual(verdict.test, 'test')
+            self.assertEqual(result.load.tasks, 1)
+            self.assertEqual(result.load.density, 1)
         except:
             self.fail()
 
@@ -205,11 +372,126 @@ class TestService(unittest.TestCase):
         with self.assertRaises(NotFeasible):
             NodeService.add_task(test_nodes[0]._id, test_tasks[2]._id)
 
+        # The node's summary rejects it without checking its tasks
+        mockdb.nodes.update_one({'_id': test_nodes[0]._id},
+                                {'$set': {'load.utilization': 4}})
+        node_cache.invalidate(test_nodes[0]._id)
+        with self.assertRaises(NotFeasible) as error:
+            NodeService.add_task(test_nodes[0]._id, test_tasks[0]._id)
+        self.assertIn('utilization', str(error.exception))
+
+    def test_admit_scaled(self):
+        # Runtimes scaled for other nodes stored with the task are ignored
+        mockdb.tasks.update_one({'_id': test_tasks[2]._id},
+                                {'$set': {'scaled_runtime': 1, 'core': 0}})
+        mockdb.nodes.update_one({'_id': test_nodes[1]._id}, {'$set': {
+            'devices': ['/dev/test1'],
+            'load.utilization': 0.5,
+            'load.density': 0.5
+        }})
+        with self.assertRaises(NotFeasible) as error:
+            NodeService.admit(test_nodes[1]._id, test_tasks[2]._id)
+        self.assertIn('utilization', str(error.exception))
+
+    def test_deploy_repin(self):
+        node = NodeService.get_by_id(test_nodes[1]._id)
+        node.scheduling = PARTITIONED
+        node.tasks[0].core = 1
+
+        with mock.patch('shipyard.node.service.pin_task') as pin_task:
+            result = NodeService.deploy(node, test_tasks[2])
+            pin_task.assert_called_once_with(test_tasks[0].name, node, 1)
+        self.assertEqual(result.tasks[0].core, 1)
+
+        # The task is moved in the same write that reserves the new one
+        self.assertEqual(node.version, 2)
+        self.assertEqual(result.version, 2)
+
+    def test_deploy_repin_error(self):
+        node = NodeService.get_by_id(test_nodes[1]._id)
+        node.scheduling = PARTITIONED
+        node.tasks[0].core = 1
+
+        with mock.patch('shipyard.node.service.pin_task') as pin_task:
+            pin_task.side_effect = RuntimeError('Test')
+            with self.assertRaises(RuntimeError):
+                NodeService.deploy(node, test_tasks[2])
+
+        result = NodeService.get_by_id(test_nodes[1]._id)
+        self.assertEqual([task.name for task in result.tasks],
+                         [test_tasks[0].name])
+        self.assertIsNone(result.tasks[0].core)
+        self.assertEqual(result.load.cores.get('1', 0), 0)
+        self.assertEqual(result.reserved, [])
+
+    def test_deploy_reservation(self):
+        node = NodeService.get_by_id(test_nodes[0]._id)
+
+        # The node changes after the task is admitted
+        NodeService.update(test_nodes[0]._id, {'name': 'Updated'})
+        with mock.patch('shipyard.node.service.ADMISSION_RETRIES', 0):
+            with self.assertRaises(Conflict):
+                NodeService.deploy(node, test_tasks[0])
+
+        result = NodeService.deploy(node, test_tasks[0])
+        self.assertEqual(len(result.tasks), 1)
+        self.assertEqual(result.reserved, [])
+        self.assertEqual(result.version, 2)
+
+        with self.assertRaises(AlreadyPresent):
+            NodeService.deploy(result, test_tasks[0])
+
+    def test_deploy_release(self):
+        node = NodeService.get_by_id(test_nodes[0]._id)
+
+        with mock.patch('shipyard.node.service.deploy_task') as deploy_task:
+            deploy_task.side_effect = RuntimeError('Test')
+            with self.assertRaises(RuntimeError):
+                NodeService.deploy(node, test_tasks[0])
+
+        result = NodeService.get_by_id(test_nodes[0]._id)
+        self.assertEqual(result.tasks, [])
+        self.assertEqual(result.reserved, [])
+        self.assertEqual(result.load.tasks, 0)
+
+    def test_recover(self):
+        node = NodeService.get_by_id(test_nodes[0]._id)
+        for task in test_tasks:
+            NodeService._reserve(node, task)
+
+        # The first reservation belongs to a stopped process and the second one
+        # to a running one
+        mockdb.nodes.update_one({'_id': node._id}, {'$set': {
+            f'reserved_by.{test_tasks[0]._id}': 'stopped',
+            f'reserved_by.{test_tasks[1]._id}': 'running'
+        }})
+        mockdb.workers.insert_many([{'_id': 'stopped', 'expires': 0},
+                                    {'_id': 'running', 'expires': 1e12}])
+
+        # The reservation of an unfinished job is kept
+        mockdb.jobs.insert_one({'node_id': node._id,
+                                'task_id': test_tasks[2]._id,
+                                'status': 'queued'})
+        self.assertEqual(NodeService.recover(), 1)
+        mockdb.jobs.delete_many({})
+
+        result = NodeService.get_by_id(test_nodes[0]._id)
+        self.assertEqual([task.name for task in result.tasks],
+                         [test_tasks[1].name, test_tasks[2].name])
+        self.assertEqual(result.reserved, [test_tasks[1]._id, test_tasks[2]._id])
+        self.assertEqual(result.load.tasks, 2)
+
+        # Reservations of this process are kept too
+        self.assertEqual(NodeService.recover(), 0)
+        mockdb.workers.delete_many({})
+
     def test_remove_task(self):
         try:
             result = NodeService.remove_task(
                 test_nodes[1]._id, test_tasks[0]._id)
             self.assertEqual(len(result.tasks), len(test_nodes[1].tasks)-1)
+            self.assertEqual(result.load.tasks, 0)
+            self.assertEqual(result.load.devices, {'/dev/test1': 0})
         except:
             self.fail()
 
@@ -218,3 +500,28 @@ class TestService(unittest.TestCase):
 
         with self.assertRaises(NotFound):
             NodeService.remove_task(test_nodes[1]._id, str(ObjectId()))
+
+    def test_rebalance(self):
+        result = NodeService.rebalance(str(test_tasks[2]._id))
+        self.assertEqual(result, {'moves': [], 'host': 'Test1'})
+
+        result = NodeService.rebalance()
+        self.assertEqual(result['freed'], ['Test2'])
+        self.assertEqual(result['moves'], [
+            {'task': 'Test1', 'from': 'Test2', 'to': 'Test1', 'core': None}
+        ])
+        self.assertEqual(mockdb.nodes.count_documents(
+            {'name': 'Test2', 'tasks._id': test_tasks[0]._id}), 1)
+
+        result = NodeService.rebalance(execute=True)
+        self.assertEqual(result['moves'][0]['status'], 'succeeded')
+        self.assertEqual(mockdb.nodes.count_documents(
+            {'name': 'Test1', 'tasks._id': test_tasks[0]._id}), 1)
+        self.assertEqual(mockdb.nodes.count_documents(
+            {'name': 'Test2', 'tasks._id': test_tasks[0]._id}), 0)
+
+        with self.assertRaises(NotFound):
+            NodeService.rebalance(str(ObjectId()))
+
+        with self.assertRaises(ValidationError):
+            NodeService.rebalance(budget=-1)
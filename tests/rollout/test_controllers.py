@@ -0,0 +1,75 @@
+import unittest
+
+import hug
+
+from typing import List
+from unittest import mock
+
+from bson.objectid import ObjectId
+
+from shipyard.errors import NotFound
+from shipyard.rollout import controllers
+from shipyard.rollout.model import Rollout
+
+
+test_rollouts = Rollout.Schema().load([
+    {
+        '_id': str(ObjectId()),
+        'task_id': str(ObjectId()),
+        'task_name': 'Test1',
+        'wave_size': 1,
+        'max_unavailable': 1,
+        'status': 'running',
+        'targets': [
+            {'node_id': str(ObjectId()), 'status': 'updated'},
+            {'node_id': str(ObjectId()), 'status': 'pending'}
+        ]
+    }
+], many=True)
+
+
+class MockService():
+
+    @staticmethod
+    def get_all(task_id: str = None) -> List[Rollout]:
+        if task_id is not None:
+            ObjectId(task_id)
+        return test_rollouts
+
+    @staticmethod
+    def get_by_id(rollout_id: str) -> Rollout:
+        for rollout in test_rollouts:
+            if ObjectId(rollout_id) == rollout._id:
+                return rollout
+
+        raise NotFound
+
+
+@mock.patch('shipyard.rollout.controllers.RolloutService', MockService)
+class TestControllers(unittest.TestCase):
+
+    def test_get_rollout_list(self):
+        response = hug.test.call('GET', controllers, '')
+        self.assertEqual(response.status, hug.HTTP_OK)
+        self.assertEqual(len(response.data), 1)
+        self.assertNotIn('targets', response.data[0])
+
+        response = hug.test.call('GET', controllers, '', params={
+            'task_id': 'error'
+        })
+        self.assertEqual(response.status, hug.HTTP_BAD_REQUEST)
+        self.assertIsInstance(response.data['error'], str)
+
+    def test_get_rollout(self):
+        response = hug.test.call(
+            'GET', controllers, f'{test_rollouts[0]._id}')
+        self.assertEqual(response.status, hug.HTTP_OK)
+        self.assertEqual(len(response.data['targets']), 2)
+
+        response = hug.test.call('GET', controllers, f'{ObjectId()}')
+        self.assertEqual(response.status, hug.HTTP_NOT_FOUND)
+        self.assertIsInstance(response.data['error'], str)
+
+        response = hug.test.call('GET', controllers, 'error')
+        self.assertEqual(response.status, hug.HTTP_BAD_REQUEST)
+        self.assertIsInstance(response.data['error'], str)
@@ -0,0 +1,296 @@
+import threading
+import time
+import unittest
+
+import mongomock
+import gridfs
+
+from unittest import mock
+from typing import List
+
+from bson.objectid import ObjectId
+from marshmallow import ValidationError
+from mongomock.gridfs import enable_gridfs_integration
+
+from shipyard.crane.feasibility import Verdict
+from shipyard.errors import NotFound
+from shipyard.leases import WORKER
+from shipyard.node.model import Node
+from shipyard.rollout.service import RolloutService
+from shipyard.task.model import Task
+
+
+enable_gridfs_integration()
+mockdb = mongomock.MongoClient().shipyard
+mockfs = gridfs.GridFS(mockdb)
+test_task = Task.Schema().load({
+    'name': 'Test1',
+    'runtime': 1000,
+    'deadline': 1000,
+    'period': 1000
+})
+
+
+def mock_check_placement(tasks: List[Task], node: Node) -> Verdict:
+    return Verdict(True, 'test')
+
+
+def mock_build_image(task_file, task: Task, node: Node):
+    return
+
+
+def mock_swap_task(task: Task, node: Node):
+    if node.name == 'Failed':
+        raise RuntimeError('Test')
+
+
+def mock_pin_task(task_name: str, node: Node, core: int):
+    return
+
+
+def mock_distribute_image(task_file, task: Task, nodes: List[Node], builders: List[Node]) -> List[dict]:
+    return [{'node': str(node._id), 'status': 'succeeded'} for node in nodes]
+
+
+@mock.patch('shipyard.rollout.service.db', mockdb)
+@mock.patch('shipyard.leases.db', mockdb)
+@mock.patch('shipyard.rollout.service.fs', mockfs)
+@mock.patch('shipyard.rollout.service.check_placement', mock_check_placement)
+@mock.patch('shipyard.rollout.service.pin_task', mock_pin_task)
+@mock.patch('shipyard.rollout.service.build_image', mock_build_image)
+@mock.patch('shipyard.rollout.service.swap_task', mock_swap_task)
+@mock.patch('shipyard.rollout.service.drop_cached_image', mock.Mock())
+@mock.patch('shipyard.rollout.service.distribute_image', mock_distribute_image)
+@mock.patch('shipyard.rollout.service.RolloutService._start', mock.Mock())
+class TestService(unittest.TestCase):
+
+    def setUp(self):
+        with mockfs.new_file() as file:
+            test_task.file_id = file._id
+        test_task._id = mockdb.tasks.insert_one(
+            Task.Schema(exclude=['_id']).dump(test_task)).inserted_id
+
+    def tearDown(self):
+        mockfs.delete(test_task.file_id)
+        mockdb.tasks.delete_many({})
+        mockdb.nodes.delete_many({})
+        mockdb.rollouts.delete_many({})
+
+    def insert_nodes(self, names: List[str]):
+        embedded_task = {
+            **Task.Schema().dump(test_task),
+            '_id': test_task._id,
+            'file_id': test_task.file_id,
+            'runtime': 500
+        }
+        mockdb.nodes.insert_many([
+            {
+                'name': name,
+                'ip': '1.1.1.1',
+                'cpu_cores': 1,
+                'tasks': [embedded_task],
+                'version': 0
+            }
+            for name in names
+        ])
+
+    def test_create(self):
+        self.insert_nodes(['Test1', 'Test2'])
+
+        rollout_id = RolloutService.create(test_task._id, 'Test1', 1, 1)
+        result = RolloutService.get_by_id(rollout_id)
+        self.assertEqual(result.status, 'running')
+        self.assertEqual(len(result.targets), 2)
+        self.assertTrue(all(t.status == 'pending' for t in result.targets))
+        self.assertEqual(len(RolloutService.get_all(str(test_task._id))), 1)
+
+        with self.assertRaises(ValidationError):
+            RolloutService.create(test_task._id, 'Test1', 0, 1)
+
+        with self.assertRaises(NotFound):
+            RolloutService.get_by_id(str(ObjectId()))
+
+    def test_run(self):
+        self.insert_nodes(['Test1', 'Test2', 'Test3'])
+
+        rollout_id = RolloutService.create(test_task._id, 'Test1', 2, 1)
+        RolloutService.run(ObjectId(rollout_id))
+
+        result = RolloutService.get_by_id(rollout_id)
+        self.assertEqual(result.status, 'completed')
+        self.assertTrue(all(t.status == 'updated' for t in result.targets))
+        self.assertEqual(mockdb.nodes.count_documents(
+            {'tasks.runtime': test_task.runtime}), 3)
+
+    def test_run_halt(self):
+        self.insert_nodes(['Failed', 'Test2'])
+
+        rollout_id = RolloutService.create(test_task._id, 'Test1', 1, 1)
+        RolloutService.run(ObjectId(rollout_id))
+
+        result = RolloutService.get_by_id(rollout_id)
+        self.assertEqual(result.status, 'halted')
+        self.assertEqual(result.targets[0].status, 'failed')
+        self.assertEqual(result.targets[0].error, 'Test')
+        self.assertEqual(result.targets[1].status, 'pending')
+
+        # Nodes that fail keep the previous version
+        self.assertEqual(mockdb.nodes.count_documents(
+            {'name': 'Failed', 'tasks.runtime': 500}), 1)
+        self.assertEqual(mockdb.nodes.count_documents(
+            {'name': 'Test2', 'tasks.runtime': 500}), 1)
+
+    def test_run_waves(self):
+        # Nodes of the same wave are all updated before halting
+        self.insert_nodes(['Failed', 'Test2', 'Test3', 'Test4'])
+        rollout_id = RolloutService.create(test_task._id, 'Test1', 4, 1)
+        RolloutService.run(ObjectId(rollout_id))
+
+        result = RolloutService.get_by_id(rollout_id)
+        self.assertEqual(result.status, 'halted')
+        self.assertEqual([t.status for t in result.targets],
+                         ['failed', 'updated', 'updated', 'updated'])
+
+        # while smaller waves halt earlier
+        mockdb.nodes.delete_many({})
+        self.insert_nodes(['Failed', 'Test2', 'Test3', 'Test4'])
+        rollout_id = RolloutService.create(test_task._id, 'Test1', 2, 1)
+        RolloutService.run(ObjectId(rollout_id))
+
+        result = RolloutService.get_by_id(rollout_id)
+        self.assertEqual([t.status for t in result.targets],
+                         ['failed', 'updated', 'pending', 'pending'])
+
+    def test_run_unavailable(self):
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def swap_task(task: Task, node: Node):
+            with lock:
+                running.append(node.name)
+                peak.append(len(running))
+            time.sleep(0.02)
+            with lock:
+                running.remove(node.name)
+
+        self.insert_nodes([f'Test{i}' for i in range(5)])
+        rollout_id = RolloutService.create(test_task._id, 'Test1', 5, 2)
+        with mock.patch('shipyard.rollout.service.swap_task', swap_task):
+            RolloutService.run(ObjectId(rollout_id))
+
+        result = RolloutService.get_by_id(rollout_id)
+        self.assertEqual(result.status, 'completed')
+        self.assertEqual(max(peak), 2)
+
+    def test_run_concurrent(self):
+        self.insert_nodes(['Test1'])
+
+        # The node changes while the image is being built
+        def build_image(task_file, task: Task, node: Node):
+            mockdb.nodes.update_one({'_id': node._id},
+                                    {'$inc': {'version': 1}})
+
+        rollout_id = RolloutService.create(test_task._id, 'Test1', 1, 1)
+        with mock.patch('shipyard.rollout.service.build_image', build_image):
+            RolloutService.run(ObjectId(rollout_id))
+
+        self.assertEqual(RolloutService.get_by_id(rollout_id).status,
+                         'completed')
+        node = mockdb.nodes.find_one({'name': 'Test1'})
+        self.assertEqual(node['tasks'][0]['runtime'], test_task.runtime)
+        self.assertEqual(node['version'], 2)
+
+    def test_run_restore(self):
+        self.insert_nodes(['Failed'])
+        other = {**Task.Schema().dump(test_task), '_id': ObjectId(),
+                 'name': 'Other', 'core': 0}
+        mockdb.nodes.update_one({}, {'$push': {'tasks': other}})
+
+        # The other task is moved to make room for the new version
+        def check_placement(tasks: List[Task], node: Node) -> Verdict:
+            tasks[0].core = 1
+            return Verdict(True, 'test')
+
+        pins = []
+        rollout_id = RolloutService.create(test_task._id, 'Test1', 1, 1)
+        with mock.patch('shipyard.rollout.service.check_placement',
+                        check_placement), \
+                mock.patch('shipyard.rollout.service.pin_task',
+                           lambda name, node, core: pins.append(core)):
+            RolloutService.run(ObjectId(rollout_id))
+
+        self.assertEqual(RolloutService.get_by_id(rollout_id).status,
+                         'halted')
+        node = mockdb.nodes.find_one({'name': 'Failed'})
+        self.assertEqual([t['runtime'] for t in node['tasks']],
+                         [500, test_task.runtime])
+        self.assertEqual(node['tasks'][1]['core'], 0)
+        self.assertEqual(pins, [1, 0])
+
+    def test_run_distribute(self):
+        self.insert_nodes(['Test1', 'Test2'])
+
+        rollout_id = RolloutService.create(
+            test_task._id, 'Test1', 1, 1, distribute=True)
+        RolloutService.run(ObjectId(rollout_id))
+
+        result = RolloutService.get_by_id(rollout_id)
+        self.assertEqual(result.status, 'completed')
+        self.assertEqual(len(result.distribution), 2)
+        self.assertTrue(
+            all(t.status == 'succeeded' for t in result.distribution))
+
+    def test_run_error(self):
+        self.insert_nodes(['Test1'])
+
+        # The task is deleted before the rollout runs
+        rollout_id = RolloutService.create(test_task._id, 'Test1', 1, 1)
+        mockdb.tasks.delete_many({})
+        RolloutService.run(ObjectId(rollout_id))
+
+        result = RolloutService.get_by_id(rollout_id)
+        self.assertEqual(result.status, 'halted')
+        self.assertIsInstance(result.error, str)
+        self.assertIsNotNone(result.finished)
+
+    def test_run_missing_devices(self):
+        self.insert_nodes(['Test1'])
+        mockdb.tasks.update_one({'_id': test_task._id},
+                                {'$set': {'devices': ['/dev/test1']}})
+
+        rollout_id = RolloutService.create(test_task._id, 'Test1', 1, 1)
+        RolloutService.run(ObjectId(rollout_id))
+
+        result = RolloutService.get_by_id(rollout_id)
+        self.assertEqual(result.status, 'halted')
+        self.assertEqual(result.targets[0].status, 'failed')
+        self.assertIn('devices', result.targets[0].error)
+
+    def test_resume(self):
+        self.insert_nodes(['Test1', 'Test2'])
+
+        rollout_id = RolloutService.create(test_task._id, 'Test1', 1, 1)
+        node = mockdb.nodes.find_one({'name': 'Test1'})
+        mockdb.rollouts.update_one(
+            {'_id': ObjectId(rollout_id), 'targets.node_id': node['_id']},
+            {'$set': {'targets.$.status': 'updating', 'worker': 'running'}}
+        )
+        mockdb.workers.insert_one({'_id': 'running', 'expires': 1e12})
+
+        with mock.patch('shipyard.rollout.service.RolloutService._start') \
+                as start:
+            # Another process is still running the rollout
+            self.assertEqual(RolloutService.resume(), 0)
+
+            # Until it stops
+            mockdb.workers.delete_many({})
+            self.assertEqual(RolloutService.resume(), 1)
+            start.assert_called_once_with(ObjectId(rollout_id))
+        self.assertEqual(RolloutService.get_by_id(rollout_id).worker, WORKER)
+
+        # The interrupted node is updated again
+        RolloutService.run(ObjectId(rollout_id))
+        result = RolloutService.get_by_id(rollout_id)
+        self.assertEqual(result.status, 'completed')
+        self.assertTrue(all(t.status == 'updated' for t in result.targets))
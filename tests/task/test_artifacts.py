@@ -0,0 +1,45 @@
+import unittest
+
+import gridfs
+import mongomock
+
+from datetime import datetime, timedelta
+from io import BytesIO
+from unittest import mock
+
+from mongomock.gridfs import enable_gridfs_integration
+
+from shipyard.task import artifacts
+
+
+enable_gridfs_integration()
+mockdb = mongomock.MongoClient().shipyard
+mockfs = gridfs.GridFS(mockdb)
+
+
+@mock.patch('shipyard.task.artifacts.db', mockdb)
+@mock.patch('shipyard.task.artifacts.fs', mockfs)
+class TestArtifacts(unittest.TestCase):
+
+    def tearDown(self):
+        mockdb.fs.files.delete_many({})
+        mockdb.fs.chunks.delete_many({})
+        mockdb.tasks.delete_many({})
+        mockdb.uploads.delete_many({})
+
+    def test_sweep(self):
+        shared_id, _ = artifacts.put(BytesIO(b'shared'), 'shared.tar.gz')
+        legacy_id = mockfs.put(b'legacy')
+        mockdb.tasks.insert_one({'file_id': str(legacy_id)})
+        session_id = mockfs.put(b'session')
+        mockdb.uploads.insert_one({'file_id': session_id})
+        orphan_id = mockfs.put(b'orphan')
+
+        # Recent files may still be in use by a request
+        self.assertEqual(artifacts.sweep(), 0)
+
+        later = datetime.utcnow() + timedelta(seconds=artifacts.ORPHAN_AGE + 1)
+        self.assertEqual(artifacts.sweep(later), 1)
+        self.assertFalse(mockfs.exists(orphan_id))
+        for file_id in (shared_id, legacy_id, session_id):
+            self.assertTrue(mockfs.exists(file_id))
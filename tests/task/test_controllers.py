@@ -2,13 +2,16 @@ import unittest
 
 import hug
 
-from typing import List
+from typing import Iterable, List, Optional, Tuple
 from unittest import mock
 from io import BytesIO
 
 from bson.objectid import ObjectId
+from marshmallow import ValidationError
 
-from shipyard.errors import AlreadyPresent, NotFound
+from shipyard.crane.feasibility import Verdict
+from shipyard.errors import AlreadyPresent, NotFeasible, NotFound
+from shipyard.node.model import Node
 from shipyard.task import controllers
 from shipyard.task.model import Task
 
@@ -31,6 +34,23 @@ test_tasks = Task.Schema().load([
         'period': 1000
     }
 ], many=True)
+test_node = Node.Schema().load({
+    '_id': str(ObjectId()),
+    'name': 'Test1',
+    'ip': '1.1.1.1',
+    'cpu_cores': 4
+})
+test_upload_id = ObjectId()
+
+# The tasks as read from the database
+test_documents = [{**Task.Schema().dump(item), '_id': item._id}
+                  for item in test_tasks]
+
+
+def project(documents: List[dict], fields: List[str]) -> List[dict]:
+    keys = {field.split('.')[0] for field in fields}
+    return [{k: v for k, v in document.items() if k in keys}
+            for document in documents]
 
 
 class MockService():
@@ -39,6 +59,29 @@ class MockService():
     def get_all() -> List[Task]:
         return test_tasks
 
+    @staticmethod
+    def get_page(fields: List[str], limit: int = None, after: str = None,
+                 device: str = None) -> Tuple[List[dict], Optional[str]]:
+        if limit is not None and limit <= 0:
+            raise ValidationError('Test')
+        if after is not None:
+            ObjectId(after)
+        if limit is not None and limit < len(test_tasks):
+            return (project(test_documents[:limit], fields),
+                    str(test_tasks[limit - 1]._id))
+        return project(test_documents, fields), None
+
+    @staticmethod
+    def iterate(fields: List[str], limit: int = None, after: str = None,
+                device: str = None) -> Iterable[dict]:
+        if limit is not None and limit <= 0:
+            raise ValidationError('Test')
+        return iter(project(test_documents[:limit], fields))
+
+    @staticmethod
+    def get_version() -> int:
+        return 1
+
     @staticmethod
     def get_by_id(task_id: str) -> Task:
         for task in test_tasks:
@@ -56,26 +99,63 @@ class MockService():
         raise NotFound
 
     @staticmethod
-    def create(new_task: Task, file_name: str, file_body: BytesIO) -> str:
+    def create(new_task: Task, file_name: str, file_body: BytesIO, upload_id: str = None) -> str:
         for task in test_tasks:
             if new_task.name == task.name:
                 raise AlreadyPresent
 
+        if upload_id is not None and ObjectId(upload_id) != test_upload_id:
+            raise NotFound
+
         return str(ObjectId())
 
     @staticmethod
-    def update(task_id: str, new_values: dict, file_name: str, file_body: BytesIO) -> Task:
+    def update(task_id: str, new_values: dict, file_name: str, file_body: BytesIO, rolling: dict = None, upload_id: str = None) -> Tuple[Task, dict]:
         for task in test_tasks:
             if ObjectId(task_id) == task._id:
-                return task
+                if rolling is not None:
+                    return task, {'rollout': str(ObjectId())}
+                return task, {'removals': []}
 
         raise NotFound
 
     @staticmethod
-    def delete(task_id: str) -> Task:
+    def delete(task_id: str) -> Tuple[Task, List[dict]]:
         for task in test_tasks:
             if ObjectId(task_id) == task._id:
-                return task
+                return task, [{'node': str(ObjectId()), 'status': 'succeeded'}]
+
+        raise NotFound
+
+
+    @staticmethod
+    def place_batch(task_ids: List[str], budget: float = None, improve: bool = True) -> dict:
+        if budget is not None and budget < 0:
+            raise ValidationError('Test')
+
+        plan = []
+        for task_id in task_ids:
+            task = MockService.get_by_id(task_id)
+            if task.name == 'Test2':
+                raise NotFeasible
+            plan.append({'task': task.name, 'node': test_node.name, 'core': None})
+
+        return {
+            'plan': plan,
+            'deployments': [{'node': test_node.name, 'status': 'succeeded'}],
+            'solver_time': 0.1
+        }
+
+    @staticmethod
+    def place(task_id: str, scoring: str = None) -> Tuple[Node, Verdict]:
+        if scoring == 'Error':
+            raise ValidationError('Test')
+
+        for task in test_tasks:
+            if ObjectId(task_id) == task._id:
+                if task.name == 'Test2':
+                    raise NotFeasible
+                return test_node, Verdict(True, 'qpa')
 
         raise NotFound
 
@@ -89,6 +169,38 @@ class TestControllers(unittest.TestCase):
         self.assertIsNotNone(response.data)
         self.assertEqual(len(response.data), 2)
 
+        response = hug.test.call('GET', controllers, '', params={'limit': 1})
+        self.assertEqual(response.status, hug.HTTP_OK)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.headers_dict['X-Next-Cursor'],
+                         str(test_tasks[0]._id))
+
+        response = hug.test.call('GET', controllers, '', params={'limit': 0})
+        self.assertEqual(response.status, hug.HTTP_BAD_REQUEST)
+
+        response = hug.test.call('GET', controllers, '')
+        response = hug.test.call('GET', controllers, '', headers={
+            'If-None-Match': f'"other", {response.headers_dict["ETag"]}'
+        })
+        self.assertEqual(response.status, hug.HTTP_NOT_MODIFIED)
+
+        response = hug.test.call('GET', controllers, '', params={
+            'stream': True
+        })
+        self.assertEqual(response.status, hug.HTTP_OK)
+        self.assertEqual(len(response.data), 2)
+
+        response = hug.test.call('GET', controllers, '',
+                                 headers={'Accept': 'application/x-ndjson'})
+        self.assertEqual(response.status, hug.HTTP_OK)
+        self.assertEqual(response.content_type, 'application/x-ndjson')
+        self.assertEqual(len(response.data.splitlines()), 2)
+
+        response = hug.test.call('GET', controllers, '', params={
+            'after': 'Error'
+        })
+        self.assertEqual(response.status, hug.HTTP_BAD_REQUEST)
+
         response = hug.test.call('GET', controllers, '', params={
             'name': test_tasks[0].name
         })
@@ -107,6 +219,18 @@ class TestControllers(unittest.TestCase):
         self.assertEqual(response.status, hug.HTTP_OK)
         self.assertIsNotNone(response.data)
 
+        tag = response.headers_dict['ETag']
+        response = hug.test.call(
+            'GET', controllers, f'{str(test_tasks[0]._id)}',
+            headers={'If-None-Match': tag})
+        self.assertEqual(response.status, hug.HTTP_NOT_MODIFIED)
+
+        # Other tasks with the same version don't share the tag
+        response = hug.test.call(
+            'GET', controllers, f'{str(test_tasks[1]._id)}',
+            headers={'If-None-Match': tag})
+        self.assertEqual(response.status, hug.HTTP_OK)
+
         response = hug.test.call('GET', controllers, f'{ObjectId()}')
         self.assertEqual(response.status, hug.HTTP_NOT_FOUND)
         self.assertIsNotNone(response.data)
@@ -122,6 +246,7 @@ class TestControllers(unittest.TestCase):
             'DELETE', controllers, f'{str(test_tasks[0]._id)}')
         self.assertEqual(response.status, hug.HTTP_OK)
         self.assertIsNotNone(response.data)
+        self.assertEqual(len(response.data['removals']), 1)
 
         response = hug.test.call('DELETE', controllers, f'{ObjectId()}')
         self.assertEqual(response.status, hug.HTTP_NOT_FOUND)
@@ -132,3 +257,119 @@ class TestControllers(unittest.TestCase):
         self.assertEqual(response.status, hug.HTTP_BAD_REQUEST)
         self.assertIsNotNone(response.data)
         self.assertIsInstance(response.data['error'], str)
+
+    @mock.patch('shipyard.task.controllers.artifacts.discard')
+    def test_post_task_discard(self, discard):
+        # Files uploaded along with invalid specs aren't kept
+        upload = object()
+        response = mock.Mock()
+        controllers.post_task(
+            {'file': ('test.tar.gz', upload), 'specs': '{'}, response)
+        self.assertEqual(response.status, hug.HTTP_BAD_REQUEST)
+        discard.assert_called_once_with(upload)
+
+        discard.reset_mock()
+        controllers.put_task(str(ObjectId()), {
+            'file': ('test.tar.gz', upload),
+            'specs': '{"name": "Test1"}'
+        }, response)
+        self.assertEqual(response.status, hug.HTTP_NOT_FOUND)
+        discard.assert_called_once_with(upload)
+
+        # as well as files in fields that aren't used
+        discard.reset_mock()
+        controllers.post_task(
+            {'other': ('test.tar.gz', upload), 'specs': '{}'}, response)
+        self.assertEqual(response.status, hug.HTTP_INTERNAL_SERVER_ERROR)
+        discard.assert_called_once_with(upload)
+
+        discard.reset_mock()
+        controllers.post_task({
+            'file': ('test.tar.gz', upload),
+            'upload': 'error',
+            'specs': '{"name": "Test3", "runtime": 1, "deadline": 1, '
+                     '"period": 1}'
+        }, response)
+        self.assertEqual(response.status, hug.HTTP_BAD_REQUEST)
+        discard.assert_called_once_with(upload)
+
+    def test_post_task_upload(self):
+        specs = '{"name": "Test3", "runtime": 10, "deadline": 10, "period": 10}'
+        response = mock.Mock()
+        result = controllers.post_task({
+            'upload': str(test_upload_id),
+            'specs': specs
+        }, response)
+        self.assertIn('_id', result)
+
+        result = controllers.post_task({
+            'upload': str(ObjectId()),
+            'specs': specs
+        }, response)
+        self.assertEqual(response.status, hug.HTTP_NOT_FOUND)
+
+        result = controllers.post_task({
+            'upload': 'error',
+            'specs': specs
+        }, response)
+        self.assertEqual(response.status, hug.HTTP_BAD_REQUEST)
+
+    def test_post_task_placement(self):
+        response = hug.test.call(
+            'POST', controllers, f'{test_tasks[0]._id}/placements')
+        self.assertEqual(response.status, hug.HTTP_OK)
+        self.assertEqual(response.data['name'], test_node.name)
+        self.assertEqual(response.data['feasibility'], 'qpa')
+
+        response = hug.test.call(
+            'POST', controllers, f'{test_tasks[1]._id}/placements')
+        self.assertEqual(response.status, hug.HTTP_INTERNAL_SERVER_ERROR)
+        self.assertIsInstance(response.data['error'], str)
+
+        response = hug.test.call(
+            'POST', controllers, f'{test_tasks[0]._id}/placements', params={
+                'scoring': 'Error'
+            })
+        self.assertEqual(response.status, hug.HTTP_BAD_REQUEST)
+
+        response = hug.test.call(
+            'POST', controllers, f'{ObjectId()}/placements')
+        self.assertEqual(response.status, hug.HTTP_NOT_FOUND)
+        self.assertIsInstance(response.data['error'], str)
+
+        response = hug.test.call('POST', controllers, 'error/placements')
+        self.assertEqual(response.status, hug.HTTP_BAD_REQUEST)
+        self.assertIsInstance(response.data['error'], str)
+
+    def test_post_task_placements(self):
+        response = hug.test.call('POST', controllers, 'placements', body={
+            'tasks': [str(test_tasks[0]._id)]
+        })
+        self.assertEqual(response.status, hug.HTTP_OK)
+        self.assertEqual(len(response.data['plan']), 1)
+        self.assertEqual(response.data['solver_time'], 0.1)
+
+        response = hug.test.call('POST', controllers, 'placements', body={
+            'tasks': [str(test_tasks[0]._id), str(test_tasks[1]._id)]
+        })
+        self.assertEqual(response.status, hug.HTTP_INTERNAL_SERVER_ERROR)
+        self.assertIsInstance(response.data['error'], str)
+
+        response = hug.test.call('POST', controllers, 'placements', body={
+            'tasks': [str(ObjectId())]
+        })
+        self.assertEqual(response.status, hug.HTTP_NOT_FOUND)
+
+        response = hug.test.call('POST', controllers, 'placements', body={
+            'tasks': ['error']
+        })
+        self.assertEqual(response.status, hug.HTTP_BAD_REQUEST)
+
+        response = hug.test.call('POST', controllers, 'placements', body={
+            'tasks': [str(test_tasks[0]._id)]
+        }, params={'budget': '-1'})
+        self.assertEqual(response.status, hug.HTTP_BAD_REQUEST)
+
+        response = hug.test.call('POST', controllers, 'placements', body={})
+        self.assertEqual(response.status, hug.HTTP_BAD_REQUEST)
+        self.assertIsInstance(response.data['error'], str)
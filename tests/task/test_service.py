@@ -4,14 +4,23 @@ import mongomock
 import gridfs
 
 from unittest import mock
+from hashlib import sha256
 from io import BytesIO
+from typing import List
 
 from bson.objectid import ObjectId
+from marshmallow import ValidationError
 from mongomock.gridfs import enable_gridfs_integration
+from pymongo.errors import DuplicateKeyError
 
-from shipyard.errors import AlreadyPresent, NotFound
+from shipyard.cache.documents import node_cache, task_cache
+from shipyard.crane.feasibility import Verdict
+from shipyard.errors import AlreadyPresent, Conflict, NotFeasible, NotFound
+from shipyard.node.model import Node
+from shipyard.task import artifacts
 from shipyard.task.model import Task
 from shipyard.task.service import TaskService
+from shipyard.versions import version as version_of
 
 
 enable_gridfs_integration()
@@ -33,11 +42,26 @@ test_tasks = Task.Schema().load([
 ], many=True)
 
 
+def mock_remove_from_nodes(task_name: str, nodes: List[Node], digest: str = None) -> List[dict]:
+    return [
+        {
+            'node': str(node._id),
+            'status': 'failed' if node.name == 'Failed' else 'succeeded'
+        }
+        for node in nodes
+    ]
+
+
 @mock.patch('shipyard.task.service.db', mockdb)
-@mock.patch('shipyard.task.service.fs', mockfs)
+@mock.patch('shipyard.task.artifacts.db', mockdb)
+@mock.patch('shipyard.task.artifacts.fs', mockfs)
+@mock.patch('shipyard.task.service.remove_from_nodes', mock_remove_from_nodes)
 class TestService(unittest.TestCase):
 
     def setUp(self):
+        node_cache.clear()
+        task_cache.clear()
+
         for i in range(len(test_tasks)):
             with mockfs.new_file() as file:
                 test_tasks[i].file_id = file._id
@@ -49,15 +73,43 @@ class TestService(unittest.TestCase):
         for i in range(len(test_tasks)):
             test_tasks[i]._id = inserted_ids[i]
 
+        embedded_task = {
+            **Task.Schema().dump(test_tasks[0]),
+            '_id': test_tasks[0]._id,
+            'file_id': test_tasks[0].file_id
+        }
+        mockdb.nodes.insert_many([
+            {
+                'name': name,
+                'ip': '1.1.1.1',
+                'cpu_cores': 1,
+                'tasks': [embedded_task],
+                'load': {'tasks': 1, 'utilization': 1.0, 'density': 1.0,
+                         'free': 0.0}
+            }
+            for name in ('Test1', 'Failed')
+        ])
+
     def tearDown(self):
-        for task in test_tasks:
-            mockfs.delete(task.file_id)
+        mockdb.fs.files.delete_many({})
+        mockdb.fs.chunks.delete_many({})
         mockdb.tasks.delete_many({})
+        mockdb.nodes.delete_many({})
 
     def test_get_all(self):
         results = TaskService.get_all()
         self.assertEqual(len(results), len(test_tasks))
 
+    def test_get_page(self):
+        results, cursor = TaskService.get_page(['name'], limit=1)
+        self.assertEqual(results, [
+            {'_id': test_tasks[0]._id, 'name': test_tasks[0].name}])
+        self.assertEqual(cursor, str(test_tasks[0]._id))
+
+        results, cursor = TaskService.get_page(['name'], after=cursor)
+        self.assertEqual(len(results), len(test_tasks) - 1)
+        self.assertIsNone(cursor)
+
     def test_get_by_id(self):
         result = TaskService.get_by_id(test_tasks[0]._id)
         self.assertEqual(result.name, test_tasks[0].name)
@@ -88,10 +140,12 @@ class TestService(unittest.TestCase):
 
         try:
             result = TaskService.create(
-                new_task, 'test_file.tar.gz', BytesIO())
+                new_task, 'test_file.tar.gz', BytesIO(b'test'))
             self.assertEqual(mockdb.tasks.count_documents({}),
                              len(test_tasks)+1)
             self.assertIsInstance(result, str)
+            self.assertEqual(TaskService.get_by_id(result).digest,
+                             sha256(b'test').hexdigest())
         except:
             self.fail()
 
@@ -99,9 +153,103 @@ class TestService(unittest.TestCase):
             TaskService.create(new_task, 'test_file.tar.gz', BytesIO())
         self.assertEqual(mockdb.tasks.count_documents({}), len(test_tasks)+1)
 
+    def test_create_upload(self):
+        new_task = Task.Schema().load({
+            'name': 'Test',
+            'runtime': 1000,
+            'deadline': 1000,
+            'period': 1000
+        })
+        upload = artifacts.Upload('test_file.tar.gz')
+        upload.write(b'test')
+        upload.close()
+        files = mockdb.fs.files.count_documents({})
+
+        # The uploaded file is used without copying it
+        result = TaskService.create(new_task, 'test_file.tar.gz', upload)
+        task = TaskService.get_by_id(result)
+        self.assertEqual(task.file_id, upload.file_id)
+        self.assertEqual(task.digest, sha256(b'test').hexdigest())
+        self.assertEqual(mockdb.fs.files.count_documents({}), files)
+
+    @mock.patch('shipyard.task.service.drop_from_nodes')
+    def test_create_shared(self, drop_from_nodes):
+        new_tasks = Task.Schema().load([
+            {'name': name, 'runtime': 1000, 'deadline': 1000, 'period': 1000}
+            for name in ('Test3', 'Test4')
+        ], many=True)
+        first_id = TaskService.create(
+            new_tasks[0], 'test_file.tar.gz', BytesIO(b'test'))
+        files = mockdb.fs.files.count_documents({})
+
+        # Identical files are stored once, whether streamed or not
+        upload = artifacts.Upload('test_file.tar.gz')
+        upload.write(b'test')
+        upload.close()
+        second_id = TaskService.create(new_tasks[1], 'test_file.tar.gz', upload)
+        file_id = TaskService.get_by_id(first_id).file_id
+        self.assertEqual(TaskService.get_by_id(second_id).file_id, file_id)
+        self.assertEqual(mockdb.fs.files.count_documents({}), files)
+        self.assertEqual(mockdb.fs.files.find_one({'_id': file_id})['refs'], 2)
+
+        # A spec-only update re-sending the file keeps it
+        TaskService.update(first_id, {}, 'test_file.tar.gz', BytesIO(b'test'))
+        self.assertEqual(TaskService.get_by_id(first_id).file_id, file_id)
+        self.assertEqual(mockdb.fs.files.find_one({'_id': file_id})['refs'], 2)
+
+        # The file is removed with its last task, and so is its cached image
+        # on every node
+        TaskService.delete(first_id)
+        self.assertEqual(mockfs.get(file_id).read(), b'test')
+        drop_from_nodes.assert_not_called()
+        TaskService.delete(second_id)
+        self.assertFalse(mockfs.exists(file_id))
+        digest, nodes = drop_from_nodes.call_args[0]
+        self.assertEqual(digest, sha256(b'test').hexdigest())
+        self.assertEqual(len(nodes), 2)
+
+    @mock.patch('shipyard.upload.service.db', mockdb)
+    def test_create_from_upload(self):
+        new_task = Task.Schema().load({
+            'name': 'Test',
+            'runtime': 1000,
+            'deadline': 1000,
+            'period': 1000
+        })
+        file_id = mockfs.put(b'test', filename='test_file.tar.gz',
+                             digest=sha256(b'test').hexdigest())
+        upload_id = mockdb.uploads.insert_one({
+            'file_name': 'test_file.tar.gz',
+            'size': 4,
+            'file_id': file_id,
+            'digest': sha256(b'test').hexdigest(),
+            'status': 'open'
+        }).inserted_id
+
+        with self.assertRaises(ValidationError):
+            TaskService.create(new_task, None, None, str(upload_id))
+
+        # A failed request keeps the upload, so it can be sent again
+        mockdb.uploads.update_one({'_id': upload_id},
+                                  {'$set': {'status': 'finished'}})
+        with mock.patch('mongomock.collection.Collection.insert_one',
+                        side_effect=DuplicateKeyError('Test')), \
+                self.assertRaises(AlreadyPresent):
+            TaskService.create(new_task, None, None, str(upload_id))
+        self.assertEqual(mockdb.uploads.count_documents({}), 1)
+        self.assertNotIn('refs', mockdb.fs.files.find_one({'_id': file_id}))
+
+        # A finished upload is claimed by the task once it's written
+        result = TaskService.create(new_task, None, None, str(upload_id))
+        task = TaskService.get_by_id(result)
+        self.assertEqual(task.file_id, file_id)
+        self.assertEqual(task.digest, sha256(b'test').hexdigest())
+        self.assertEqual(mockdb.uploads.count_documents({}), 0)
+        self.assertEqual(mockfs.get(file_id).read(), b'test')
+
     def test_update(self):
         try:
-            result = TaskService.update(
+            result, removals = TaskService.update(
                 test_tasks[0]._id, {'name': 'Updated'}, None, None)
             self.assertNotEqual(result.name, test_tasks[0].name)
             self.assertEqual(result.name, 'Updated')
@@ -109,11 +257,17 @@ class TestService(unittest.TestCase):
             self.assertEqual(result.runtime, test_tasks[0].runtime)
             self.assertEqual(result.period, test_tasks[0].period)
             self.assertEqual(result.file_id, test_tasks[0].file_id)
+            self.assertEqual(len(removals['removals']), 2)
+            self.assertEqual(mockdb.nodes.count_documents(
+                {'tasks._id': test_tasks[0]._id}), 1)
+            self.assertEqual(mockdb.nodes.count_documents(
+                {'name': 'Failed', 'tasks._id': test_tasks[0]._id}), 1)
 
-            result = TaskService.update(
-                test_tasks[0]._id, {'name': 'Updated'}, 'test_file.tar.gz', BytesIO())
+            result, removals = TaskService.update(
+                test_tasks[0]._id, {'name': 'Updated'}, 'test_file.tar.gz', BytesIO(b'test'))
             self.assertNotEqual(result.name, test_tasks[0].name)
             self.assertNotEqual(result.file_id, test_tasks[0].file_id)
+            self.assertEqual(result.digest, sha256(b'test').hexdigest())
             self.assertEqual(result.name, 'Updated')
             self.assertEqual(result.deadline, test_tasks[0].deadline)
             self.assertEqual(result.runtime, test_tasks[0].runtime)
@@ -124,14 +278,164 @@ class TestService(unittest.TestCase):
         with self.assertRaises(NotFound):
             TaskService.update(ObjectId(), None, None, None)
 
+        with self.assertRaises(ValidationError):
+            TaskService.update(test_tasks[0]._id, {'version': 0}, None, None)
+
+    def test_create_node_fields(self):
+        new_task = Task.Schema().load({
+            'name': 'Test',
+            'runtime': 1000,
+            'deadline': 1000,
+            'period': 1000,
+            'scaled_runtime': 1,
+            'core': 0,
+            'version': 7
+        })
+        task = TaskService.get_by_id(TaskService.create(
+            new_task, 'test_file.tar.gz', BytesIO(b'test')))
+        self.assertIsNone(task.scaled_runtime)
+        self.assertIsNone(task.core)
+        self.assertEqual(task.version, 0)
+
+        for key in ('scaled_runtime', 'core'):
+            with self.assertRaises(ValidationError):
+                TaskService.update(test_tasks[0]._id, {key: 0}, None, None)
+
+    def test_update_version(self):
+        version = TaskService.get_version()
+        nodes_version = version_of(mockdb.nodes)
+        result, _ = TaskService.update(
+            test_tasks[0]._id, {'runtime': 500}, None, None)
+        self.assertEqual(result.version, test_tasks[0].version + 1)
+        self.assertEqual(TaskService.get_version(), version + 1)
+
+        # Tasks removed from their nodes change the node collection too
+        self.assertGreater(version_of(mockdb.nodes), nodes_version)
+
+    @mock.patch('shipyard.task.service.RolloutService.create')
+    def test_update_rolling(self, mock_create):
+        mock_create.return_value = str(ObjectId())
+
+        result, report = TaskService.update(
+            test_tasks[0]._id, {'runtime': 500}, None, None,
+            {'wave_size': 1, 'max_unavailable': 1})
+        self.assertEqual(result.runtime, 500)
+        self.assertEqual(report, {'rollout': mock_create.return_value})
+        mock_create.assert_called_once_with(
+            test_tasks[0]._id, test_tasks[0].name, 1, 1, None, False)
+        self.assertEqual(mockdb.nodes.count_documents(
+            {'tasks._id': test_tasks[0]._id}), 2)
+
+        with self.assertRaises(ValidationError):
+            TaskService.update(
+                test_tasks[0]._id, {'runtime': 500}, None, None,
+                {'wave_size': 0, 'max_unavailable': 1})
+
     def test_delete(self):
-        result = TaskService.delete(test_tasks[0]._id)
+        nodes_version = version_of(mockdb.nodes)
+        result, removals = TaskService.delete(test_tasks[0]._id)
         self.assertEqual(result.name, test_tasks[0].name)
         self.assertEqual(result.runtime, test_tasks[0].runtime)
         self.assertEqual(result.deadline, test_tasks[0].deadline)
         self.assertEqual(result.period, test_tasks[0].period)
         self.assertEqual(mockdb.tasks.count_documents({}), len(test_tasks)-1)
+        self.assertEqual(len(removals), 2)
+        self.assertEqual(mockdb.nodes.count_documents(
+            {'tasks._id': test_tasks[0]._id}), 0)
+
+        # Every node is updated in a single batch
+        self.assertEqual(version_of(mockdb.nodes), nodes_version + 1)
 
         with self.assertRaises(NotFound):
             TaskService.delete(str(ObjectId()))
         self.assertEqual(mockdb.tasks.count_documents({}), len(test_tasks)-1)
+
+    @mock.patch('shipyard.task.service.NodeService.deploy')
+    def test_place(self, mock_deploy):
+        mock_deploy.side_effect = lambda node, task: node
+        mockdb.nodes.insert_many([
+            {'name': name, 'ip': '1.1.1.1', 'cpu_cores': 1, 'tasks': [],
+             'load': {'free': 1.0}}
+            for name in ('Test2', 'Test3')
+        ])
+
+        # The nodes running the first task are full
+        result, verdict = TaskService.place(test_tasks[1]._id)
+        self.assertEqual(result.name, 'Test2')
+        self.assertTrue(verdict)
+        self.assertEqual(mock_deploy.call_args[0][1].name, test_tasks[1].name)
+
+        # Nodes already running the task are skipped
+        result, _ = TaskService.place(test_tasks[0]._id, 'fewest-tasks')
+        self.assertEqual(result.name, 'Test2')
+
+        mockdb.nodes.delete_many({'tasks': []})
+        with self.assertRaises(NotFeasible):
+            TaskService.place(test_tasks[1]._id)
+
+        with self.assertRaises(NotFound):
+            TaskService.place(str(ObjectId()))
+
+        with self.assertRaises(ValidationError):
+            TaskService.place(test_tasks[1]._id, 'Error')
+
+    @mock.patch('shipyard.task.service.NodeService.deploy')
+    def test_place_race(self, mock_deploy):
+        mockdb.nodes.insert_many([
+            {'name': name, 'ip': '1.1.1.1', 'cpu_cores': 1, 'tasks': [],
+             'load': {'free': 1.0}}
+            for name in ('Test2', 'Test3')
+        ])
+
+        # Another request fills the best node before the task is deployed
+        def deploy(node: Node, task: Task) -> Node:
+            if node.name == 'Test2':
+                raise Conflict('Test')
+            return node
+        mock_deploy.side_effect = deploy
+
+        result, verdict = TaskService.place(test_tasks[1]._id)
+        self.assertEqual(result.name, 'Test3')
+        self.assertTrue(verdict)
+        self.assertEqual(mock_deploy.call_count, 2)
+
+        mock_deploy.side_effect = NotFeasible('Test')
+        with self.assertRaises(NotFeasible):
+            TaskService.place(test_tasks[1]._id)
+
+        # Other errors aren't retried on the next node
+        mock_deploy.reset_mock()
+        mock_deploy.side_effect = RuntimeError('Test')
+        with self.assertRaises(RuntimeError):
+            TaskService.place(test_tasks[1]._id)
+        mock_deploy.assert_called_once()
+
+    @mock.patch('shipyard.task.service.NodeService.deploy')
+    def test_place_batch(self, mock_deploy):
+        mockdb.nodes.insert_one({'name': 'Test2', 'ip': '1.1.1.1',
+                                 'cpu_cores': 2, 'scheduling': 'partitioned',
+                                 'tasks': []})
+
+        report = TaskService.place_batch(
+            [test_tasks[0]._id, test_tasks[1]._id])
+        self.assertEqual(
+            sorted((p['task'], p['node'], p['core']) for p in report['plan']),
+            [('Test1', 'Test2', 0), ('Test2', 'Test2', 1)])
+        self.assertEqual(report['deployments'],
+                         [{'node': 'Test2', 'status': 'succeeded'}])
+        self.assertIsInstance(report['solver_time'], float)
+        self.assertEqual(mock_deploy.call_count, 2)
+
+        mock_deploy.reset_mock()
+        mockdb.tasks.insert_one(
+            Task.Schema(exclude=['_id']).dump(test_tasks[0]))
+        with self.assertRaises(NotFeasible):
+            TaskService.place_batch(
+                [t['_id'] for t in mockdb.tasks.find()], 0)
+        mock_deploy.assert_not_called()
+
+        with self.assertRaises(NotFound):
+            TaskService.place_batch([test_tasks[0]._id, str(ObjectId())])
+
+        with self.assertRaises(ValidationError):
+            TaskService.place_batch([test_tasks[0]._id], -1)
@@ -0,0 +1,47 @@
+import unittest
+
+import mongomock
+
+from unittest import mock
+
+from shipyard import leases
+from shipyard.leases import LEASE_TTL, WORKER, hold, live, renew
+
+
+mockdb = mongomock.MongoClient().shipyard
+
+
+@mock.patch('shipyard.leases.db', mockdb)
+class TestLeases(unittest.TestCase):
+
+    def tearDown(self):
+        mockdb.workers.delete_many({})
+
+    def test_renew(self):
+        mockdb.workers.insert_many([{'_id': 'stopped', 'expires': 100},
+                                    {'_id': 'running', 'expires': 200}])
+
+        renew(150)
+        self.assertEqual(
+            {w['_id']: w['expires'] for w in mockdb.workers.find()},
+            {'running': 200, WORKER: 150 + LEASE_TTL})
+
+    def test_live(self):
+        # This process is always live, even before holding its lease
+        self.assertEqual(live(), [WORKER])
+
+        mockdb.workers.insert_many([{'_id': 'stopped', 'expires': 100},
+                                    {'_id': 'running', 'expires': 200}])
+        self.assertEqual(sorted(live(150)), sorted([WORKER, 'running']))
+
+    def test_hold(self):
+        calls = []
+        recoveries = [lambda: calls.append('first'),
+                      lambda: calls.append('second')]
+
+        with mock.patch.object(leases.threading, 'Thread') as thread:
+            hold(*recoveries)
+            thread.return_value.start.assert_called_once_with()
+
+        self.assertEqual(calls, ['first', 'second'])
+        self.assertIsNotNone(mockdb.workers.find_one({'_id': WORKER}))
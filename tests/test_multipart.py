@@ -0,0 +1,124 @@
+import unittest
+
+from hashlib import sha256
+from io import BytesIO
+from unittest import mock
+
+import gridfs
+import mongomock
+
+from mongomock.gridfs import enable_gridfs_integration
+
+from shipyard.input_formats import form_fields, multipart
+from shipyard.multipart import UploadError, parse_multipart
+
+
+enable_gridfs_integration()
+mockdb = mongomock.MongoClient().shipyard
+mockfs = gridfs.GridFS(mockdb)
+
+boundary = b'test-boundary'
+file_data = bytes(range(256)) * 64
+
+
+def make_body(parts: list, preamble: bytes = b'') -> bytes:
+    body = preamble
+    for name, file_name, data in parts:
+        disposition = f'form-data; name="{name}"'
+        if file_name is not None:
+            disposition += f'; filename="{file_name}"'
+        body += b'--' + boundary + b'\r\n'
+        body += f'Content-Disposition: {disposition}\r\n\r\n'.encode()
+        body += data + b'\r\n'
+    return body + b'--' + boundary + b'--\r\n'
+
+
+class MockFile():
+
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+        self.data = b''
+        self.closed = False
+        self.aborted = False
+
+    def write(self, chunk: bytes):
+        self.data += chunk
+
+    def close(self):
+        self.closed = True
+
+    def abort(self):
+        self.aborted = True
+
+
+class TestUploads(unittest.TestCase):
+
+    def test_parse_multipart(self):
+        body = make_body([
+            ('specs', None, b'{"name": "test"}'),
+            ('file', 'test.tar.gz', file_data + b'\r\n--test')
+        ], preamble=b'ignored\r\n')
+
+        # Small reads split the delimiter between chunks
+        for chunk_size in (1, 7, 4096):
+            with mock.patch('shipyard.multipart.CHUNK_SIZE', chunk_size):
+                form = parse_multipart(BytesIO(body), boundary, MockFile)
+            self.assertEqual(form['specs'], '{"name": "test"}')
+            file_name, file = form['file']
+            self.assertEqual(file_name, 'test.tar.gz')
+            self.assertEqual(file.data, file_data + b'\r\n--test')
+            self.assertTrue(file.closed)
+
+        form = parse_multipart(BytesIO(make_body([])), boundary, MockFile)
+        self.assertEqual(form, {})
+
+    def test_parse_multipart_errors(self):
+        files = []
+
+        def open_file(file_name: str) -> MockFile:
+            files.append(MockFile(file_name))
+            return files[-1]
+
+        body = make_body([('file', 'test.tar.gz', file_data)])
+        with self.assertRaises(UploadError):
+            parse_multipart(BytesIO(body[:-100]), boundary, open_file)
+        self.assertTrue(files[0].aborted)
+
+        with self.assertRaises(UploadError):
+            parse_multipart(BytesIO(b'no boundary'), boundary, open_file)
+
+        body = make_body([('specs', None, b'x' * 100)])
+        with mock.patch('shipyard.multipart.FIELD_LIMIT', 10):
+            with self.assertRaises(UploadError):
+                parse_multipart(BytesIO(body), boundary, open_file)
+
+    @mock.patch('shipyard.task.artifacts.fs', mockfs)
+    def test_multipart(self):
+        body = make_body([
+            ('file', 'test.tar.gz', file_data),
+            ('specs', None, b'{}')
+        ])
+        form = multipart(BytesIO(body), boundary=boundary.decode())
+
+        self.assertEqual(form['specs'], '{}')
+        file_name, upload = form['file']
+        self.assertEqual(file_name, 'test.tar.gz')
+        self.assertEqual(upload.size, len(file_data))
+        self.assertEqual(upload.digest, sha256(file_data).hexdigest())
+
+        stored = mockfs.get(upload.file_id)
+        self.assertEqual(stored.read(), file_data)
+        self.assertEqual(stored.digest, upload.digest)
+
+    @mock.patch('shipyard.task.artifacts.fs', mockfs)
+    def test_form_fields(self):
+        body = make_body([
+            ('file', 'test.tar.gz', file_data),
+            ('name', None, b'test')
+        ])
+        files = mockdb.fs.files.count_documents({})
+
+        # Files sent to endpoints that don't take them aren't stored
+        form = form_fields(BytesIO(body), boundary=boundary.decode())
+        self.assertEqual(form, {'name': 'test'})
+        self.assertEqual(mockdb.fs.files.count_documents({}), files)
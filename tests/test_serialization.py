@@ -0,0 +1,52 @@
+import unittest
+
+from bson.objectid import ObjectId
+
+from shipyard.node.load import summarize
+from shipyard.node.model import Node
+from shipyard.serialization import dump_trusted, schema
+from shipyard.task.model import Task
+
+
+class TestSerialization(unittest.TestCase):
+
+    def test_schema(self):
+        self.assertIs(schema(Node), schema(Node))
+        self.assertIs(schema(Node, only=['name', '_id']),
+                      schema(Node, only=['_id', 'name']))
+        self.assertIsNot(schema(Node), schema(Task))
+        self.assertIsNot(schema(Node, only=['name']),
+                         schema(Node, exclude=['name']))
+
+        self.assertEqual(set(schema(Node, only=['name']).fields), {'name'})
+        self.assertNotIn('_id', schema(Task, exclude=['_id']).fields)
+
+    def test_dump_trusted(self):
+        task = Task.Schema().load({
+            '_id': str(ObjectId()),
+            'file_id': str(ObjectId()),
+            'name': 'Test',
+            'runtime': 1000,
+            'deadline': 1000,
+            'period': 1000,
+            'devices': ['/dev/test']
+        })
+        node = Node.Schema().load({
+            '_id': str(ObjectId()),
+            'name': 'Test',
+            'ip': '1.1.1.1',
+            'cpu_cores': 2
+        })
+        node.tasks = [task]
+        node.load = summarize([task], node)
+
+        fields = ['_id', 'name', 'ip', 'load', 'tasks._id', 'tasks.name']
+        document = {
+            '_id': node._id,
+            'name': node.name,
+            'ip': node.ip,
+            'load': Node.Schema().dump(node)['load'],
+            'tasks': [{'_id': task._id, 'name': task.name}]
+        }
+        self.assertEqual(dump_trusted(document),
+                         schema(Node, only=fields).dump(node))
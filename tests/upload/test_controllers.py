@@ -0,0 +1,137 @@
+import unittest
+
+import hug
+
+from typing import BinaryIO
+from unittest import mock
+
+from bson.objectid import ObjectId
+from marshmallow import ValidationError
+
+from shipyard.errors import Conflict, NotFound
+from shipyard.upload import controllers
+from shipyard.upload.model import FINISHED, Upload
+
+
+test_upload = Upload.Schema().load({
+    '_id': str(ObjectId()),
+    'file_name': 'test.tar.gz',
+    'size': 8,
+    'offset': 4,
+    'chunk_size': 4,
+    'file_id': str(ObjectId())
+})
+
+
+class MockService():
+
+    @staticmethod
+    def get_by_id(upload_id: str) -> Upload:
+        if ObjectId(upload_id) == test_upload._id:
+            return test_upload
+
+        raise NotFound
+
+    @staticmethod
+    def create(new_upload: Upload) -> str:
+        return str(ObjectId())
+
+    @staticmethod
+    def write(upload_id: str, start: int, end: int, size: int,
+              body: BinaryIO, digest: str) -> Upload:
+        upload = MockService.get_by_id(upload_id)
+        if start != upload.offset:
+            raise Conflict
+        if digest != 'abc':
+            raise ValidationError('Wrong digest.')
+        return Upload(**{**vars(upload), 'offset': end + 1})
+
+    @staticmethod
+    def finish(upload_id: str, digest: str = None) -> Upload:
+        upload = MockService.get_by_id(upload_id)
+        return Upload(**{**vars(upload), 'status': FINISHED})
+
+    @staticmethod
+    def delete(upload_id: str) -> Upload:
+        return MockService.get_by_id(upload_id)
+
+
+@mock.patch('shipyard.upload.controllers.UploadService', MockService)
+class TestControllers(unittest.TestCase):
+
+    def test_post_upload(self):
+        response = hug.test.call('POST', controllers, '', body={
+            'file_name': 'test.tar.gz',
+            'size': 8
+        })
+        self.assertEqual(response.status, hug.HTTP_OK)
+        self.assertIn('_id', response.data)
+        self.assertIn('chunk_size', response.data)
+
+        response = hug.test.call('POST', controllers, '', body={
+            'file_name': 'test.tar.gz',
+            'size': -1
+        })
+        self.assertEqual(response.status, hug.HTTP_BAD_REQUEST)
+
+    def test_get_upload(self):
+        response = hug.test.call('GET', controllers, f'{test_upload._id}')
+        self.assertEqual(response.status, hug.HTTP_OK)
+        self.assertEqual(response.data['offset'], 4)
+
+        response = hug.test.call('GET', controllers, f'{ObjectId()}')
+        self.assertEqual(response.status, hug.HTTP_NOT_FOUND)
+
+        response = hug.test.call('GET', controllers, 'error')
+        self.assertEqual(response.status, hug.HTTP_BAD_REQUEST)
+
+    def test_patch_upload(self):
+        def patch(upload_id, content_range, digest='abc'):
+            headers = {'Content-Type': 'application/octet-stream'}
+            if content_range is not None:
+                headers['Content-Range'] = content_range
+            if digest is not None:
+                headers['X-Content-SHA256'] = digest
+            return hug.test.call('PATCH', controllers, f'{upload_id}',
+                                 body=b'data', headers=headers)
+
+        response = patch(test_upload._id, 'bytes 4-7/8')
+        self.assertEqual(response.status, hug.HTTP_OK)
+        self.assertEqual(response.data['offset'], 8)
+
+        response = patch(test_upload._id, 'bytes 0-3/8')
+        self.assertEqual(response.status, hug.HTTP_CONFLICT)
+
+        response = patch(test_upload._id, 'bytes 4-7/8', 'def')
+        self.assertEqual(response.status, hug.HTTP_BAD_REQUEST)
+
+        response = patch(test_upload._id, None)
+        self.assertEqual(response.status, hug.HTTP_BAD_REQUEST)
+
+        response = patch(test_upload._id, 'bytes 4-7/8', None)
+        self.assertEqual(response.status, hug.HTTP_BAD_REQUEST)
+
+        response = patch(ObjectId(), 'bytes 4-7/8')
+        self.assertEqual(response.status, hug.HTTP_NOT_FOUND)
+
+        response = patch('error', 'bytes 4-7/8')
+        self.assertEqual(response.status, hug.HTTP_BAD_REQUEST)
+
+    def test_post_upload_finish(self):
+        response = hug.test.call(
+            'POST', controllers, f'{test_upload._id}/finish')
+        self.assertEqual(response.status, hug.HTTP_OK)
+        self.assertEqual(response.data['status'], FINISHED)
+
+        response = hug.test.call('POST', controllers, f'{ObjectId()}/finish')
+        self.assertEqual(response.status, hug.HTTP_NOT_FOUND)
+
+    def test_delete_upload(self):
+        response = hug.test.call('DELETE', controllers, f'{test_upload._id}')
+        self.assertEqual(response.status, hug.HTTP_OK)
+
+        response = hug.test.call('DELETE', controllers, f'{ObjectId()}')
+        self.assertEqual(response.status, hug.HTTP_NOT_FOUND)
+
+        response = hug.test.call('DELETE', controllers, 'error')
+        self.assertEqual(response.status, hug.HTTP_BAD_REQUEST)
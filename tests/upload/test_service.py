@@ -0,0 +1,179 @@
+import time
+import unittest
+
+import gridfs
+import mongomock
+
+from hashlib import sha256
+from io import BytesIO
+from unittest import mock
+
+from bson.objectid import ObjectId
+from marshmallow import ValidationError
+from mongomock.gridfs import enable_gridfs_integration
+
+from shipyard.errors import Conflict, NotFound
+from shipyard.upload.model import FINISHED, OPEN, Upload
+from shipyard.upload.service import UploadService
+
+
+enable_gridfs_integration()
+mockdb = mongomock.MongoClient().shipyard
+mockfs = gridfs.GridFS(mockdb)
+
+chunk_size = 4
+file_data = b'0123456789'
+
+
+def digest(data: bytes) -> str:
+    return sha256(data).hexdigest()
+
+
+@mock.patch('shipyard.upload.service.db', mockdb)
+@mock.patch('shipyard.upload.service.CHUNK_SIZE', chunk_size)
+class TestService(unittest.TestCase):
+
+    def setUp(self):
+        now = time.time()
+        self.upload_id = str(mockdb.uploads.insert_one({
+            'file_name': 'test.tar.gz',
+            'size': len(file_data),
+            'offset': 0,
+            'chunk_size': chunk_size,
+            'file_id': ObjectId(),
+            'status': OPEN,
+            'created': now,
+            'updated': now
+        }).inserted_id)
+
+    def tearDown(self):
+        mockdb.uploads.drop()
+        mockdb.fs.files.drop()
+        mockdb.fs.chunks.drop()
+
+    def write(self, start: int, end: int) -> Upload:
+        data = file_data[start:end + 1]
+        return UploadService.write(self.upload_id, start, end, len(file_data),
+                                   BytesIO(data), digest(data))
+
+    def test_create(self):
+        upload_id = UploadService.create(Upload.Schema().load({
+            'file_name': 'test.tar.gz',
+            'size': len(file_data)
+        }))
+        upload = UploadService.get_by_id(upload_id)
+        self.assertEqual(upload.offset, 0)
+        self.assertEqual(upload.chunk_size, chunk_size)
+        self.assertEqual(upload.status, OPEN)
+
+        with self.assertRaises(NotFound):
+            UploadService.get_by_id(str(ObjectId()))
+
+    def test_write(self):
+        self.assertEqual(self.write(0, 7).offset, 8)
+        self.assertEqual(self.write(8, 9).offset, 10)
+        self.assertEqual(mockdb.fs.chunks.count_documents({}), 3)
+
+    def test_write_errors(self):
+        # Ranges must continue at the offset
+        with self.assertRaises(Conflict):
+            self.write(4, 7)
+
+        # and end at the end of a chunk or of the file
+        with self.assertRaises(ValidationError):
+            self.write(0, 5)
+        with self.assertRaises(ValidationError):
+            self.write(0, 10)
+
+        # A body that doesn't match its digest can be sent again
+        with self.assertRaises(ValidationError):
+            UploadService.write(self.upload_id, 0, 3, len(file_data),
+                                BytesIO(b'xxxx'), digest(b'0123'))
+        with self.assertRaises(ValidationError):
+            UploadService.write(self.upload_id, 0, 3, len(file_data),
+                                BytesIO(b'012'), digest(b'012'))
+        self.assertEqual(UploadService.get_by_id(self.upload_id).offset, 0)
+        self.assertEqual(self.write(0, 3).offset, 4)
+
+    def test_finish(self):
+        with self.assertRaises(ValidationError):
+            UploadService.finish(self.upload_id)
+
+        self.write(0, 3)
+        self.write(4, 9)
+        with self.assertRaises(ValidationError):
+            UploadService.finish(self.upload_id, digest(b'other'))
+
+        upload = UploadService.finish(self.upload_id, digest(file_data))
+        self.assertEqual(upload.status, FINISHED)
+        self.assertEqual(upload.digest, digest(file_data))
+        self.assertEqual(mockfs.get(upload.file_id).read(), file_data)
+
+        # Finishing it again changes nothing
+        self.assertEqual(UploadService.finish(self.upload_id).digest,
+                         upload.digest)
+        with self.assertRaises(ValidationError):
+            self.write(0, 3)
+
+    def test_get_file(self):
+        with self.assertRaises(ValidationError):
+            UploadService.get_file(self.upload_id)
+        with self.assertRaises(NotFound):
+            UploadService.get_file(str(ObjectId()))
+
+        self.write(0, 9)
+        upload = UploadService.finish(self.upload_id)
+        self.assertEqual(UploadService.get_file(self.upload_id),
+                         ('test.tar.gz', upload.file_id, upload.digest))
+
+    def test_claim(self):
+        self.write(0, 9)
+        upload = UploadService.finish(self.upload_id)
+
+        # The file is kept after the upload is gone if a task shares it
+        mockdb.fs.files.update_one({'_id': upload.file_id},
+                                   {'$set': {'refs': 1}})
+        UploadService.claim(self.upload_id)
+        self.assertEqual(mockdb.uploads.count_documents({}), 0)
+        self.assertEqual(mockfs.get(upload.file_id).read(), file_data)
+        UploadService.claim(self.upload_id)
+
+        # and removed if it doesn't
+        self.setUp()
+        self.write(0, 9)
+        upload = UploadService.finish(self.upload_id)
+        UploadService.claim(self.upload_id)
+        self.assertFalse(mockfs.exists(upload.file_id))
+
+    def test_delete(self):
+        self.write(0, 9)
+        UploadService.finish(self.upload_id)
+
+        UploadService.delete(self.upload_id)
+        self.assertEqual(mockdb.uploads.count_documents({}), 0)
+        self.assertEqual(mockdb.fs.files.count_documents({}), 0)
+        self.assertEqual(mockdb.fs.chunks.count_documents({}), 0)
+
+        with self.assertRaises(NotFound):
+            UploadService.delete(self.upload_id)
+
+    def test_expire(self):
+        self.write(0, 3)
+
+        UploadService.expire()
+        self.assertEqual(mockdb.uploads.count_documents({}), 1)
+
+        UploadService.expire(time.time() + 2 * 86400)
+        self.assertEqual(mockdb.uploads.count_documents({}), 0)
+        self.assertEqual(mockdb.fs.chunks.count_documents({}), 0)
+
+        # Creating an upload removes the expired ones
+        self.setUp()
+        mockdb.uploads.update_many({}, {'$set': {'updated': 0}})
+        UploadService.create(Upload.Schema().load({
+            'file_name': 'test.tar.gz',
+            'size': len(file_data)
+        }))
+        self.assertEqual(mockdb.uploads.count_documents({}), 1)
+        self.assertIsNone(mockdb.uploads.find_one(
+            {'_id': ObjectId(self.upload_id)}))